@@ -1,16 +1,22 @@
 from sqlalchemy.orm import Session
+from app.core.metrics import Counter
+from app.core.tracing import traced
 from app.db.models import AuditLog
 
+AUDIT_WRITES = Counter("audit_writes_total", "Audit log entries written", ("action", "resource"))
 
+
+@traced()
 def log_audit(
     db: Session,
     user_id: int,
     action: str,
     resource: str,
     resource_id: int = None,
-    details: str = None
+    details: str = None,
+    commit: bool = True
 ) -> AuditLog:
-    """Create an audit log entry"""
+    """Create an audit log entry. With commit=False it joins the caller's transaction."""
     audit_log = AuditLog(
         user_id=user_id,
         action=action,
@@ -19,7 +25,9 @@ def log_audit(
         details=details
     )
     db.add(audit_log)
+    AUDIT_WRITES.inc(action, resource)
+    if not commit:
+        return audit_log
     db.commit()
-    db.refresh(audit_log)
     return audit_log
 
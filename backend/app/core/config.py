@@ -15,6 +15,84 @@ class Settings(BaseSettings):
     # Encryption
     ENV_MASTER_KEY: Optional[str] = None
     
+    # Variable history: number of versions kept per key (0 disables pruning)
+    ENV_HISTORY_MAX_VERSIONS_PER_KEY: int = 50
+    
+    # Number of environments whose resolved ${...} references are cached per worker
+    ENV_RESOLVE_CACHE_SIZE: int = 1000
+    
+    # Share link sweeper: seconds between runs (0 disables), rows per UPDATE/DELETE batch
+    SHARE_SWEEP_INTERVAL_SECONDS: int = 300
+    SHARE_SWEEP_BATCH_SIZE: int = 1000
+    # Days a share link is kept after it is revoked, used up or expired before it is purged (0 keeps them)
+    SHARE_PURGE_AFTER_DAYS: int = 0
+    
+    # Public share endpoints: attempts per minute and burst per share token and per client IP
+    # (0 disables), lockout doubling from BASE to MAX seconds after repeated failures
+    SHARE_RATE_LIMIT_PER_MINUTE: int = 20
+    SHARE_RATE_LIMIT_BURST: int = 10
+    SHARE_LOCKOUT_AFTER_FAILURES: int = 5
+    SHARE_LOCKOUT_BASE_SECONDS: int = 30
+    SHARE_LOCKOUT_MAX_SECONDS: int = 3600
+    # Optional Redis URL to share rate limits between workers (requires the redis package)
+    SHARE_RATE_LIMIT_REDIS_URL: Optional[str] = None
+    
+    # Cached (project, user) -> role lookups per worker: seconds an entry lives (0 disables), entries kept
+    PROJECT_ROLE_CACHE_TTL_SECONDS: int = 60
+    PROJECT_ROLE_CACHE_SIZE: int = 10000
+    # Optional Redis URL to broadcast membership changes to every worker (requires the redis package)
+    MEMBERSHIP_EVENTS_REDIS_URL: Optional[str] = None
+    # Maximum users added, updated or removed per membership request
+    PROJECT_MEMBERS_BATCH_LIMIT: int = 500
+    
+    # Projects with more variables than this are deleted by a chunked background job
+    PROJECT_DELETE_ASYNC_THRESHOLD: int = 10000
+    # Rows deleted per statement (and per transaction) by the background deletion job
+    PROJECT_DELETE_BATCH_SIZE: int = 1000
+    # Seconds without progress after which another worker takes over a running deletion job
+    PROJECT_DELETE_LEASE_SECONDS: int = 300
+    
+    # Prometheus metrics at /metrics; with several workers, a directory shared by them
+    # (emptied before start) where each writes its totals every METRICS_FLUSH_INTERVAL_SECONDS
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL_SECONDS: int = 5
+    
+    # Add X-Query-Count and Server-Timing headers with each request's database usage
+    QUERY_DEBUG: bool = False
+    # Log a warning when one request runs the same statement this many times (0 disables)
+    QUERY_REPEAT_LOG_THRESHOLD: int = 10
+    
+    # In-process tracing of requests (routers, services, SQL, crypto). A request's spans are
+    # kept if it is sampled (fraction of requests), slower than TRACE_SLOW_MS (0 disables) or failed
+    TRACING_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_SLOW_MS: int = 500
+    TRACE_MAX_SPANS: int = 1000
+    # Kept traces go to a rotating JSON-lines file and/or an OTLP/HTTP JSON collector
+    # (e.g. http://localhost:4318/v1/traces)
+    TRACE_FILE: Optional[str] = "traces.jsonl"
+    TRACE_FILE_MAX_BYTES: int = 10_000_000
+    TRACE_FILE_BACKUPS: int = 5
+    TRACE_OTLP_ENDPOINT: Optional[str] = None
+    
+    # Profile single requests sent with `X-Profile: 1` by these users (emails); reports go
+    # to PROFILE_DIR, which keeps the newest PROFILE_MAX_REPORTS
+    PROFILING_ENABLED: bool = False
+    PROFILING_OPERATORS: list[str] = []
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_REPORTS: int = 50
+    PROFILE_SAMPLE_INTERVAL_MS: float = 1.0
+    PROFILE_MAX_SECONDS: int = 60
+    
+    # Logging: root level, per-logger levels as JSON ({"app.env_vars": "DEBUG"}), "json" or "text"
+    # lines, records buffered for the writer thread (more are dropped), SQL statements at INFO
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict[str, str] = {}
+    LOG_FORMAT: str = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    SQL_ECHO: bool = False
+    
     # CORS
     CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:3001"]
     
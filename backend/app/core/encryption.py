@@ -1,7 +1,15 @@
 from cryptography.fernet import Fernet
 from app.core.config import settings
+from app.core.metrics import Counter
 import base64
 import hashlib
+import hmac
+import time
+from typing import Iterable, List
+from app.core.tracing import traced
+
+CRYPTO_VALUES = Counter("crypto_values_total", "Values encrypted or decrypted", ("operation",))
+CRYPTO_SECONDS = Counter("crypto_seconds_total", "Time spent encrypting or decrypting", ("operation",))
 
 
 class EncryptionService:
@@ -24,18 +32,54 @@ class EncryptionService:
         # Fernet requires 32-byte key, base64 encoded
         fernet_key = base64.urlsafe_b64encode(key)
         self._fernet = Fernet(fernet_key)
+        # Separate key for value digests so they reveal nothing about the Fernet key
+        self._digest_key = hashlib.sha256(b"value-digest:" + settings.ENV_MASTER_KEY.encode()).digest()
     
+    @traced("crypto.encrypt")
     def encrypt(self, plaintext: str) -> str:
         """Encrypt a plaintext string"""
         if not plaintext:
             return ""
-        return self._fernet.encrypt(plaintext.encode()).decode()
+        start = time.perf_counter()
+        ciphertext = self._fernet.encrypt(plaintext.encode()).decode()
+        CRYPTO_SECONDS.inc("encrypt", amount=time.perf_counter() - start)
+        CRYPTO_VALUES.inc("encrypt")
+        return ciphertext
     
+    @traced("crypto.decrypt")
     def decrypt(self, ciphertext: str) -> str:
         """Decrypt a ciphertext string"""
         if not ciphertext:
             return ""
-        return self._fernet.decrypt(ciphertext.encode()).decode()
+        start = time.perf_counter()
+        plaintext = self._fernet.decrypt(ciphertext.encode()).decode()
+        CRYPTO_SECONDS.inc("decrypt", amount=time.perf_counter() - start)
+        CRYPTO_VALUES.inc("decrypt")
+        return plaintext
+    
+    @traced("crypto.encrypt_many")
+    def encrypt_many(self, plaintexts: Iterable[str]) -> List[str]:
+        """Encrypt a batch of plaintext strings"""
+        encrypt = self._fernet.encrypt
+        start = time.perf_counter()
+        ciphertexts = [encrypt(p.encode()).decode() if p else "" for p in plaintexts]
+        CRYPTO_SECONDS.inc("encrypt", amount=time.perf_counter() - start)
+        CRYPTO_VALUES.inc("encrypt", amount=len(ciphertexts))
+        return ciphertexts
+    
+    @traced("crypto.decrypt_many")
+    def decrypt_many(self, ciphertexts: Iterable[str]) -> List[str]:
+        """Decrypt a batch of ciphertext strings"""
+        decrypt = self._fernet.decrypt
+        start = time.perf_counter()
+        plaintexts = [decrypt(c.encode()).decode() if c else "" for c in ciphertexts]
+        CRYPTO_SECONDS.inc("decrypt", amount=time.perf_counter() - start)
+        CRYPTO_VALUES.inc("decrypt", amount=len(plaintexts))
+        return plaintexts
+    
+    def digest(self, plaintext: str) -> str:
+        """Keyed HMAC-SHA256 of a plaintext value, comparable without decryption"""
+        return hmac.new(self._digest_key, (plaintext or "").encode(), hashlib.sha256).hexdigest()
 
 
 # Singleton instance
@@ -0,0 +1,224 @@
+"""
+Request and database instrumentation.
+
+RequestInstrumentationMiddleware times every request by route template and
+binds a RequestStats to the request's context; the engine hooks count each
+statement and its time globally and into the current RequestStats, which the
+middleware then records per route. The same numbers drive the query debug
+headers (QUERY_DEBUG), the log of statements repeated within one request
+(likely N+1 patterns), and assert_max_queries for query budgets in checks.
+With TRACING_ENABLED, the middleware also opens each request's trace and
+statements are recorded as spans (see app.core.tracing). Every request gets
+a request id (the client's X-Request-ID or a new one), bound for log records
+and echoed in the response.
+"""
+
+import logging
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.logs import new_request_id, request_id_var
+from app.core.metrics import Counter, Histogram
+
+UNMATCHED_ROUTE = "<unmatched>"
+REQUEST_ID_HEADER = b"x-request-id"
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database statements executed per request",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database statements per request",
+    ("route",),
+)
+DB_QUERIES = Counter("db_queries_total", "Database statements executed")
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent in database statements")
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self, track_statements: bool = False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        # Executions per SQL text; parameters differ, so repeats point at N+1 loops
+        self.statements: Optional[StatementCounter] = StatementCounter() if track_statements else None
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_seconds += elapsed
+        if self.statements is not None:
+            self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int) -> List[tuple]:
+        """(statement, executions) run at least `threshold` times, most repeated first"""
+        if self.statements is None or threshold <= 0:
+            return []
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+# Endpoints and dependencies run in the threadpool with a copy of the request's
+# context, which still points at the same RequestStats object
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+# Active count_queries() blocks; they see statements from every thread
+_collectors: List[RequestStats] = []
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.inc(amount=elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for collector in _collectors:
+        collector.record(statement, elapsed)
+    if settings.TRACING_ENABLED:
+        end = time.time_ns()
+        tracing.record_span("db.query", end - int(elapsed * 1e9), end, statement=" ".join(statement.split())[:300])
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestInstrumentationMiddleware:
+    """ASGI middleware recording latency and database usage per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", ()))
+        request_id = new_request_id(headers.get(REQUEST_ID_HEADER, b"").decode("latin-1"))
+        request_id_token = request_id_var.set(request_id)
+        stats = RequestStats(track_statements=settings.QUERY_REPEAT_LOG_THRESHOLD > 0)
+        token = _request_stats.set(stats)
+        root_span = tracing.start_trace(
+            f"{scope['method']} {scope['path']}", **{"http.method": scope["method"], "http.request_id": request_id}
+        )
+        status_code = 500
+        error = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+                if settings.QUERY_DEBUG:
+                    message["headers"] += [
+                        (b"x-query-count", str(stats.queries).encode()),
+                        (b"server-timing", f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'.encode()),
+                    ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope; templates keep label values bounded
+            route = scope.get("route")
+            template = getattr(route, "path", UNMATCHED_ROUTE)
+            if root_span is not None:
+                root_span.name = f"{scope['method']} {template}"
+                tracing.end_trace(
+                    root_span,
+                    error=error or (f"HTTP {status_code}" if status_code >= 500 else None),
+                    **{"http.route": template, "http.status_code": status_code, "db.queries": stats.queries},
+                )
+            if settings.METRICS_ENABLED:
+                HTTP_REQUEST_SECONDS.observe(elapsed, scope["method"], template, str(status_code))
+                HTTP_REQUEST_DB_QUERIES.observe(stats.queries, template)
+                HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, template)
+            for statement, count in stats.repeated_statements(settings.QUERY_REPEAT_LOG_THRESHOLD):
+                logger.warning(
+                    "Possible N+1: %s %s ran the same statement %d times: %s",
+                    scope["method"],
+                    template,
+                    count,
+                    " ".join(statement.split())[:500],
+                )
+            request_id_var.reset(request_id_token)
+
+
+_OUTCOMES = {400: "invalid", 403: "denied", 404: "not_found", 409: "conflict", 429: "throttled"}
+
+
+@contextmanager
+def count_outcome(counter: Counter, *labels: str):
+    """Count a block's outcome: success, or the HTTP error it raised (denied, not_found, ...)"""
+    try:
+        yield
+    except HTTPException as exc:
+        counter.inc(*labels, _OUTCOMES.get(exc.status_code, "error"))
+        raise
+    except Exception:
+        counter.inc(*labels, "error")
+        raise
+    counter.inc(*labels, "success")
+
+
+@contextmanager
+def count_queries() -> Iterator[RequestStats]:
+    """Count the statements executed in any thread while the block runs (for checks and tests)"""
+    stats = RequestStats(track_statements=True)
+    _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "block") -> Iterator[RequestStats]:
+    """
+    Fail with AssertionError if the block executes more than `limit` statements.
+    Usage: with assert_max_queries(4, "GET /env/{id}"): client.get(...)
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.queries > limit:
+        statements = "\n".join(
+            f"  {count} x {' '.join(statement.split())[:200]}" for statement, count in stats.statements.most_common()
+        )
+        raise AssertionError(f"{label} executed {stats.queries} statements, budget is {limit}:\n{statements}")
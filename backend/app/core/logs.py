@@ -0,0 +1,198 @@
+"""
+Logging setup: queued, structured and redacted.
+
+setup_logging() routes every logger through one QueueHandler, so a log call
+on the request path only filters the record and puts it on an in-memory
+queue; a QueueListener thread formats it (JSON lines, or text with
+LOG_FORMAT=text) and writes it to stdout. When the queue is full, records
+are dropped and counted instead of blocking the request.
+
+Before a record is queued, RequestIdFilter stamps it with the current
+request id (set by RequestInstrumentationMiddleware, returned to clients as
+X-Request-ID), and RedactionFilter removes secrets. It masks the value
+fields of variables, versions and share links (plus passwords and tokens)
+in dict, model and ORM arguments and in `extra` fields, and scrubs Fernet
+ciphertexts, JWTs and bcrypt hashes from the message text.
+
+Levels are LOG_LEVEL for the root logger and LOG_LEVELS per logger
+(e.g. {"app.env_vars": "DEBUG"}). SQL_ECHO logs SQL statements through the
+same queue; statement parameters are never logged.
+"""
+
+import copy
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+import orjson
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.db.models import EnvVariable, EnvVariableVersion
+from app.models.env_share import EnvShare
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+REDACTED = "[redacted]"
+
+# Attributes holding variable values or credentials, on whatever object or dict carries them
+SENSITIVE_FIELDS = frozenset(
+    {
+        EnvVariable.value.key,
+        EnvVariableVersion.value.key,
+        EnvShare.password_hash.key,
+        EnvShare.snapshot_payload.key,
+        "password",
+        "token",
+        "access_token",
+        "plaintext",
+        "ciphertext",
+    }
+)
+# Models whose instances are logged by identity only
+SENSITIVE_MODELS = (EnvVariable, EnvVariableVersion, EnvShare)
+
+_SECRET_PATTERNS = re.compile(
+    r"gAAAAA[0-9A-Za-z_\-]{20,}=*"  # Fernet ciphertext
+    r"|eyJ[0-9A-Za-z_\-]+\.[0-9A-Za-z_\-]+\.[0-9A-Za-z_\-]+"  # JWT
+    r"|\$2[aby]?\$\d{2}\$[./0-9A-Za-z]{53}"  # bcrypt hash
+)
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._\-]{1,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Use the client's X-Request-ID when it is well formed, else generate one"""
+    if incoming and _REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def _scrub(text: str) -> str:
+    return _SECRET_PATTERNS.sub(REDACTED, text)
+
+
+def redact(value):
+    """Copy of a log argument with secret fields masked"""
+    if isinstance(value, str):
+        return _scrub(value)
+    if isinstance(value, SENSITIVE_MODELS):
+        return f"<{type(value).__name__} id={getattr(value, 'id', None)} key={getattr(value, 'key', None)}>"
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SENSITIVE_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    return value
+
+
+class RedactionFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.args:
+            record.args = redact(record.args)
+        if isinstance(record.msg, str):
+            record.msg = _scrub(record.msg)
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            value = record.__dict__[key]
+            record.__dict__[key] = REDACTED if key in SENSITIVE_FIELDS else redact(value)
+        return True
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id, extra fields, traceback"""
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            entry[key] = record.__dict__[key]
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Renders the message and traceback in the caller's thread and never blocks on a full queue"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _scrub(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging() -> None:
+    """Install the queue handler on the root logger and start the writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = _QueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RedactionFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    if settings.SQL_ECHO:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
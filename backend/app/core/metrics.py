@@ -0,0 +1,242 @@
+"""
+Prometheus metrics without external dependencies.
+
+Recording is lock-free: every thread writes to its own shard (a plain dict
+reached through a thread-local), so a counter increment is a dict lookup and
+an add under the GIL. Shards are only merged when metrics are collected.
+
+Multi-worker deployments set METRICS_MULTIPROC_DIR to a directory shared by
+the workers (empty it before starting them). Each worker periodically writes
+its totals to metrics-<pid>.json there, and whichever worker serves /metrics
+merges every file, so the scrape covers all workers. Files of exited workers
+are kept so their counts do not go backwards.
+"""
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Key = Tuple[str, Tuple[str, ...]]
+
+
+class Registry:
+    """Metric definitions plus the per-thread shards holding their values."""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._shards: List[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def shard(self) -> dict:
+        """This thread's values; created (under the lock) on the thread's first write"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def snapshot(self) -> Dict[Key, object]:
+        """Values of this process, merged over all threads"""
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[Key, object] = {}
+        for shard in shards:
+            # dict() and list() copies are atomic under the GIL, so owners keep writing meanwhile
+            for key, value in dict(shard).items():
+                _merge(merged, key, list(value) if isinstance(value, list) else value)
+        return merged
+
+    def collect(self) -> Dict[Key, object]:
+        """Values to expose: this process, plus every worker's file in multiprocess mode"""
+        if not settings.METRICS_MULTIPROC_DIR:
+            return self.snapshot()
+        self.flush()
+        merged: Dict[Key, object] = {}
+        for name in os.listdir(settings.METRICS_MULTIPROC_DIR):
+            if not (name.startswith("metrics-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_MULTIPROC_DIR, name)) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                # Being replaced or truncated: the worker's next flush brings it back
+                continue
+            for metric, labels, value in entries:
+                if metric in self._metrics:
+                    _merge(merged, (metric, tuple(labels)), value)
+        return merged
+
+    def flush(self) -> None:
+        """Write this process's values to its file in METRICS_MULTIPROC_DIR"""
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return
+        entries = [[metric, list(labels), value] for (metric, labels), value in self.snapshot().items()]
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        values = self.collect()
+        by_metric: Dict[str, List[Tuple[Tuple[str, ...], object]]] = {}
+        for (metric, labels), value in values.items():
+            by_metric.setdefault(metric, []).append((labels, value))
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, value in sorted(by_metric.get(metric.name, ()), key=lambda item: item[0]):
+                metric.render(lines, labels, value)
+        return "\n".join(lines) + "\n"
+
+
+def _merge(merged: Dict[Key, object], key: Key, value) -> None:
+    current = merged.get(key)
+    if current is None:
+        merged[key] = value
+    elif isinstance(current, list):
+        for i, item in enumerate(value):
+            current[i] += item
+    else:
+        merged[key] = current + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry or REGISTRY
+        self._registry.register(self)
+
+
+class Counter(_Metric):
+    """Monotonic counter; label values are passed positionally in labelnames order."""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        values = self._registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0.0) + amount
+
+    def render(self, lines: List[str], labels: Tuple[str, ...], value: float) -> None:
+        lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds; each thread keeps per-bucket counts, sum and count."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional[Registry] = None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *labels: str) -> None:
+        values = self._registry.shard()
+        key = (self.name, labels)
+        state = values.get(key)
+        if state is None:
+            # Counts per bucket (the last one is +Inf), then sum and count
+            state = values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def render(self, lines: List[str], labels: Tuple[str, ...], state: List[float]) -> None:
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), state):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+        suffix = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{suffix} {_format_value(state[-2])}")
+        lines.append(f"{self.name}_count{suffix} {_format_value(state[-1])}")
+
+
+class MetricsFlusher:
+    """Writes this worker's metrics file every METRICS_FLUSH_INTERVAL_SECONDS (multiprocess mode only)."""
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not settings.METRICS_MULTIPROC_DIR or self._thread is not None:
+            return
+        os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(max(settings.METRICS_FLUSH_INTERVAL_SECONDS, 1)):
+            self._flush()
+
+    def _flush(self) -> None:
+        try:
+            self.registry.flush()
+        except OSError:
+            logger.exception("Failed to write metrics file")
+
+
+REGISTRY = Registry()
+metrics_flusher = MetricsFlusher(REGISTRY)
@@ -0,0 +1,220 @@
+"""
+On-demand profiling of single requests.
+
+With PROFILING_ENABLED, a request sent with `X-Profile: 1` by an operator
+(a user whose email is in PROFILING_OPERATORS, identified by the request's
+bearer token) is profiled by a sampling profiler: a background thread reads
+the stacks of the worker's threads every PROFILE_SAMPLE_INTERVAL_MS and keeps
+those running application code. The response carries the report id in
+`X-Profile-Id`, and PROFILE_DIR receives:
+
+  <id>.folded  collapsed stacks, one "frame;frame;frame count" line per stack,
+               for flamegraph.pl, speedscope or inferno
+  <id>.json    the request, sample counts and the top functions by own and
+               by total samples
+
+Only the newest PROFILE_MAX_REPORTS reports are kept. Sampling sees every
+thread of the worker, so on a busy worker stacks of concurrent requests can
+show up in the report; profile at low traffic for clean results. Requests
+without the header, or from anyone else, are not affected.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.security import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+TOP_FUNCTIONS = 30
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_BACKEND_DIR = os.path.dirname(_APP_DIR)
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = os.path.relpath(filename, _BACKEND_DIR)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads until stopped; keeps those with application frames."""
+
+    def __init__(self, interval: float, max_seconds: float):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _stack(self, frame) -> Optional[Stack]:
+        labels = []
+        in_app = False
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            in_app = in_app or code.co_filename.startswith(_APP_DIR)
+            frame = frame.f_back
+        if not in_app:
+            return None  # Idle pool threads, the event loop waiting, other daemons
+        labels.reverse()
+        return tuple(labels)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.stacks[stack] += 1
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> Dict[str, List[dict]]:
+        """Functions by own samples (running in them) and by total samples (on the stack)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+
+        def entries(counter: Counter) -> List[dict]:
+            return [
+                {"function": label, "own_samples": own[label], "total_samples": total[label]}
+                for label, _ in counter.most_common(limit)
+            ]
+
+        return {"by_own_samples": entries(own), "by_total_samples": entries(total)}
+
+
+def _operator_email(scope) -> Optional[str]:
+    """Email of the bearer token's user if it is an operator allowed to profile"""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            payload = decode_access_token(token.strip())
+            email = payload.get("sub") if payload else None
+            return email if email in settings.PROFILING_OPERATORS else None
+    return None
+
+
+def _wants_profile(scope) -> bool:
+    return any(name == PROFILE_HEADER and value.strip() in (b"1", b"true") for name, value in scope.get("headers", ()))
+
+
+def _write_report(profile_id: str, profiler: SamplingProfiler, meta: dict) -> None:
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{profile_id}.folded"), "w", encoding="utf-8") as f:
+        for stack, count in profiler.stacks.most_common():
+            f.write(f"{';'.join(stack)} {count}\n")
+    report = {
+        **meta,
+        "id": profile_id,
+        "interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+        "samples": profiler.samples,
+        "stacks": sum(profiler.stacks.values()),
+        "top_functions": profiler.top_functions(),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    _enforce_retention(directory)
+
+
+def _enforce_retention(directory: str) -> None:
+    reports = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in reports[: max(len(reports) - settings.PROFILE_MAX_REPORTS, 0)]:
+        profile_id = entry.name[: -len(".json")]
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it with X-Profile from an operator."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        operator = _operator_email(scope)
+        if operator is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000, settings.PROFILE_MAX_SECONDS)
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            route = scope.get("route")
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "operator": operator,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            try:
+                _write_report(profile_id, profiler, meta)
+            except OSError:
+                logger.exception("Failed to write profile %s", profile_id)
+            logger.info("Profiled %s %s as %s", scope["method"], scope["path"], profile_id)
@@ -0,0 +1,35 @@
+"""
+Fast JSON responses for list endpoints.
+
+Machine clients opt in with `Accept: application/vnd.envmanager.fast+json`.
+List endpoints then return rows built straight from Core result tuples and
+encoded with orjson, skipping ORM hydration and response_model validation.
+The JSON shape is the same as the default path.
+"""
+
+from typing import Any, Iterable, List, Sequence
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+FAST_JSON_MEDIA_TYPE = "application/vnd.envmanager.fast+json"
+
+
+class FastJSONResponse(Response):
+    """orjson-encoded response; datetimes render like pydantic (UTC as Z)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def wants_fast_json(request: Request) -> bool:
+    """Dependency: True when the client opted in to the fast response path"""
+    return FAST_JSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    """Turn Core result tuples into response dicts without per-row validation"""
+    return [dict(zip(fields, row)) for row in rows]
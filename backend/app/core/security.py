@@ -3,15 +3,30 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.metrics import Histogram
+from app.core.tracing import traced
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+BCRYPT_VERIFY_SECONDS = Histogram(
+    "bcrypt_verify_seconds",
+    "Password hash verifications (login and share links) by result",
+    ("result",),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0),
+)
 
+
+@traced("bcrypt.verify")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    start = time.perf_counter()
+    verified = pwd_context.verify(plain_password, hashed_password)
+    BCRYPT_VERIFY_SECONDS.observe(time.perf_counter() - start, "match" if verified else "mismatch")
+    return verified
 
 
+@traced("bcrypt.hash")
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
@@ -0,0 +1,343 @@
+"""
+In-process request tracing.
+
+A trace is started per request by RequestInstrumentationMiddleware; inside
+it, `span(name)` blocks and `@traced()` functions record nested, timed spans
+through a ContextVar (endpoints and sync dependencies run in the threadpool
+with a copy of the request's context, so they see the current span). SQL
+statements and encryption calls are recorded as spans too.
+
+Spans are kept in memory until the request ends, then the whole trace is
+kept if it was sampled (TRACE_SAMPLE_RATE), was slower than TRACE_SLOW_MS or
+failed, and handed to a background exporter that appends it to a rotating
+JSON-lines file (TRACE_FILE) and/or posts it to an OTLP/HTTP collector
+(TRACE_OTLP_ENDPOINT). Exporting never blocks a request: when the exporter
+falls behind, traces are dropped.
+
+With TRACING_ENABLED off, @traced() returns the function unchanged and
+span() returns a shared no-op context manager.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXPORT_QUEUE_SIZE = 1000
+SERVICE_NAME = "env-manager-api"
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start_ns - self.trace.root.start_ns) / 1e6, 3),
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """The spans of one request; list appends are atomic, so threadpool spans can add to it"""
+
+    __slots__ = ("trace_id", "sampled", "root", "spans", "dropped", "token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        # Head sampling; slow or failed traces are kept regardless when they end
+        self.sampled = random.random() < settings.TRACE_SAMPLE_RATE
+        self.root = Span(self, name, None, attributes)
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < settings.TRACE_MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def keep(self) -> bool:
+        slow = settings.TRACE_SLOW_MS > 0 and self.duration_ms >= settings.TRACE_SLOW_MS
+        return self.sampled or slow or self.root.error is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": self.root.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.root.attributes,
+            "error": self.root.error,
+            "dropped_spans": self.dropped,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def _span(parent: Span, name: str, attributes: Dict[str, Any]):
+    span = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = type(exc).__name__
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        parent.trace.add(span)
+
+
+def span(name: str, **attributes):
+    """Time a block as a child of the current span; a no-op outside a trace"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _span(parent, name, attributes)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes) -> None:
+    """Add an already timed operation (e.g. an SQL statement) under the current span"""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    child.start_ns = start_ns
+    child.end_ns = end_ns
+    parent.trace.add(child)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator recording each call as a span, named after the function (env_vars.service.get_env_variables)"""
+
+    def decorator(fn):
+        if not settings.TRACING_ENABLED:
+            return fn
+        span_name = name or f"{fn.__module__.removeprefix('app.')}.{fn.__qualname__}"
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_trace(name: str, **attributes) -> Optional[Span]:
+    """Open a trace with its root span bound to the current context; None when tracing is off"""
+    if not settings.TRACING_ENABLED:
+        return None
+    trace = Trace(name, attributes)
+    trace.token = _current_span.set(trace.root)
+    return trace.root
+
+
+def end_trace(root: Optional[Span], error: Optional[str] = None, **attributes) -> None:
+    """Close a trace opened by start_trace and export it if it is kept"""
+    if root is None:
+        return
+    root.end_ns = time.time_ns()
+    _current_span.reset(root.trace.token)
+    root.attributes.update(attributes)
+    root.error = error
+    if root.trace.keep():
+        trace_exporter.submit(root.trace)
+
+
+class _RotatingFile:
+    """Append-only JSON lines file rotated to .1 .. .N when it grows past max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, lines: List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            size = f.tell()
+        if self.max_bytes > 0 and size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, span: Span) -> dict:
+    otlp = {
+        "traceId": trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 2 if span is trace.root else 1,  # SERVER for the request, INTERNAL below it
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+def _otlp_payload(traces: List[Trace]) -> bytes:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest)"""
+    spans = [_otlp_span(trace, span) for trace in traces for span in [trace.root, *trace.spans]]
+    return json.dumps(
+        {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+    ).encode()
+
+
+class TraceExporter:
+    """Background thread writing kept traces to TRACE_FILE and/or TRACE_OTLP_ENDPOINT in batches."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[_RotatingFile] = None
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def start(self) -> None:
+        if not settings.TRACING_ENABLED or self._thread is not None:
+            return
+        if settings.TRACE_FILE:
+            self._file = _RotatingFile(settings.TRACE_FILE, settings.TRACE_FILE_MAX_BYTES, settings.TRACE_FILE_BACKUPS)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            traces = [trace for trace in batch if trace is not None]
+            if traces:
+                self._export(traces)
+            if stopping:
+                return
+
+    def _export(self, traces: List[Trace]) -> None:
+        if self._file is not None:
+            try:
+                self._file.write([json.dumps(trace.to_dict(), default=str) for trace in traces])
+            except OSError:
+                logger.exception("Failed to write traces to %s", settings.TRACE_FILE)
+        if settings.TRACE_OTLP_ENDPOINT:
+            request = urllib.request.Request(
+                settings.TRACE_OTLP_ENDPOINT,
+                data=_otlp_payload(traces),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=5):
+                    pass
+            except OSError as exc:
+                logger.warning("Failed to export %d traces to %s: %s", len(traces), settings.TRACE_OTLP_ENDPOINT, exc)
+
+
+trace_exporter = TraceExporter()
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.db.base import Base
 import enum
 
@@ -12,6 +12,13 @@ class Role(str, enum.Enum):
     READ_ONLY = "READ_ONLY"
 
 
+class DeletionStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -37,15 +44,19 @@ class Project(Base):
     
     # Relationships
     owner = relationship("User", back_populates="owned_projects", foreign_keys=[owner_id])
-    members = relationship("ProjectMember", back_populates="project", cascade="all, delete-orphan")
-    environments = relationship("Environment", back_populates="project", cascade="all, delete-orphan")
+    # The database cascades deletes (ON DELETE CASCADE); the ORM does not load children to delete them
+    members = relationship("ProjectMember", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    environments = relationship("Environment", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class ProjectMember(Base):
     __tablename__ = "project_members"
+    __table_args__ = (
+        UniqueConstraint("project_id", "user_id", name="uq_project_members_project_user"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     role = Column(SQLEnum(Role), nullable=False, default=Role.READ_ONLY)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -60,22 +71,53 @@ class Environment(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)  # DEV, QA, PROD
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    parent_id = Column(Integer, ForeignKey("environments.id", ondelete="SET NULL"), nullable=True, index=True)
+    revision = Column(Integer, nullable=False, default=0)  # Bumped on every variable change
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     project = relationship("Project", back_populates="environments")
-    env_variables = relationship("EnvVariable", back_populates="environment", cascade="all, delete-orphan")
+    env_variables = relationship("EnvVariable", back_populates="environment", cascade="all, delete-orphan", passive_deletes=True)
+    stats = relationship("EnvironmentStats", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+
+class EnvironmentStats(Base):
+    """Denormalized per-environment counters, adjusted on every write (app/environments/stats.py)"""
+    __tablename__ = "environment_stats"
+    
+    environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), primary_key=True)
+    variable_count = Column(Integer, nullable=False, default=0)  # Own variables, not inherited ones
+    secret_count = Column(Integer, nullable=False, default=0)
+    active_share_count = Column(Integer, nullable=False, default=0)
+    last_modified_at = Column(DateTime(timezone=True), server_default=func.now())  # Last variable change
 
 
 class EnvVariable(Base):
     __tablename__ = "env_variables"
+    __table_args__ = (
+        # Trigram indexes (pg_trgm) serve substring and prefix ILIKE searches
+        Index(
+            "ix_env_variables_key_trgm",
+            "key",
+            postgresql_using="gin",
+            postgresql_ops={"key": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_env_variables_value_trgm",
+            "value",
+            postgresql_using="gin",
+            postgresql_ops={"value": "gin_trgm_ops"},
+            postgresql_where=text("NOT is_secret"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, nullable=False)
     value = Column(Text, nullable=False)  # Encrypted value
+    value_digest = Column(String(64), nullable=True)  # HMAC of the plaintext, for diffs
     is_secret = Column(Boolean, default=False)
-    environment_id = Column(Integer, ForeignKey("environments.id"), nullable=False)
+    environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -83,6 +125,43 @@ class EnvVariable(Base):
     environment = relationship("Environment", back_populates="env_variables")
 
 
+class EnvMergedVariable(Base):
+    """
+    Materialized merged view of an environment that has a parent: one row per
+    effective key, pointing at the winning variable (own or inherited).
+    """
+    __tablename__ = "env_merged_variables"
+    __table_args__ = (
+        Index("ix_env_merged_variables_env_key", "environment_id", "key", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    variable_id = Column(Integer, ForeignKey("env_variables.id", ondelete="CASCADE"), nullable=False, index=True)
+    source_environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False)
+
+
+class EnvVariableVersion(Base):
+    """Append-only history of variable values, one row per key per environment revision."""
+    __tablename__ = "env_variable_versions"
+    __table_args__ = (
+        Index("ix_env_variable_versions_env_key_revision", "environment_id", "key", "revision"),
+        Index("ix_env_variable_versions_env_created_at", "environment_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    value = Column(Text, nullable=True)  # Stored value (encrypted if secret), NULL when deleted
+    value_digest = Column(String(64), nullable=True)
+    is_secret = Column(Boolean, nullable=False, default=False)
+    is_deleted = Column(Boolean, nullable=False, default=False)
+    revision = Column(Integer, nullable=False)
+    changed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
@@ -97,3 +176,24 @@ class AuditLog(Base):
     # Relationships
     user = relationship("User", back_populates="audit_logs")
 
+
+
+class DeletionJob(Base):
+    """Chunked background deletion of a large project (app/projects/deletion.py)"""
+    __tablename__ = "deletion_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, nullable=False, index=True)  # No FK: the project is deleted by the job
+    project_name = Column(String, nullable=False)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(SQLEnum(DeletionStatus), nullable=False, default=DeletionStatus.PENDING)
+    environments_total = Column(Integer, nullable=False, default=0)
+    environments_deleted = Column(Integer, nullable=False, default=0)
+    rows_deleted = Column(Integer, nullable=False, default=0)
+    # Lease of the worker running the job: its claim token and last progress; a RUNNING job
+    # whose heartbeat is older than PROJECT_DELETE_LEASE_SECONDS can be taken over
+    claimed_by = Column(String(32), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
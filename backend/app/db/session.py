@@ -1,8 +1,18 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.instrumentation import instrument_engine
+
+# Statements are logged through the sqlalchemy.engine logger (SQL_ECHO); parameters never are
+engine = create_engine(settings.DATABASE_URL, hide_parameters=True)
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        # SQLite only enforces ON DELETE CASCADE / SET NULL with foreign keys switched on
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+instrument_engine(engine)
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -0,0 +1,286 @@
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import and_, case, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import Environment, EnvVariable, EnvVariableVersion
+
+
+def bump_environment_revision(db: Session, environment_id: int) -> int:
+    """Increment the environment revision and return the new value"""
+    return db.execute(
+        update(Environment)
+        .where(Environment.id == environment_id)
+        .values(revision=Environment.revision + 1)
+        .returning(Environment.revision)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+
+def bump_environment_revisions(db: Session, environment_ids: Iterable[int]) -> None:
+    """Increment the revision of several environments in one statement"""
+    environment_ids = list(environment_ids)
+    if not environment_ids:
+        return
+    db.execute(
+        update(Environment)
+        .where(Environment.id.in_(environment_ids))
+        .values(revision=Environment.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_versions(db: Session, environment_id: int, keys: Iterable[str], user_id: Optional[int]) -> int:
+    """
+    Append the current state of the given keys to the history table.
+
+    Keys that no longer exist in the environment are recorded as deletions.
+    Must be called inside the transaction that changed the variables; returns
+    the new environment revision.
+    """
+    keys = set(keys)
+    db.flush()
+    revision = bump_environment_revision(db, environment_id)
+    if not keys:
+        return revision
+
+    present = set(
+        db.scalars(
+            select(EnvVariable.key).where(
+                EnvVariable.environment_id == environment_id,
+                EnvVariable.key.in_(keys),
+            )
+        )
+    )
+    if present:
+        db.execute(
+            insert(EnvVariableVersion).from_select(
+                ["environment_id", "key", "value", "value_digest", "is_secret", "is_deleted", "revision", "changed_by"],
+                select(
+                    EnvVariable.environment_id,
+                    EnvVariable.key,
+                    EnvVariable.value,
+                    EnvVariable.value_digest,
+                    EnvVariable.is_secret,
+                    literal(False),
+                    literal(revision),
+                    literal(user_id),
+                ).where(
+                    EnvVariable.environment_id == environment_id,
+                    EnvVariable.key.in_(present),
+                ),
+            )
+        )
+    removed = keys - present
+    if removed:
+        db.execute(
+            insert(EnvVariableVersion),
+            [
+                {
+                    "environment_id": environment_id,
+                    "key": key,
+                    "value": None,
+                    "is_secret": False,
+                    "is_deleted": True,
+                    "revision": revision,
+                    "changed_by": user_id,
+                }
+                for key in removed
+            ],
+        )
+
+    prune_versions(db, environment_id, keys)
+    return revision
+
+
+def prune_versions(db: Session, environment_id: int, keys: Iterable[str]) -> None:
+    """Drop versions beyond ENV_HISTORY_MAX_VERSIONS_PER_KEY for the given keys"""
+    limit = settings.ENV_HISTORY_MAX_VERSIONS_PER_KEY
+    if limit <= 0:
+        return
+    ranked = (
+        select(
+            EnvVariableVersion.id,
+            func.row_number()
+            .over(partition_by=EnvVariableVersion.key, order_by=EnvVariableVersion.revision.desc())
+            .label("rn"),
+        )
+        .where(
+            EnvVariableVersion.environment_id == environment_id,
+            EnvVariableVersion.key.in_(set(keys)),
+        )
+        .subquery()
+    )
+    db.execute(
+        delete(EnvVariableVersion)
+        .where(EnvVariableVersion.id.in_(select(ranked.c.id).where(ranked.c.rn > limit)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_versions(
+    db: Session,
+    environment_id: int,
+    key: Optional[str] = None,
+    limit: int = 100,
+) -> list[EnvVariableVersion]:
+    """Get history rows for an environment (optionally a single key), newest first"""
+    query = db.query(EnvVariableVersion).filter(EnvVariableVersion.environment_id == environment_id)
+    if key is not None:
+        query = query.filter(EnvVariableVersion.key == key)
+    return (
+        query.order_by(EnvVariableVersion.revision.desc(), EnvVariableVersion.key)
+        .limit(limit)
+        .all()
+    )
+
+
+def _version_bound(at: Optional[datetime], revision: Optional[int]) -> list:
+    bound = []
+    if revision is not None:
+        bound.append(EnvVariableVersion.revision <= revision)
+    if at is not None:
+        bound.append(EnvVariableVersion.created_at <= at)
+    return bound
+
+
+def get_versions_at(
+    db: Session,
+    environment_id: int,
+    at: Optional[datetime] = None,
+    revision: Optional[int] = None,
+) -> list[EnvVariableVersion]:
+    """
+    Reconstruct an environment as of a timestamp or revision.
+
+    Picks the latest version <= the bound for every key in one query (served by
+    the environment/key/revision index) and drops keys whose latest version is
+    a deletion. Keys whose state at the bound was pruned are not returned;
+    see get_truncated_keys.
+    """
+    bound = [EnvVariableVersion.environment_id == environment_id, *_version_bound(at, revision)]
+
+    latest = (
+        select(EnvVariableVersion.key, func.max(EnvVariableVersion.revision).label("revision"))
+        .where(*bound)
+        .group_by(EnvVariableVersion.key)
+        .subquery()
+    )
+    return (
+        db.query(EnvVariableVersion)
+        .join(
+            latest,
+            and_(
+                EnvVariableVersion.key == latest.c.key,
+                EnvVariableVersion.revision == latest.c.revision,
+            ),
+        )
+        .filter(
+            EnvVariableVersion.environment_id == environment_id,
+            EnvVariableVersion.is_deleted.is_(False),
+        )
+        .order_by(EnvVariableVersion.key)
+        .all()
+    )
+
+
+def get_truncated_keys(
+    db: Session,
+    environment_id: int,
+    at: Optional[datetime] = None,
+    revision: Optional[int] = None,
+) -> list[str]:
+    """
+    Keys whose state as of a timestamp or revision is unknown because it was pruned.
+
+    A key has no retained version <= the bound either because it did not exist
+    yet or because ENV_HISTORY_MAX_VERSIONS_PER_KEY pruned those versions.
+    Pruning leaves exactly the limit, so keys with fewer versions were never
+    pruned; keys with the full limit are reported, which may include a key
+    that merely was created after the bound.
+    """
+    limit = settings.ENV_HISTORY_MAX_VERSIONS_PER_KEY
+    if limit <= 0:
+        return []
+    within_bound = func.sum(case((and_(*_version_bound(at, revision)), 1), else_=0))
+    return list(
+        db.scalars(
+            select(EnvVariableVersion.key)
+            .where(EnvVariableVersion.environment_id == environment_id)
+            .group_by(EnvVariableVersion.key)
+            .having(func.count() >= limit, within_bound == 0)
+            .order_by(EnvVariableVersion.key)
+        )
+    )
+
+
+def restore_versions(
+    db: Session,
+    environment_id: int,
+    versions: list[EnvVariableVersion],
+    keep: Iterable[str] = (),
+) -> dict:
+    """
+    Make the environment's variables match the given versions.
+
+    Variables named in `keep` (keys whose target state is unknown) are left as
+    they are. Stored values are copied as-is, so secrets are never decrypted.
+    Does not commit.
+    """
+    keep = set(keep)
+    target = {v.key: v for v in versions}
+    # Keys without any history predate versioning and are left untouched
+    tracked = set(
+        db.scalars(
+            select(EnvVariableVersion.key)
+            .where(EnvVariableVersion.environment_id == environment_id)
+            .distinct()
+        )
+    )
+    current = db.query(EnvVariable).filter(EnvVariable.environment_id == environment_id).all()
+
+    changed: set[str] = set()
+    removed = updated = secrets_delta = 0
+    seen: set[str] = set()
+    for env_var in current:
+        if env_var.key not in tracked or env_var.key in keep:
+            continue
+        version = target.get(env_var.key)
+        if version is None or env_var.key in seen:
+            db.delete(env_var)
+            changed.add(env_var.key)
+            removed += 1
+            secrets_delta -= int(env_var.is_secret)
+            continue
+        seen.add(env_var.key)
+        if env_var.value != version.value or env_var.is_secret != version.is_secret:
+            secrets_delta += int(version.is_secret) - int(env_var.is_secret)
+            env_var.value = version.value
+            env_var.value_digest = version.value_digest
+            env_var.is_secret = version.is_secret
+            changed.add(env_var.key)
+            updated += 1
+
+    created = 0
+    for key, version in target.items():
+        if key not in seen:
+            db.add(
+                EnvVariable(
+                    key=key,
+                    value=version.value,
+                    value_digest=version.value_digest,
+                    is_secret=version.is_secret,
+                    environment_id=environment_id,
+                )
+            )
+            changed.add(key)
+            created += 1
+            secrets_delta += int(version.is_secret)
+
+    return {
+        "changed_keys": changed,
+        "created": created,
+        "updated": updated,
+        "removed": removed,
+        "secrets_delta": secrets_delta,
+    }
@@ -0,0 +1,228 @@
+"""
+Resolution of ${KEY} and ${env:OTHER_ENV.KEY} references in variable values.
+
+Resolved environments are cached per environment revision. Each cache entry
+also records the revisions of every environment it pulled values from, so an
+upstream change makes dependent entries stale even across workers; within a
+worker, writes additionally evict dependents eagerly through the
+reverse-dependency graph.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.encryption import encryption_service
+from app.core.tracing import traced
+from app.db.models import Environment, EnvVariable
+from app.environments.inheritance import effective_variables_query
+from app.projects.service import check_project_access
+
+REFERENCE_PATTERN = re.compile(r"\$\{(?:env:(?P<env>[^.}]+)\.)?(?P<key>[^}]+)\}")
+
+
+class ResolvedValue(NamedTuple):
+    value: str
+    is_secret: bool  # True if the variable or anything it references is secret
+
+
+class _CacheEntry(NamedTuple):
+    revision: int
+    upstream: Dict[int, int]  # environment_id -> revision the entry was built from
+    values: Dict[int, ResolvedValue]  # env_variable id -> resolved value
+
+
+_cache: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+_dependents: Dict[int, Set[int]] = {}
+_lock = threading.Lock()
+
+
+def has_references(value: Optional[str]) -> bool:
+    return bool(value) and "${" in value and REFERENCE_PATTERN.search(value) is not None
+
+
+def invalidate_environment(environment_id: int) -> None:
+    """Evict an environment and everything that (transitively) references it"""
+    with _lock:
+        pending = [environment_id]
+        seen: Set[int] = set()
+        while pending:
+            env_id = pending.pop()
+            if env_id in seen:
+                continue
+            seen.add(env_id)
+            _cache.pop(env_id, None)
+            pending.extend(_dependents.pop(env_id, ()))
+
+
+def _cache_get(db: Session, environment: Environment) -> Optional[Dict[int, ResolvedValue]]:
+    with _lock:
+        entry = _cache.get(environment.id)
+        if entry is not None:
+            _cache.move_to_end(environment.id)
+    if entry is None or entry.revision != environment.revision:
+        return None
+    if entry.upstream:
+        current = dict(
+            db.query(Environment.id, Environment.revision)
+            .filter(Environment.id.in_(entry.upstream.keys()))
+            .all()
+        )
+        if current != entry.upstream:
+            return None
+    return entry.values
+
+
+def _cache_put(environment_id: int, entry: _CacheEntry) -> None:
+    with _lock:
+        _cache[environment_id] = entry
+        _cache.move_to_end(environment_id)
+        for upstream_id in entry.upstream:
+            _dependents.setdefault(upstream_id, set()).add(environment_id)
+        while len(_cache) > settings.ENV_RESOLVE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+class _Resolver:
+    """Resolves one environment, loading referenced environments on demand."""
+
+    def __init__(self, db: Session, root: Environment, user_id: Optional[int]):
+        self.db = db
+        self.root = root
+        self.user_id = user_id
+        self.environments: Dict[int, Environment] = {root.id: root}
+        self.by_name: Dict[str, Environment] = {root.name.lower(): root}
+        self.variables: Dict[int, Dict[str, Tuple[str, bool]]] = {}
+        self.rows: Dict[int, list] = {}
+        self.checked_projects: Set[int] = set()
+        self.resolved: Dict[Tuple[int, str], ResolvedValue] = {}
+        # A reference to an environment that does not exist yet cannot be tracked by revision
+        self.cacheable = True
+
+    def load(self, environment: Environment, rows: Optional[Iterable] = None) -> Dict[str, Tuple[str, bool]]:
+        if environment.id in self.variables:
+            return self.variables[environment.id]
+        if rows is None:
+            rows = (
+                effective_variables_query(self.db, environment)
+                .with_entities(EnvVariable.id, EnvVariable.key, EnvVariable.value, EnvVariable.is_secret)
+                .all()
+            )
+        plain = []
+        for row in rows:
+            value = encryption_service.decrypt(row.value) if row.is_secret else row.value
+            plain.append((row.id, row.key, value, bool(row.is_secret)))
+        self.rows[environment.id] = plain
+        self.variables[environment.id] = {key: (value, is_secret) for _, key, value, is_secret in plain}
+        return self.variables[environment.id]
+
+    def environment_by_name(self, name: str) -> Optional[Environment]:
+        key = name.strip().lower()
+        if key not in self.by_name:
+            environment = (
+                self.db.query(Environment)
+                .filter(
+                    Environment.project_id == self.root.project_id,
+                    func.lower(Environment.name) == key,
+                )
+                .first()
+            )
+            if environment is None:
+                self.cacheable = False
+            else:
+                self._check_access(environment)
+                self.environments[environment.id] = environment
+            self.by_name[key] = environment
+        return self.by_name[key]
+
+    def _check_access(self, environment: Environment) -> None:
+        if self.user_id is None or environment.project_id in self.checked_projects:
+            return
+        check_project_access(self.db, environment.project_id, self.user_id)
+        self.checked_projects.add(environment.project_id)
+
+    def resolve(self, environment: Environment, key: str, stack: Tuple[Tuple[int, str], ...] = ()) -> Optional[ResolvedValue]:
+        node = (environment.id, key)
+        if node in self.resolved:
+            return self.resolved[node]
+        if node in stack:
+            path = " -> ".join(f"{self.environments[e].name}.{k}" for e, k in stack + (node,))
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Circular variable reference: {path}",
+            )
+
+        entry = self.load(environment).get(key)
+        if entry is None:
+            return None
+        raw, is_secret = entry
+        if not has_references(raw):
+            result = ResolvedValue(raw, is_secret)
+            self.resolved[node] = result
+            return result
+
+        secret = is_secret
+
+        def substitute(match: "re.Match") -> str:
+            nonlocal secret
+            target_env = environment
+            if match.group("env") is not None:
+                target_env = self.environment_by_name(match.group("env"))
+                if target_env is None:
+                    return match.group(0)
+            target = self.resolve(target_env, match.group("key"), stack + (node,))
+            if target is None:
+                # Unknown references are kept verbatim
+                return match.group(0)
+            secret = secret or target.is_secret
+            return target.value
+
+        value = REFERENCE_PATTERN.sub(substitute, raw)
+        result = ResolvedValue(value, secret)
+        self.resolved[node] = result
+        return result
+
+
+@traced()
+def resolve_environment(
+    db: Session,
+    environment: Environment,
+    user_id: Optional[int] = None,
+    rows: Optional[Iterable] = None,
+    use_cache: bool = True,
+) -> Dict[int, ResolvedValue]:
+    """
+    Resolve every variable of an environment, keyed by env_variable id.
+
+    `user_id` is checked against the project of every referenced environment;
+    pass None for callers that are already authorized (share links). `rows`
+    may carry preloaded (id, key, value, is_secret) rows for the environment.
+    """
+    if use_cache:
+        cached = _cache_get(db, environment)
+        if cached is not None:
+            return cached
+
+    resolver = _Resolver(db, environment, user_id)
+    resolver.load(environment, rows)
+    values: Dict[int, ResolvedValue] = {}
+    for var_id, key, value, is_secret in resolver.rows[environment.id]:
+        if has_references(value):
+            values[var_id] = resolver.resolve(environment, key)
+        else:
+            values[var_id] = ResolvedValue(value, is_secret)
+
+    upstream = {
+        env_id: env.revision
+        for env_id, env in resolver.environments.items()
+        if env_id != environment.id
+    }
+    if use_cache and resolver.cacheable:
+        _cache_put(environment.id, _CacheEntry(environment.revision, upstream, values))
+    return values
@@ -3,17 +3,38 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import User
 from app.users.dependencies import get_current_user
-from app.env_vars.schemas import EnvVariableCreate, EnvVariableUpdate, EnvVariableResponse
+from app.env_vars.schemas import (
+    EnvVariableCreate,
+    EnvVariableUpdate,
+    EnvVariableResponse,
+    EnvVariableVersionResponse,
+    EnvRollbackRequest,
+    EnvRollbackResponse,
+    EnvBatchRequest,
+    EnvBatchResponse,
+    EnvBulkDeleteRequest,
+    EnvBulkUpdateRequest,
+    EnvBulkResult,
+)
 from app.env_vars.service import (
     create_env_variable,
     get_env_variables,
     get_env_variable_by_id,
     update_env_variable,
     delete_env_variable,
-    get_env_file_content
+    get_env_file_content,
+    get_env_history,
+    get_env_snapshot,
+    rollback_env,
+    get_env_batch,
+    merge_env_batch,
+    bulk_delete_env_variables,
+    bulk_update_env_variables,
 )
 from app.audit.service import log_audit
-from typing import List
+from app.core.responses import FastJSONResponse, wants_fast_json
+from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter(prefix="/env", tags=["env_vars"])
 
@@ -26,26 +47,106 @@ def create_env_variable_endpoint(
 ):
     """Create a new environment variable"""
     env_var = create_env_variable(db, env_var_data, current_user.id)
+    # Serialized before the audit commit expires the instance
+    response = EnvVariableResponse.model_validate(env_var)
     
     # Log audit
-    log_audit(db, current_user.id, "create", "env_var", env_var.id, f"Created {env_var.key}")
+    log_audit(db, current_user.id, "create", "env_var", response.id, f"Created {response.key}")
+    
+    return response
+
+
+@router.post("/batch", response_model=EnvBatchResponse)
+def get_env_batch_endpoint(
+    body: EnvBatchRequest,
+    format: str = Query("json", pattern="^(json|dotenv)$", description="dotenv returns the merged document as a .env file"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download several environments in one request, optionally merged"""
+    batch = get_env_batch(db, body.environment_ids, current_user.id)
+    merge_order = body.merge_order or body.environment_ids
+    merged = merge_env_batch(batch, merge_order) if body.merge or body.merge_order or format == "dotenv" else None
+    
+    # Log audit (one entry for the whole batch)
+    ids = ", ".join(str(env_id) for env_id in batch)
+    log_audit(db, current_user.id, "copy", "env_var", None, f"Batch downloaded environments {ids}")
+    
+    if format == "dotenv":
+        return Response(
+            content="\n".join(f"{v['key']}={v['value']}" for v in merged),
+            media_type="text/plain",
+            headers={"Content-Disposition": "attachment; filename=env_batch.env"},
+        )
+    return {
+        "environments": [
+            {"environment_id": env_id, "variables": variables} for env_id, variables in batch.items()
+        ],
+        "merged": merged,
+    }
+
+
+@router.post("/bulk-delete", response_model=EnvBulkResult)
+def bulk_delete_env_variables_endpoint(
+    body: EnvBulkDeleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete many variables of one environment by id or key in a single statement"""
+    result = bulk_delete_env_variables(db, body.environment_id, current_user.id, body.ids, body.keys)
+    
+    # Log audit (one entry for the whole batch)
+    log_audit(
+        db,
+        current_user.id,
+        "delete",
+        "env_var",
+        body.environment_id,
+        f"Deleted {len(result['keys'])} variables: {', '.join(result['keys'])}",
+    )
+    
+    return result
+
+
+@router.patch("/bulk", response_model=EnvBulkResult)
+def bulk_update_env_variables_endpoint(
+    body: EnvBulkUpdateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update values and secret flags of many variables of one environment in a single statement"""
+    result = bulk_update_env_variables(db, body.environment_id, current_user.id, body.items)
+    
+    # Log audit (one entry for the whole batch)
+    log_audit(
+        db,
+        current_user.id,
+        "edit",
+        "env_var",
+        body.environment_id,
+        f"Updated {len(result['keys'])} variables: {', '.join(result['keys'])}",
+    )
     
-    return env_var
+    return result
 
 
 @router.get("/{environment_id}", response_model=List[EnvVariableResponse])
 def get_env_variables_endpoint(
     environment_id: int,
     reveal_secrets: bool = Query(False, description="Reveal secret values (requires ADMIN or OWNER role)"),
+    resolve: bool = Query(False, description="Substitute ${KEY} and ${env:ENV.KEY} references"),
+    fast_json: bool = Depends(wants_fast_json),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all environment variables for an environment"""
-    env_vars = get_env_variables(db, environment_id, current_user.id, reveal_secrets)
+    env_vars = get_env_variables(db, environment_id, current_user.id, reveal_secrets, resolve)
     
     # Log audit
     log_audit(db, current_user.id, "view", "env_var", environment_id, f"Viewed environment {environment_id}")
     
+    if fast_json:
+        return FastJSONResponse(env_vars)
     return env_vars
 
 
@@ -108,11 +209,13 @@ def update_env_variable_endpoint(
 ):
     """Update an environment variable"""
     env_var = update_env_variable(db, id, env_var_data, current_user.id)
+    # Serialized before the audit commit expires the instance
+    response = EnvVariableResponse.model_validate(env_var)
     
     # Log audit
-    log_audit(db, current_user.id, "edit", "env_var", id, f"Updated {env_var.key}")
+    log_audit(db, current_user.id, "edit", "env_var", id, f"Updated {response.key}")
     
-    return env_var
+    return response
 
 
 @router.delete("/{id}", status_code=204)
@@ -122,12 +225,7 @@ def delete_env_variable_endpoint(
     db: Session = Depends(get_db)
 ):
     """Delete an environment variable"""
-    # Get env_var before deletion for audit
-    from app.db.models import EnvVariable
-    env_var = db.query(EnvVariable).filter(EnvVariable.id == id).first()
-    key = env_var.key if env_var else "unknown"
-    
-    delete_env_variable(db, id, current_user.id)
+    key = delete_env_variable(db, id, current_user.id)
     
     # Log audit
     log_audit(db, current_user.id, "delete", "env_var", id, f"Deleted {key}")
@@ -151,3 +249,56 @@ def download_env_file(
         headers={"Content-Disposition": f"attachment; filename=env_{environment_id}.env"}
     )
 
+
+
+@router.get("/{environment_id}/history", response_model=List[EnvVariableVersionResponse])
+def get_env_history_endpoint(
+    environment_id: int,
+    key: Optional[str] = Query(None, description="Only return versions of this key"),
+    limit: int = Query(100, ge=1, le=1000),
+    reveal_secrets: bool = Query(False, description="Reveal secret values (requires ADMIN or OWNER role)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the change history of an environment, newest first"""
+    versions = get_env_history(db, environment_id, current_user.id, key, limit, reveal_secrets)
+    
+    # Log audit
+    log_audit(db, current_user.id, "view", "env_var", environment_id, f"Viewed history of environment {environment_id}")
+    
+    return versions
+
+
+@router.get("/{environment_id}/snapshot", response_model=List[EnvVariableVersionResponse])
+def get_env_snapshot_endpoint(
+    environment_id: int,
+    at: Optional[datetime] = Query(None, description="Point in time to reconstruct"),
+    revision: Optional[int] = Query(None, description="Environment revision to reconstruct"),
+    reveal_secrets: bool = Query(False, description="Reveal secret values (requires ADMIN or OWNER role)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Reconstruct an environment at a timestamp or revision"""
+    variables = get_env_snapshot(db, environment_id, current_user.id, at, revision, reveal_secrets)
+    
+    # Log audit
+    log_audit(db, current_user.id, "view", "env_var", environment_id, f"Viewed snapshot of environment {environment_id}")
+    
+    return variables
+
+
+@router.post("/{environment_id}/rollback", response_model=EnvRollbackResponse)
+def rollback_env_endpoint(
+    environment_id: int,
+    body: EnvRollbackRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Restore an environment to its state at a timestamp or revision"""
+    result = rollback_env(db, environment_id, current_user.id, body.at, body.revision)
+    
+    # Log audit
+    target = f"revision {body.revision}" if body.revision is not None else body.at.isoformat()
+    log_audit(db, current_user.id, "edit", "env_var", environment_id, f"Rolled back environment {environment_id} to {target}")
+    
+    return result
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class EnvVariableCreate(BaseModel):
@@ -41,3 +41,91 @@ class EnvVariableDecrypted(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class EnvVariableVersionResponse(BaseModel):
+    key: str
+    value: Optional[str]  # Masked if is_secret=True, None for deletions
+    is_secret: bool
+    is_deleted: bool
+    # Snapshots only: the key's state at that point was pruned from history
+    is_truncated: bool = False
+    revision: Optional[int]  # None for truncated snapshot entries
+    changed_by: Optional[int]
+    changed_at: Optional[datetime]
+
+
+class EnvRollbackRequest(BaseModel):
+    revision: Optional[int] = None
+    at: Optional[datetime] = None
+
+
+class EnvRollbackResponse(BaseModel):
+    environment_id: int
+    revision: int
+    created: int
+    updated: int
+    removed: int
+    # Keys whose state at the target was pruned from history; left unchanged
+    truncated_keys: List[str] = []
+
+
+class EnvBatchRequest(BaseModel):
+    environment_ids: List[int] = Field(..., min_length=1, max_length=50)
+    # Environments merged in this order, later ones overriding earlier keys;
+    # defaults to environment_ids when merge is requested
+    merge_order: Optional[List[int]] = None
+    merge: bool = False
+
+
+class EnvBatchVariable(BaseModel):
+    key: str
+    value: str
+    is_secret: bool
+
+
+class EnvBatchEnvironment(BaseModel):
+    environment_id: int
+    variables: List[EnvBatchVariable]
+
+
+class EnvBatchResponse(BaseModel):
+    environments: List[EnvBatchEnvironment]
+    merged: Optional[List[EnvBatchVariable]] = None
+
+
+class EnvBulkDeleteRequest(BaseModel):
+    environment_id: int
+    ids: List[int] = []
+    keys: List[str] = []
+
+    @model_validator(mode="after")
+    def ids_or_keys(self):
+        if not self.ids and not self.keys:
+            raise ValueError("Provide ids or keys to delete")
+        return self
+
+
+class EnvBulkUpdateItem(BaseModel):
+    id: Optional[int] = None
+    key: Optional[str] = None  # Used to find the variable when id is not given
+    value: Optional[str] = None
+    is_secret: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def target_and_change(self):
+        if self.id is None and self.key is None:
+            raise ValueError("Each item needs an id or a key")
+        if self.value is None and self.is_secret is None:
+            raise ValueError("Each item needs a value or is_secret")
+        return self
+
+
+class EnvBulkUpdateRequest(BaseModel):
+    environment_id: int
+    items: List[EnvBulkUpdateItem] = Field(..., min_length=1, max_length=1000)
+
+
+class EnvBulkResult(BaseModel):
+    environment_id: int
+    keys: List[str]  # Keys that were deleted or updated
@@ -1,11 +1,33 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import and_, case, delete, func, or_, update
 from sqlalchemy.orm import Session
 from app.db.models import EnvVariable, Environment, Role, ProjectMember
 from app.core.encryption import encryption_service
+from app.core.tracing import traced
+from app.env_vars.history import (
+    bump_environment_revisions,
+    get_truncated_keys,
+    get_versions,
+    get_versions_at,
+    record_versions,
+    restore_versions,
+)
+from app.env_vars.interpolation import has_references, invalidate_environment, resolve_environment
+from app.environments.inheritance import (
+    effective_variables_query,
+    effective_variables_select,
+    refresh_merged_view,
+)
 from app.environments.service import get_environment_by_id
+from app.environments.stats import adjust_environment_stats
 from app.projects.service import check_project_access
-from app.env_vars.schemas import EnvVariableCreate, EnvVariableUpdate
+from app.env_vars.schemas import EnvVariableCreate, EnvVariableUpdate, EnvBulkUpdateItem
 from fastapi import HTTPException, status
 
+logger = logging.getLogger(__name__)
+
 
 def mask_value(value: str) -> str:
     """Mask a secret value"""
@@ -31,13 +53,46 @@ def check_permission(role: Role, action: str, is_secret: bool) -> bool:
     return False
 
 
+@traced()
 def get_user_role_for_environment(db: Session, environment_id: int, user_id: int) -> Role:
     """Get user's role for the environment's project"""
     environment = get_environment_by_id(db, environment_id)
-    membership = check_project_access(db, environment.project_id, user_id)
-    return membership.role
+    return check_project_access(db, environment.project_id, user_id)
 
 
+def record_variable_changes(
+    db: Session,
+    environment_id: int,
+    keys,
+    user_id: Optional[int],
+    variables_delta: int = 0,
+    secrets_delta: int = 0,
+) -> int:
+    """
+    Bookkeeping shared by every write path on env_variables; call before commit.
+    The deltas are how many variables / secrets the write added (negative if removed).
+    """
+    keys = set(keys)
+    revision = record_versions(db, environment_id, keys, user_id)
+    adjust_environment_stats(db, environment_id, variables_delta, secrets_delta)
+    # Descendants see inherited values, so their merged view and revision move too
+    descendants = [
+        env_id for env_id in refresh_merged_view(db, environment_id, keys) if env_id != environment_id
+    ]
+    bump_environment_revisions(db, descendants)
+    invalidate_environment(environment_id)
+    for env_id in descendants:
+        invalidate_environment(env_id)
+    return revision
+
+
+def validate_references(db: Session, environment_id: int, user_id: int) -> None:
+    """Reject writes that introduce reference cycles or point at inaccessible environments"""
+    db.flush()
+    resolve_environment(db, get_environment_by_id(db, environment_id), user_id, use_cache=False)
+
+
+@traced()
 def create_env_variable(db: Session, env_var_data: EnvVariableCreate, user_id: int) -> EnvVariable:
     """Create a new environment variable"""
 
@@ -55,11 +110,17 @@ def create_env_variable(db: Session, env_var_data: EnvVariableCreate, user_id: i
     env_var = EnvVariable(
         key=env_var_data.key,
         value=stored_value,
+        value_digest=encryption_service.digest(env_var_data.value),
         is_secret=env_var_data.is_secret,
         environment_id=env_var_data.environment_id
     )
 
     db.add(env_var)
+    if has_references(env_var_data.value):
+        validate_references(db, env_var.environment_id, user_id)
+    record_variable_changes(
+        db, env_var.environment_id, {env_var.key}, user_id, variables_delta=1, secrets_delta=int(env_var.is_secret)
+    )
     db.commit()
     db.refresh(env_var)
 
@@ -337,6 +398,7 @@ def update_env_variable_1(
     return env_var
 
 
+@traced()
 def update_env_variable(
     db: Session,
     env_var_id: int,
@@ -344,73 +406,80 @@ def update_env_variable(
     user_id: int
 ) -> EnvVariable:
 
-    print("\n========== UPDATE ENV VAR DEBUG ==========")
-    print("Incoming payload:", env_var_data.dict())
-
     env_var = db.query(EnvVariable).filter(EnvVariable.id == env_var_id).first()
     if not env_var:
         raise HTTPException(status_code=404, detail="Environment variable not found")
 
-    print("DB BEFORE UPDATE ->")
-    print("  id:", env_var.id)
-    print("  key:", env_var.key)
-    print("  value:", env_var.value)
-    print("  is_secret:", env_var.is_secret)
-
     role = get_user_role_for_environment(db, env_var.environment_id, user_id)
-    print("User role:", role)
 
     if not check_permission(role, "edit", env_var.is_secret):
         raise HTTPException(status_code=403, detail="Insufficient permissions")
 
+    changed_keys = {env_var.key}
+    was_secret = bool(env_var.is_secret)
+
     # 🔥 CRITICAL: final secret state
     final_is_secret = (
         env_var_data.is_secret
         if env_var_data.is_secret is not None
         else env_var.is_secret
     )
-    print("Final is_secret decided as:", final_is_secret)
 
     # Update key
     if env_var_data.key is not None:
-        print("Updating key ->", env_var_data.key)
         env_var.key = env_var_data.key
 
     # Update secret flag
     env_var.is_secret = final_is_secret
-    print("is_secret AFTER assignment:", env_var.is_secret)
 
     # Update value
     if env_var_data.value is not None:
-        print("Incoming VALUE:", env_var_data.value)
+        env_var.value_digest = encryption_service.digest(env_var_data.value)
 
         if final_is_secret:
-            encrypted = encryption_service.encrypt(env_var_data.value)
-            print("Encrypted VALUE:", encrypted)
-            print("Encrypted starts with 'gAAAA' ?", encrypted.startswith("gAAAA"))
-            env_var.value = encrypted
+            env_var.value = encryption_service.encrypt(env_var_data.value)
         else:
-            print("Storing PLAINTEXT value")
             env_var.value = env_var_data.value
 
-    print("DB BEFORE COMMIT ->")
-    print("  value:", env_var.value)
-    print("  is_secret:", env_var.is_secret)
-
+    changed_keys.add(env_var.key)
+    if has_references(env_var_data.value) or len(changed_keys) > 1:
+        validate_references(db, env_var.environment_id, user_id)
+    record_variable_changes(
+        db, env_var.environment_id, changed_keys, user_id, secrets_delta=int(final_is_secret) - int(was_secret)
+    )
     db.commit()
     db.refresh(env_var)
 
-    print("DB AFTER COMMIT ->")
-    print("  value:", env_var.value)
-    print("  is_secret:", env_var.is_secret)
-    print("=========================================\n")
+    # Never log values: only what changed
+    logger.debug(
+        "Updated variable %s (%s) in environment %s as %s: renamed=%s value_changed=%s is_secret=%s->%s",
+        env_var.id,
+        env_var.key,
+        env_var.environment_id,
+        getattr(role, "value", role),
+        len(changed_keys) > 1,
+        env_var_data.value is not None,
+        was_secret,
+        final_is_secret,
+    )
 
     return env_var
 
 
 # this is new code update
 
-def env_var_to_response(env_var: EnvVariable, value: str) -> dict:
+ENV_VARIABLE_COLUMNS = (
+    EnvVariable.id,
+    EnvVariable.key,
+    EnvVariable.value,
+    EnvVariable.is_secret,
+    EnvVariable.environment_id,
+    EnvVariable.created_at,
+    EnvVariable.updated_at,
+)
+
+
+def env_var_to_response(env_var, value: str) -> dict:
     return {
         "id": env_var.id,
         "key": env_var.key,
@@ -422,23 +491,44 @@ def env_var_to_response(env_var: EnvVariable, value: str) -> dict:
     }
 
 
-def get_env_variables(db: Session, environment_id: int, user_id: int, reveal_secrets: bool = False):
+@traced()
+def get_env_variables(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    reveal_secrets: bool = False,
+    resolve_references: bool = False,
+):
     role = get_user_role_for_environment(db, environment_id, user_id)
-
-    env_vars = db.query(EnvVariable).filter(
-        EnvVariable.environment_id == environment_id
-    ).all()
+    environment = get_environment_by_id(db, environment_id)
+    reveal = role == Role.OWNER or (role == Role.ADMIN and reveal_secrets)
+
+    # Plain column rows: no ORM identity map or instance state per variable
+    env_vars = (
+        effective_variables_query(db, environment)
+        .with_entities(*ENV_VARIABLE_COLUMNS)
+        .order_by(EnvVariable.id)
+        .all()
+    )
 
     response = []
 
+    if resolve_references:
+        resolved = resolve_environment(db, environment, user_id, rows=env_vars)
+        for env_var in env_vars:
+            value, is_secret = resolved[env_var.id]
+            if is_secret and not reveal:
+                value = mask_value(value)
+            response.append(env_var_to_response(env_var, value))
+        return response
+
+    secrets = [env_var.value for env_var in env_vars if env_var.is_secret]
+    decrypted = iter(encryption_service.decrypt_many(secrets))
     for env_var in env_vars:
         if env_var.is_secret:
-            decrypted = encryption_service.decrypt(env_var.value)
-
-            if role == Role.OWNER or (role == Role.ADMIN and reveal_secrets):
-                value = decrypted
-            else:
-                value = mask_value(decrypted)
+            value = next(decrypted)
+            if not reveal:
+                value = mask_value(value)
         else:
             value = env_var.value  # plaintext stored
 
@@ -447,6 +537,7 @@ def get_env_variables(db: Session, environment_id: int, user_id: int, reveal_sec
     return response
 
 
+@traced()
 def get_env_variable_by_id(
     db: Session,
     env_var_id: int,
@@ -476,8 +567,9 @@ def get_env_variable_by_id(
 
 
 
-def delete_env_variable(db: Session, env_var_id: int, user_id: int) -> None:
-    """Delete an environment variable"""
+@traced()
+def delete_env_variable(db: Session, env_var_id: int, user_id: int) -> str:
+    """Delete an environment variable and return its key"""
     env_var = db.query(EnvVariable).filter(EnvVariable.id == env_var_id).first()
     if not env_var:
         raise HTTPException(
@@ -493,8 +585,13 @@ def delete_env_variable(db: Session, env_var_id: int, user_id: int) -> None:
             detail="Insufficient permissions"
         )
     
+    key = env_var.key
     db.delete(env_var)
+    record_variable_changes(
+        db, env_var.environment_id, {key}, user_id, variables_delta=-1, secrets_delta=-int(env_var.is_secret)
+    )
     db.commit()
+    return key
 
 
 # def get_env_file_content(db: Session, environment_id: int, user_id: int) -> str:
@@ -520,6 +617,7 @@ def delete_env_variable(db: Session, env_var_id: int, user_id: int) -> None:
     
 #     return "\n".join(lines)
 
+@traced()
 def get_env_file_content(db: Session, environment_id: int, user_id: int) -> str:
     """Get environment variables as .env file content"""
 
@@ -527,17 +625,320 @@ def get_env_file_content(db: Session, environment_id: int, user_id: int) -> str:
     if role not in [Role.OWNER, Role.ADMIN]:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
 
-    env_vars = db.query(EnvVariable).filter(
-        EnvVariable.environment_id == environment_id
-    ).all()
+    environment = get_environment_by_id(db, environment_id)
+    env_vars = effective_variables_query(db, environment).all()
+    resolved = resolve_environment(db, environment, user_id, rows=env_vars)
 
     lines = []
     for env_var in env_vars:
-        if env_var.is_secret:
-            value = encryption_service.decrypt(env_var.value)
-        else:
-            value = env_var.value  # plaintext
+        # Secrets are decrypted and ${...} references substituted by the resolver
+        value = resolved[env_var.id].value
 
         lines.append(f"{env_var.key}={value}")
 
     return "\n".join(lines)
+
+
+def _present_value(stored_value: str, is_secret: bool, role: Role, reveal_secrets: bool) -> str:
+    """Decrypt and mask a stored value according to the caller's role"""
+    if not is_secret:
+        return stored_value
+    decrypted = encryption_service.decrypt(stored_value)
+    if role == Role.OWNER or (role == Role.ADMIN and reveal_secrets):
+        return decrypted
+    return mask_value(decrypted)
+
+
+def version_to_response(version, value: Optional[str]) -> dict:
+    return {
+        "key": version.key,
+        "value": value,
+        "is_secret": version.is_secret,
+        "is_deleted": version.is_deleted,
+        "revision": version.revision,
+        "changed_by": version.changed_by,
+        "changed_at": version.created_at,
+    }
+
+
+def get_env_history(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    key: Optional[str] = None,
+    limit: int = 100,
+    reveal_secrets: bool = False,
+) -> list[dict]:
+    """Get the change history of an environment, newest first"""
+    role = get_user_role_for_environment(db, environment_id, user_id)
+    return [
+        version_to_response(
+            v,
+            None if v.is_deleted else _present_value(v.value, v.is_secret, role, reveal_secrets),
+        )
+        for v in get_versions(db, environment_id, key=key, limit=limit)
+    ]
+
+
+def get_env_snapshot(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    at: Optional[datetime] = None,
+    revision: Optional[int] = None,
+    reveal_secrets: bool = False,
+) -> list[dict]:
+    """Reconstruct the variables of an environment at a timestamp or revision"""
+    if at is None and revision is None:
+        raise HTTPException(status_code=400, detail="Either 'at' or 'revision' is required")
+
+    role = get_user_role_for_environment(db, environment_id, user_id)
+    snapshot = [
+        version_to_response(v, _present_value(v.value, v.is_secret, role, reveal_secrets))
+        for v in get_versions_at(db, environment_id, at=at, revision=revision)
+    ]
+    # Keys whose history at that point was pruned: state unknown, listed rather than omitted
+    snapshot += [
+        {
+            "key": key,
+            "value": None,
+            "is_secret": False,
+            "is_deleted": False,
+            "is_truncated": True,
+            "revision": None,
+            "changed_by": None,
+            "changed_at": None,
+        }
+        for key in get_truncated_keys(db, environment_id, at=at, revision=revision)
+    ]
+    snapshot.sort(key=lambda entry: entry["key"])
+    return snapshot
+
+
+def rollback_env(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    at: Optional[datetime] = None,
+    revision: Optional[int] = None,
+) -> dict:
+    """Restore an environment to its state at a timestamp or revision in one transaction"""
+    if at is None and revision is None:
+        raise HTTPException(status_code=400, detail="Either 'at' or 'revision' is required")
+
+    role = get_user_role_for_environment(db, environment_id, user_id)
+    if not check_permission(role, "edit", True):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+    versions = get_versions_at(db, environment_id, at=at, revision=revision)
+    # Variables whose state at the target was pruned from history are left as they are
+    truncated = get_truncated_keys(db, environment_id, at=at, revision=revision)
+    result = restore_versions(db, environment_id, versions, keep=truncated)
+    # Restored ${...} references can form a cycle with variables kept as they are
+    if result["changed_keys"]:
+        validate_references(db, environment_id, user_id)
+    new_revision = record_variable_changes(
+        db,
+        environment_id,
+        result["changed_keys"],
+        user_id,
+        variables_delta=result["created"] - result["removed"],
+        secrets_delta=result["secrets_delta"],
+    )
+    db.commit()
+
+    return {
+        "environment_id": environment_id,
+        "revision": new_revision,
+        "created": result["created"],
+        "updated": result["updated"],
+        "removed": result["removed"],
+        "truncated_keys": truncated,
+    }
+
+
+@traced()
+def get_env_batch(db: Session, environment_ids: List[int], user_id: int) -> Dict[int, List[dict]]:
+    """
+    Download several environments at once.
+
+    Authorizes every environment in one query, loads all variables in one
+    query and decrypts secrets in one batch. Same role rule as the single
+    download: OWNER or ADMIN on each environment's project.
+    """
+    environment_ids = list(dict.fromkeys(environment_ids))
+    access = (
+        db.query(Environment, ProjectMember.role)
+        .join(
+            ProjectMember,
+            and_(
+                ProjectMember.project_id == Environment.project_id,
+                ProjectMember.user_id == user_id,
+            ),
+        )
+        .filter(Environment.id.in_(environment_ids))
+        .all()
+    )
+    environments = {environment.id: environment for environment, _ in access}
+    missing = [env_id for env_id in environment_ids if env_id not in environments]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Access denied to environments: {', '.join(map(str, missing))}",
+        )
+    if any(role not in [Role.OWNER, Role.ADMIN] for _, role in access):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+    rows = db.execute(effective_variables_select(environments.values())).all()
+    secret_positions = [i for i, row in enumerate(rows) if row.is_secret]
+    values = [row.value for row in rows]
+    for i, plaintext in zip(secret_positions, encryption_service.decrypt_many(rows[i].value for i in secret_positions)):
+        values[i] = plaintext
+
+    grouped: Dict[int, list] = {env_id: [] for env_id in environment_ids}
+    for row, value in zip(rows, values):
+        grouped[row.target_environment_id].append((row, value))
+
+    result: Dict[int, List[dict]] = {}
+    for env_id, entries in grouped.items():
+        if any(has_references(value) for _, value in entries):
+            resolved = resolve_environment(db, environments[env_id], user_id, rows=[row for row, _ in entries])
+            entries = [(row, resolved[row.id].value) for row, _ in entries]
+        result[env_id] = [
+            {"key": row.key, "value": value, "is_secret": row.is_secret} for row, value in entries
+        ]
+    return result
+
+
+def merge_env_batch(batch: Dict[int, List[dict]], merge_order: List[int]) -> List[dict]:
+    """Merge downloaded environments, later environments overriding earlier keys"""
+    unknown = [env_id for env_id in merge_order if env_id not in batch]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"merge_order references environments not requested: {', '.join(map(str, unknown))}",
+        )
+    merged: Dict[str, dict] = {}
+    for env_id in merge_order:
+        for variable in batch[env_id]:
+            merged.pop(variable["key"], None)
+            merged[variable["key"]] = variable
+    return list(merged.values())
+
+
+def _require_bulk_edit(db: Session, environment_id: int, user_id: int) -> None:
+    # One check per environment; "edit" on secrets is the strictest row-level rule
+    role = get_user_role_for_environment(db, environment_id, user_id)
+    if not check_permission(role, "edit", True):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+
+@traced()
+def bulk_delete_env_variables(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    ids: List[int],
+    keys: List[str],
+) -> dict:
+    """Delete variables of one environment by id or key with one DELETE ... RETURNING"""
+    _require_bulk_edit(db, environment_id, user_id)
+
+    deleted = db.execute(
+        delete(EnvVariable)
+        .where(
+            EnvVariable.environment_id == environment_id,
+            or_(EnvVariable.id.in_(ids), EnvVariable.key.in_(keys)),
+        )
+        .returning(EnvVariable.key, EnvVariable.is_secret)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    record_variable_changes(
+        db,
+        environment_id,
+        {key for key, _ in deleted},
+        user_id,
+        variables_delta=-len(deleted),
+        secrets_delta=-sum(1 for _, is_secret in deleted if is_secret),
+    )
+    db.commit()
+    return {"environment_id": environment_id, "keys": sorted({key for key, _ in deleted})}
+
+
+@traced()
+def bulk_update_env_variables(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    items: List[EnvBulkUpdateItem],
+) -> dict:
+    """
+    Update values and secret flags of many variables with one UPDATE ... RETURNING.
+
+    Rows are read once to resolve keys and to re-encrypt values whose secret
+    flag flips without a new value being supplied.
+    """
+    _require_bulk_edit(db, environment_id, user_id)
+
+    ids = [item.id for item in items if item.id is not None]
+    keys = [item.key for item in items if item.id is None]
+    rows = (
+        db.query(EnvVariable.id, EnvVariable.key, EnvVariable.value, EnvVariable.is_secret)
+        .filter(
+            EnvVariable.environment_id == environment_id,
+            or_(EnvVariable.id.in_(ids), EnvVariable.key.in_(keys)),
+        )
+        .all()
+    )
+    by_id = {row.id: row for row in rows}
+    by_key = {row.key: row for row in rows}
+
+    missing = [str(item.id if item.id is not None else item.key) for item in items
+               if (by_id.get(item.id) if item.id is not None else by_key.get(item.key)) is None]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Environment variables not found: {', '.join(missing)}",
+        )
+
+    values, digests, flags = {}, {}, {}
+    references = False
+    for item in items:
+        row = by_id[item.id] if item.id is not None else by_key[item.key]
+        is_secret = item.is_secret if item.is_secret is not None else row.is_secret
+        if item.value is not None:
+            plaintext = item.value
+            digests[row.id] = encryption_service.digest(plaintext)
+            references = references or has_references(plaintext)
+        elif is_secret != row.is_secret:
+            plaintext = encryption_service.decrypt(row.value) if row.is_secret else row.value
+        else:
+            continue
+        values[row.id] = encryption_service.encrypt(plaintext) if is_secret else plaintext
+        flags[row.id] = is_secret
+
+    if not values:
+        return {"environment_id": environment_id, "keys": []}
+
+    assignments = {
+        "value": case(values, value=EnvVariable.id, else_=EnvVariable.value),
+        "is_secret": case(flags, value=EnvVariable.id, else_=EnvVariable.is_secret),
+        "updated_at": func.now(),
+    }
+    if digests:
+        assignments["value_digest"] = case(digests, value=EnvVariable.id, else_=EnvVariable.value_digest)
+    updated = db.execute(
+        update(EnvVariable)
+        .where(EnvVariable.environment_id == environment_id, EnvVariable.id.in_(values.keys()))
+        .values(**assignments)
+        .returning(EnvVariable.key)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    if references:
+        validate_references(db, environment_id, user_id)
+    secrets_delta = sum(int(flag) - int(by_id[var_id].is_secret) for var_id, flag in flags.items())
+    record_variable_changes(db, environment_id, updated, user_id, secrets_delta=secrets_delta)
+    db.commit()
+    return {"environment_id": environment_id, "keys": sorted(set(updated))}
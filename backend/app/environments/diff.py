@@ -0,0 +1,68 @@
+"""
+Decryption-free comparison of two environments.
+
+Every variable carries an HMAC digest of its plaintext, so two environments
+can be compared key by key in one grouped query without decrypting anything.
+Only keys are returned, which makes the diff safe for every project role.
+"""
+
+from sqlalchemy import and_, case, func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from app.db.models import EnvVariable
+from app.environments.inheritance import effective_variables_query
+from app.environments.service import get_environment_by_id
+from app.projects.service import check_project_access
+
+
+def _side(db: Session, environment, in_a: int):
+    digests = effective_variables_query(db, environment).with_entities(
+        EnvVariable.key, EnvVariable.value_digest
+    ).subquery()
+    digest = digests.c.value_digest
+    return select(
+        digests.c.key.label("key"),
+        (digest if in_a else null()).label("a_digest"),
+        (null() if in_a else digest).label("b_digest"),
+        literal(in_a).label("in_a"),
+        literal(1 - in_a).label("in_b"),
+    )
+
+
+def diff_environments(db: Session, environment_id: int, other_id: int, user_id: int) -> dict:
+    """
+    Compare the variables of two environments (including inherited ones).
+
+    added: only in the other environment; removed: only in the first;
+    changed: in both with different values (or a digest is missing).
+    """
+    environment = get_environment_by_id(db, environment_id)
+    other = get_environment_by_id(db, other_id)
+    check_project_access(db, environment.project_id, user_id)
+    if other.project_id != environment.project_id:
+        check_project_access(db, other.project_id, user_id)
+
+    rows = union_all(_side(db, environment, 1), _side(db, other, 0)).subquery()
+    a_digest = func.max(rows.c.a_digest)
+    b_digest = func.max(rows.c.b_digest)
+    in_a = func.max(rows.c.in_a)
+    in_b = func.max(rows.c.in_b)
+    state = case(
+        (in_b == 0, "removed"),
+        (in_a == 0, "added"),
+        (and_(a_digest.is_not(None), a_digest == b_digest), "equal"),
+        else_="changed",
+    )
+    query = select(rows.c.key, state).group_by(rows.c.key).order_by(rows.c.key)
+
+    result = {
+        "environment_id": environment_id,
+        "other_environment_id": other_id,
+        "added": [],
+        "removed": [],
+        "changed": [],
+        "equal": [],
+    }
+    for key, key_state in db.execute(query):
+        result[key_state].append(key)
+    return result
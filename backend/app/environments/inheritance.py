@@ -0,0 +1,182 @@
+"""
+Environment inheritance.
+
+An environment with a parent exposes the merged variables of its ancestors,
+child keys overriding parent keys. The merged result is materialized in
+env_merged_variables (pointers to the winning env_variables rows) and kept up
+to date whenever a variable or a parent link changes anywhere above it, so
+reads are a single join regardless of hierarchy depth. Root environments are
+not materialized; their own rows are their merged view.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, literal, select, union_all
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select
+
+from app.core.tracing import traced
+from app.db.models import EnvMergedVariable, Environment, EnvVariable
+
+# key -> (env_variable id, source environment id)
+MergedMap = Dict[str, Tuple[int, int]]
+
+
+def effective_variables_query(db: Session, environment: Environment) -> Query:
+    """Query for the variables an environment exposes, including inherited ones"""
+    if environment.parent_id is None:
+        return db.query(EnvVariable).filter(EnvVariable.environment_id == environment.id)
+    return (
+        db.query(EnvVariable)
+        .join(EnvMergedVariable, EnvMergedVariable.variable_id == EnvVariable.id)
+        .filter(EnvMergedVariable.environment_id == environment.id)
+    )
+
+
+def effective_variables_select(environments: Iterable[Environment]) -> Select:
+    """
+    One statement returning the effective variables of several environments,
+    each row tagged with the environment that exposes it (target_environment_id).
+    """
+    columns = (EnvVariable.id, EnvVariable.key, EnvVariable.value, EnvVariable.is_secret)
+    roots = [e.id for e in environments if e.parent_id is None]
+    children = [e.id for e in environments if e.parent_id is not None]
+    parts = []
+    if roots:
+        parts.append(
+            select(EnvVariable.environment_id.label("target_environment_id"), *columns).where(
+                EnvVariable.environment_id.in_(roots)
+            )
+        )
+    if children:
+        parts.append(
+            select(EnvMergedVariable.environment_id.label("target_environment_id"), *columns)
+            .join(EnvMergedVariable, EnvMergedVariable.variable_id == EnvVariable.id)
+            .where(EnvMergedVariable.environment_id.in_(children))
+        )
+    rows = (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
+    return select(rows).order_by(rows.c.target_environment_id, rows.c.id)
+
+
+def get_subtree(db: Session, environment_id: int) -> List[Tuple[int, Optional[int]]]:
+    """(id, parent_id) of an environment and all its descendants, parents before children"""
+    tree = (
+        select(Environment.id, Environment.parent_id, literal(0).label("depth"))
+        .where(Environment.id == environment_id)
+        .cte("env_tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(Environment.id, Environment.parent_id, tree.c.depth + 1).where(
+            Environment.parent_id == tree.c.id
+        )
+    )
+    return [(row.id, row.parent_id) for row in db.execute(select(tree).order_by(tree.c.depth))]
+
+
+def validate_parent(db: Session, environment: Environment, parent_id: Optional[int]) -> None:
+    """Ensure a parent is in the same project and does not create a cycle"""
+    if parent_id is None:
+        return
+    parent = db.query(Environment).filter(Environment.id == parent_id).first()
+    if not parent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Parent environment not found",
+        )
+    if parent.project_id != environment.project_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parent environment must belong to the same project",
+        )
+    if environment.id is not None and parent_id in {env_id for env_id, _ in get_subtree(db, environment.id)}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An environment cannot inherit from itself or one of its descendants",
+        )
+
+
+def _own_variables(db: Session, environment_ids: List[int], keys: Optional[set]) -> Dict[int, MergedMap]:
+    query = db.query(EnvVariable.id, EnvVariable.key, EnvVariable.environment_id).filter(
+        EnvVariable.environment_id.in_(environment_ids)
+    )
+    if keys is not None:
+        query = query.filter(EnvVariable.key.in_(keys))
+    result: Dict[int, MergedMap] = {}
+    # Ordered by id so the newest duplicate of a key wins, matching the merged unique index
+    for var_id, key, env_id in query.order_by(EnvVariable.id):
+        result.setdefault(env_id, {})[key] = (var_id, env_id)
+    return result
+
+
+def _merged_map(db: Session, environment_id: Optional[int], keys: Optional[set]) -> MergedMap:
+    if environment_id is None:
+        return {}
+    environment = db.get(Environment, environment_id)
+    if environment.parent_id is None:
+        return _own_variables(db, [environment_id], keys).get(environment_id, {})
+    query = db.query(
+        EnvMergedVariable.key, EnvMergedVariable.variable_id, EnvMergedVariable.source_environment_id
+    ).filter(EnvMergedVariable.environment_id == environment_id)
+    if keys is not None:
+        query = query.filter(EnvMergedVariable.key.in_(keys))
+    return {key: (var_id, source_id) for key, var_id, source_id in query}
+
+
+@traced()
+def refresh_merged_view(db: Session, environment_id: int, keys: Optional[Iterable[str]] = None) -> List[int]:
+    """
+    Recompute the materialized view for an environment and its descendants.
+
+    With `keys`, only those keys are recomputed (the incremental path used by
+    variable writes); without, the subtree is rebuilt (used when parent links
+    change). Returns the ids of the environments whose merged view was
+    refreshed. Does not commit.
+    """
+    keys = set(keys) if keys is not None else None
+    db.flush()
+    subtree = get_subtree(db, environment_id)
+    if not subtree or (len(subtree) == 1 and subtree[0][1] is None):
+        # A root without children has nothing materialized
+        return []
+
+    root_id, root_parent = subtree[0]
+    own = _own_variables(db, [env_id for env_id, _ in subtree], keys)
+    merged: Dict[int, MergedMap] = {}
+    materialized: List[int] = []
+    rows = []
+    for env_id, parent_id in subtree:
+        if env_id == root_id and root_parent is None:
+            merged[env_id] = own.get(env_id, {})
+            continue
+        base = _merged_map(db, root_parent, keys) if env_id == root_id else merged[parent_id]
+        current = dict(base)
+        current.update(own.get(env_id, {}))
+        merged[env_id] = current
+        materialized.append(env_id)
+        rows.extend(
+            {
+                "environment_id": env_id,
+                "key": key,
+                "variable_id": var_id,
+                "source_environment_id": source_id,
+            }
+            for key, (var_id, source_id) in current.items()
+        )
+
+    stale = delete(EnvMergedVariable).where(EnvMergedVariable.environment_id.in_(materialized))
+    if keys is not None:
+        stale = stale.where(EnvMergedVariable.key.in_(keys))
+    db.execute(stale.execution_options(synchronize_session=False))
+    if rows:
+        db.execute(insert(EnvMergedVariable), rows)
+    return materialized
+
+
+def clear_merged_view(db: Session, environment_id: int) -> None:
+    """Drop the materialized rows of an environment that no longer has a parent"""
+    db.execute(
+        delete(EnvMergedVariable)
+        .where(EnvMergedVariable.environment_id == environment_id)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,204 @@
+"""
+Server-side environment clone and promote.
+
+Variables are copied with INSERT ... SELECT / UPDATE statements inside one
+transaction, together with the audit entry. All values share the master key,
+so stored ciphertexts (and their digests) are copied as-is; the copied
+references are validated before commit, which resolves the target.
+"""
+
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import exists, insert, literal, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.audit.service import log_audit
+from app.db.models import Environment, EnvVariable
+from app.env_vars.service import (
+    check_permission,
+    get_user_role_for_environment,
+    record_variable_changes,
+    validate_references,
+)
+from app.environments.inheritance import effective_variables_query
+from app.environments.schemas import OverwritePolicy
+from app.environments.service import add_environment, get_environment_by_id
+
+
+def _key_matches(pattern: str):
+    if "*" not in pattern:
+        return EnvVariable.key == pattern
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "%")
+    return EnvVariable.key.like(escaped, escape="\\")
+
+
+def _source_subquery(
+    db: Session,
+    environment: Environment,
+    include_keys: Optional[List[str]],
+    exclude_keys: Optional[List[str]],
+    inherited: bool,
+):
+    if inherited:
+        query = effective_variables_query(db, environment)
+    else:
+        query = db.query(EnvVariable).filter(EnvVariable.environment_id == environment.id)
+    if include_keys:
+        query = query.filter(or_(*[_key_matches(p) for p in include_keys]))
+    if exclude_keys:
+        query = query.filter(not_(or_(*[_key_matches(p) for p in exclude_keys])))
+    return query.with_entities(
+        EnvVariable.key, EnvVariable.value, EnvVariable.value_digest, EnvVariable.is_secret
+    ).subquery("source")
+
+
+def _require_copy_roles(db: Session, source_id: int, target_id: Optional[int], user_id: int) -> None:
+    # Copying includes secrets, so both sides need the download-level role
+    if not check_permission(get_user_role_for_environment(db, source_id, user_id), "copy", True):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    if target_id is not None and not check_permission(
+        get_user_role_for_environment(db, target_id, user_id), "edit", True
+    ):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+
+def _insert_missing(db: Session, source, target_id: int) -> Tuple[int, int]:
+    """INSERT ... SELECT the source keys that the target does not have yet; returns (variables, secrets)"""
+    present = exists().where(EnvVariable.environment_id == target_id, EnvVariable.key == source.c.key)
+    inserted = db.execute(
+        insert(EnvVariable)
+        .from_select(
+            ["key", "value", "value_digest", "is_secret", "environment_id"],
+            select(
+                source.c.key, source.c.value, source.c.value_digest, source.c.is_secret, literal(target_id)
+            ).where(~present),
+        )
+        .returning(EnvVariable.is_secret)
+    ).scalars().all()
+    return len(inserted), sum(1 for is_secret in inserted if is_secret)
+
+
+def clone_environment(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    name: str,
+    include_keys: Optional[List[str]] = None,
+    exclude_keys: Optional[List[str]] = None,
+) -> dict:
+    """Create a new environment with a copy of another's variables in one transaction"""
+    source_env = get_environment_by_id(db, environment_id)
+    _require_copy_roles(db, environment_id, None, user_id)
+
+    # The clone keeps the source's parent, so copying its own rows reproduces its merged view
+    target_env = add_environment(db, name, source_env.project_id, source_env.parent_id)
+    source = _source_subquery(db, source_env, include_keys, exclude_keys, inherited=False)
+    keys = {key for (key,) in db.query(source.c.key)}
+    created, secrets = _insert_missing(db, source, target_env.id)
+
+    record_variable_changes(db, target_env.id, keys, user_id, variables_delta=created, secrets_delta=secrets)
+    if created:
+        validate_references(db, target_env.id, user_id)
+    log_audit(
+        db,
+        user_id,
+        "create",
+        "environment",
+        target_env.id,
+        f"Cloned environment {environment_id} ({created} variables)",
+        commit=False,
+    )
+    db.commit()
+
+    return {
+        "source_environment_id": environment_id,
+        "target_environment_id": target_env.id,
+        "created": created,
+        "updated": 0,
+        "skipped": 0,
+    }
+
+
+def promote_environment(
+    db: Session,
+    source_id: int,
+    target_id: int,
+    user_id: int,
+    include_keys: Optional[List[str]] = None,
+    exclude_keys: Optional[List[str]] = None,
+    overwrite: OverwritePolicy = OverwritePolicy.SKIP,
+) -> dict:
+    """Copy the variables an environment exposes into another one in one transaction"""
+    if source_id == target_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Source and target environments must differ",
+        )
+    source_env = get_environment_by_id(db, source_id)
+    get_environment_by_id(db, target_id)
+    _require_copy_roles(db, source_id, target_id, user_id)
+
+    source = _source_subquery(db, source_env, include_keys, exclude_keys, inherited=True)
+    keys = {key for (key,) in db.query(source.c.key)}
+    existing = dict(
+        db.query(EnvVariable.key, EnvVariable.is_secret).filter(
+            EnvVariable.environment_id == target_id,
+            EnvVariable.key.in_(keys),
+        )
+    )
+
+    if existing and overwrite == OverwritePolicy.FAIL:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Target environment already defines: {', '.join(sorted(existing))}",
+        )
+
+    updated = secrets_delta = 0
+    if existing and overwrite == OverwritePolicy.OVERWRITE:
+        def _from_source(column):
+            return select(column).where(source.c.key == EnvVariable.key).limit(1).scalar_subquery()
+
+        overwritten = db.execute(
+            update(EnvVariable)
+            .where(EnvVariable.environment_id == target_id, EnvVariable.key.in_(list(existing)))
+            .values(
+                value=_from_source(source.c.value),
+                value_digest=_from_source(source.c.value_digest),
+                is_secret=_from_source(source.c.is_secret),
+            )
+            .returning(EnvVariable.key, EnvVariable.is_secret)
+            .execution_options(synchronize_session=False)
+        ).all()
+        updated = len(overwritten)
+        secrets_delta = sum(int(is_secret) - int(existing[key]) for key, is_secret in overwritten)
+
+    created, created_secrets = _insert_missing(db, source, target_id)
+
+    changed = keys if overwrite == OverwritePolicy.OVERWRITE else keys - existing.keys()
+    record_variable_changes(
+        db, target_id, changed, user_id, variables_delta=created, secrets_delta=secrets_delta + created_secrets
+    )
+    # Copied ${...} references can form a cycle with the target's own variables
+    if created or updated:
+        validate_references(db, target_id, user_id)
+    skipped = len(existing) if overwrite == OverwritePolicy.SKIP else 0
+    log_audit(
+        db,
+        user_id,
+        "edit",
+        "environment",
+        target_id,
+        f"Promoted environment {source_id} into {target_id} "
+        f"({created} created, {updated} updated, {skipped} skipped)",
+        commit=False,
+    )
+    db.commit()
+
+    return {
+        "source_environment_id": source_id,
+        "target_environment_id": target_id,
+        "created": created,
+        "updated": updated,
+        "skipped": skipped,
+    }
@@ -3,13 +3,23 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import User
 from app.users.dependencies import get_current_user
-from app.environments.schemas import EnvironmentCreate, EnvironmentUpdate, EnvironmentResponse
+from app.environments.schemas import (
+    EnvironmentCreate,
+    EnvironmentUpdate,
+    EnvironmentResponse,
+    EnvironmentCloneRequest,
+    EnvironmentPromoteRequest,
+    EnvironmentCopyResponse,
+    EnvironmentDiffResponse,
+)
 from app.environments.service import (
     create_environment,
     get_environments_by_project,
     update_environment,
     delete_environment,
 )
+from app.environments.diff import diff_environments
+from app.environments.promotion import clone_environment, promote_environment
 from typing import List
 
 router = APIRouter(prefix="/environments", tags=["environments"])
@@ -26,7 +36,8 @@ def create_environment_endpoint(
         db,
         environment_data.name,
         environment_data.project_id,
-        current_user.id
+        current_user.id,
+        environment_data.parent_id
     )
     return environment
 
@@ -62,3 +73,56 @@ def delete_environment_endpoint(
     """Delete an environment. User must have access to the project."""
     delete_environment(db, environment_id, current_user.id)
 
+
+
+@router.post(
+    "/{environment_id}/clone",
+    response_model=EnvironmentCopyResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+def clone_environment_endpoint(
+    environment_id: int,
+    body: EnvironmentCloneRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a new environment with a server-side copy of this environment's variables"""
+    return clone_environment(
+        db,
+        environment_id,
+        current_user.id,
+        body.name,
+        body.include_keys,
+        body.exclude_keys,
+    )
+
+
+@router.post("/{source_id}/promote/{target_id}", response_model=EnvironmentCopyResponse)
+def promote_environment_endpoint(
+    source_id: int,
+    target_id: int,
+    body: EnvironmentPromoteRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Copy variables from one environment into another server-side"""
+    return promote_environment(
+        db,
+        source_id,
+        target_id,
+        current_user.id,
+        body.include_keys,
+        body.exclude_keys,
+        body.overwrite,
+    )
+
+
+@router.get("/{environment_id}/diff/{other_id}", response_model=EnvironmentDiffResponse)
+def diff_environments_endpoint(
+    environment_id: int,
+    other_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Compare two environments by key without decrypting any value"""
+    return diff_environments(db, environment_id, other_id, current_user.id)
@@ -1,24 +1,63 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+import enum
 
 
 class EnvironmentCreate(BaseModel):
     name: str
     project_id: int
+    parent_id: Optional[int] = None  # Inherit variables from this environment
 
 
 class EnvironmentUpdate(BaseModel):
     name: Optional[str] = None
     project_id: Optional[int] = None
+    parent_id: Optional[int] = None  # Send null explicitly to stop inheriting
 
 
 class EnvironmentResponse(BaseModel):
     id: int
     name: str
     project_id: int
+    parent_id: Optional[int] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+
+
+class OverwritePolicy(str, enum.Enum):
+    SKIP = "skip"  # Keep the target's value
+    OVERWRITE = "overwrite"  # Replace the target's value
+    FAIL = "fail"  # Abort if any key already exists in the target
+
+
+class EnvironmentCloneRequest(BaseModel):
+    name: str
+    include_keys: Optional[List[str]] = None  # Exact keys or * patterns
+    exclude_keys: Optional[List[str]] = None
+
+
+class EnvironmentPromoteRequest(BaseModel):
+    include_keys: Optional[List[str]] = None  # Exact keys or * patterns
+    exclude_keys: Optional[List[str]] = None
+    overwrite: OverwritePolicy = OverwritePolicy.SKIP
+
+
+class EnvironmentCopyResponse(BaseModel):
+    source_environment_id: int
+    target_environment_id: int
+    created: int
+    updated: int
+    skipped: int
+
+
+class EnvironmentDiffResponse(BaseModel):
+    environment_id: int
+    other_environment_id: int
+    added: List[str]  # Only in the other environment
+    removed: List[str]  # Only in this environment
+    changed: List[str]
+    equal: List[str]
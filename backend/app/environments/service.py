@@ -1,16 +1,33 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.models import Environment
-from app.models.env_share import EnvShare
+from sqlalchemy import delete, func
+from app.db.models import Environment, EnvironmentStats
 from app.projects.service import check_project_access
 from app.environments.schemas import EnvironmentUpdate
+from app.env_vars.history import bump_environment_revision, bump_environment_revisions
+from app.env_vars.interpolation import invalidate_environment
+from app.environments.inheritance import clear_merged_view, get_subtree, refresh_merged_view, validate_parent
 from fastapi import HTTPException, status
+from typing import Optional
 
 
-def create_environment(db: Session, name: str, project_id: int, user_id: int) -> Environment:
+def create_environment(
+    db: Session,
+    name: str,
+    project_id: int,
+    user_id: int,
+    parent_id: Optional[int] = None,
+) -> Environment:
     """Create a new environment. Environment name must be unique per project."""
     # Check project access
     check_project_access(db, project_id, user_id)
+    environment = add_environment(db, name, project_id, parent_id)
+    db.commit()
+    db.refresh(environment)
+    return environment
+
+
+def add_environment(db: Session, name: str, project_id: int, parent_id: Optional[int] = None) -> Environment:
+    """Validate and stage a new environment in the current transaction (no commit)"""
     name_normalized = name.strip() if name else ""
     if not name_normalized:
         raise HTTPException(
@@ -30,10 +47,13 @@ def create_environment(db: Session, name: str, project_id: int, user_id: int) ->
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This project already has an environment with this name.",
         )
-    environment = Environment(name=name_normalized, project_id=project_id)
+    environment = Environment(name=name_normalized, project_id=project_id, parent_id=parent_id)
+    environment.stats = EnvironmentStats()
+    validate_parent(db, environment, parent_id)
     db.add(environment)
-    db.commit()
-    db.refresh(environment)
+    db.flush()
+    if parent_id is not None:
+        refresh_merged_view(db, environment.id)
     return environment
 
 
@@ -49,8 +69,8 @@ def get_environments_by_project(db: Session, project_id: int, user_id: int) -> l
 
 
 def get_environment_by_id(db: Session, environment_id: int) -> Environment:
-    """Get environment by ID"""
-    environment = db.query(Environment).filter(Environment.id == environment_id).first()
+    """Get environment by ID (from the session's identity map when already loaded)"""
+    environment = db.get(Environment, environment_id)
     if not environment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -85,12 +105,42 @@ def update_environment(db: Session, environment_id: int, user_id: int, data: Env
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="This project already has an environment with this name.",
             )
+        renamed = environment.name != name_normalized
         environment.name = name_normalized
-    if data.project_id is not None:
+    else:
+        renamed = False
+    subtree = get_subtree(db, environment_id)
+    old_parent_id = environment.parent_id
+    if data.project_id is not None and data.project_id != environment.project_id:
         check_project_access(db, data.project_id, user_id)
+        if len(subtree) > 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Environments inherited by others cannot be moved to another project",
+            )
         environment.project_id = data.project_id
+        environment.parent_id = None  # Inheritance never spans projects
+        renamed = True
+    if "parent_id" in data.model_fields_set:
+        validate_parent(db, environment, data.parent_id)
+        environment.parent_id = data.parent_id
+    reparented = environment.parent_id != old_parent_id
+    if renamed or reparented:
+        db.flush()
+    if reparented:
+        if environment.parent_id is None:
+            clear_merged_view(db, environment_id)
+        refresh_merged_view(db, environment_id)
+        # Every descendant's merged view changed
+        bump_environment_revisions(db, [env_id for env_id, _ in subtree])
+    elif renamed:
+        # ${env:NAME.KEY} references resolve by name, so dependents must be re-resolved
+        bump_environment_revision(db, environment_id)
     db.commit()
     db.refresh(environment)
+    if renamed or reparented:
+        for env_id, _ in subtree:
+            invalidate_environment(env_id)
     return environment
 
 
@@ -98,8 +148,21 @@ def delete_environment(db: Session, environment_id: int, user_id: int) -> None:
     """Delete an environment. User must have access to the project."""
     environment = get_environment_by_id(db, environment_id)
     check_project_access(db, environment.project_id, user_id)
-    # Remove share links that reference this environment (FK constraint)
-    db.query(EnvShare).filter(EnvShare.environment_id == environment_id).delete()
-    db.delete(environment)
+    # Children stop inheriting; their subtrees are rebuilt without this environment
+    children = db.query(Environment).filter(Environment.parent_id == environment_id).all()
+    for child in children:
+        child.parent_id = None
+    db.flush()
+    for child in children:
+        clear_merged_view(db, child.id)
+        refresh_merged_view(db, child.id)
+    bump_environment_revisions(db, [env_id for child in children for env_id, _ in get_subtree(db, child.id)])
+    # Variables, history, stats and share links go with it (ON DELETE CASCADE)
+    db.execute(
+        delete(Environment)
+        .where(Environment.id == environment_id)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
+    invalidate_environment(environment_id)
 
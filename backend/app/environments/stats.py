@@ -0,0 +1,118 @@
+"""
+Denormalized environment counters.
+
+environment_stats holds, per environment, the number of own variables and
+secrets, the number of active share links and when a variable last changed.
+Write paths adjust the counters by the delta they caused, in the same
+transaction, so dashboards read them without COUNT(*) scans.
+rebuild_environment_stats recomputes them from scratch for backfills.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import Environment, EnvironmentStats, EnvVariable
+from app.models.env_share import EnvShare
+
+
+def adjust_environment_stats(
+    db: Session,
+    environment_id: int,
+    variables: int = 0,
+    secrets: int = 0,
+    touch: bool = True,
+) -> None:
+    """Apply variable deltas; `touch` also records the change time. Does not commit."""
+    values = {}
+    if variables:
+        values[EnvironmentStats.variable_count] = EnvironmentStats.variable_count + variables
+    if secrets:
+        values[EnvironmentStats.secret_count] = EnvironmentStats.secret_count + secrets
+    if touch:
+        values[EnvironmentStats.last_modified_at] = func.now()
+    if not values:
+        return
+    db.execute(
+        update(EnvironmentStats)
+        .where(EnvironmentStats.environment_id == environment_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_active_shares(db: Session, deltas: Dict[int, int]) -> None:
+    """Apply active share deltas for several environments in one statement. Does not commit."""
+    deltas = {env_id: delta for env_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    db.execute(
+        update(EnvironmentStats)
+        .where(EnvironmentStats.environment_id.in_(deltas.keys()))
+        .values(
+            active_share_count=EnvironmentStats.active_share_count
+            + case(deltas, value=EnvironmentStats.environment_id, else_=0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def count_share_deactivations(environment_ids: Iterable[int]) -> Dict[int, int]:
+    """Turn the environment ids returned by a deactivating UPDATE into negative deltas"""
+    return {env_id: -count for env_id, count in Counter(environment_ids).items()}
+
+
+def rebuild_environment_stats(db: Session, environment_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute counters from the source tables (all environments, or the given ones).
+    Returns the number of environments rebuilt. Does not commit.
+    """
+    target = select(Environment.id)
+    if environment_ids is not None:
+        target = target.where(Environment.id.in_(list(environment_ids)))
+    ids = list(db.scalars(target))
+    if not ids:
+        return 0
+
+    variables = {
+        row.environment_id: row
+        for row in db.execute(
+            select(
+                EnvVariable.environment_id,
+                func.count().label("variables"),
+                func.sum(case((EnvVariable.is_secret.is_(True), 1), else_=0)).label("secrets"),
+                func.max(func.coalesce(EnvVariable.updated_at, EnvVariable.created_at)).label("modified"),
+            )
+            .where(EnvVariable.environment_id.in_(ids))
+            .group_by(EnvVariable.environment_id)
+        )
+    }
+    shares = dict(
+        db.execute(
+            select(EnvShare.environment_id, func.count())
+            .where(EnvShare.environment_id.in_(ids), EnvShare.is_active.is_(True))
+            .group_by(EnvShare.environment_id)
+        ).all()
+    )
+
+    db.execute(
+        delete(EnvironmentStats)
+        .where(EnvironmentStats.environment_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        insert(EnvironmentStats),
+        [
+            {
+                "environment_id": env_id,
+                "variable_count": variables[env_id].variables if env_id in variables else 0,
+                "secret_count": variables[env_id].secrets if env_id in variables else 0,
+                "active_share_count": shares.get(env_id, 0),
+                "last_modified_at": variables[env_id].modified if env_id in variables else None,
+            }
+            for env_id in ids
+        ],
+    )
+    return len(ids)
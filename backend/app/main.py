@@ -1,11 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.instrumentation import RequestInstrumentationMiddleware
+from app.core.logs import setup_logging, stop_logging
+from app.core.metrics import CONTENT_TYPE, REGISTRY, metrics_flusher
+from app.core.profiling import ProfilingMiddleware
+from app.core.tracing import trace_exporter
 from app.auth.router import router as auth_router
 from app.projects.router import router as projects_router
 from app.environments.router import router as environments_router
 from app.env_vars.router import router as env_vars_router
 from app.routers.env_share import router as env_share_router
+from app.search.router import router as search_router
+from app.services.env_share_sweeper import share_sweeper
+from app.projects.deletion import resume_deletion_jobs
+from app.projects.role_cache import membership_events
+
+setup_logging()
 
 app = FastAPI(
     title="ENV Configuration Manager",
@@ -22,12 +33,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestInstrumentationMiddleware)
+
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(projects_router)
 app.include_router(environments_router)
 app.include_router(env_vars_router)
 app.include_router(env_share_router)
+app.include_router(search_router)
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    share_sweeper.start()
+    metrics_flusher.start()
+    trace_exporter.start()
+    membership_events.start()
+    resume_deletion_jobs()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    share_sweeper.stop()
+    metrics_flusher.stop()
+    trace_exporter.stop()
+    membership_events.stop()
+    stop_logging()
 
 
 @app.get("/")
@@ -39,3 +74,9 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Prometheus scrape endpoint (all workers in multiprocess mode)"""
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
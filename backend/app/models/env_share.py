@@ -7,10 +7,13 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
 )
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 
 from app.db.base import Base
@@ -24,7 +27,7 @@ class EnvShare(Base):
     __tablename__ = "env_shares"
 
     id = Column(Integer, primary_key=True, index=True)
-    environment_id = Column(Integer, ForeignKey("environments.id"), nullable=False)
+    environment_id = Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False)
     token = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=True)
@@ -37,5 +40,26 @@ class EnvShare(Base):
     whitelisted_ips = Column(JSON, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set when the link is revoked, used up or expired; purge retention counts from here
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
+    # Snapshot shares: variables frozen at creation, encrypted under a key derived from the password
+    snapshot_kdf = Column(String, nullable=True)
+    snapshot_payload = deferred(Column(Text, nullable=True))
+
+    @property
+    def snapshot(self) -> bool:
+        return self.snapshot_kdf is not None
+
+    __table_args__ = (
+        # Keyset pagination of an environment's shares, newest first
+        Index("ix_env_shares_environment_created_at", "environment_id", "created_at"),
+        # Only active links can expire, so the sweeper scans just those rows
+        Index(
+            "ix_env_shares_active_expires_at",
+            "expires_at",
+            postgresql_where=is_active.is_(True),
+            sqlite_where=is_active.is_(True),
+        ),
+    )
 
 
@@ -0,0 +1,251 @@
+"""
+Deletion of large projects.
+
+Small projects are removed with a single DELETE on projects; the database
+cascades to environments, variables, history, share links and members. Large
+projects would hold row locks for the whole cascade, so they are hidden at
+once (memberships removed, share links deactivated) and then deleted by a
+background job, environment by environment, in batches of
+PROJECT_DELETE_BATCH_SIZE rows with a commit after each batch. The job's
+progress is stored in deletion_jobs for polling. Every step is idempotent, so
+a job interrupted by a restart is simply run again, and a FAILED job can be
+retried by its requester (POST /projects/deletions/{job_id}/retry).
+
+Every worker resumes unfinished jobs on startup, so a job is claimed with a
+lease: the claiming worker stores a token and refreshes heartbeat_at with
+every batch, and only PENDING jobs or RUNNING jobs whose heartbeat is older
+than PROJECT_DELETE_LEASE_SECONDS can be claimed. A worker whose lease was
+taken over stops at its next batch.
+"""
+
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import (
+    DeletionJob,
+    DeletionStatus,
+    Environment,
+    EnvironmentStats,
+    EnvMergedVariable,
+    EnvVariable,
+    EnvVariableVersion,
+    Project,
+    ProjectMember,
+)
+from app.db.session import SessionLocal
+from app.models.env_share import EnvShare
+
+logger = logging.getLogger(__name__)
+
+_UNFINISHED = (DeletionStatus.PENDING, DeletionStatus.RUNNING)
+
+
+class _LeaseLost(Exception):
+    """Another worker took over the job"""
+
+
+def project_variable_count(db: Session, project_id: int) -> int:
+    """Number of variables in a project, read from the environment counters"""
+    return db.scalar(
+        select(func.coalesce(func.sum(EnvironmentStats.variable_count), 0))
+        .join(Environment, Environment.id == EnvironmentStats.environment_id)
+        .where(Environment.project_id == project_id)
+    )
+
+
+def delete_project_rows(db: Session, project_id: int) -> None:
+    """Delete a project in one statement, relying on ON DELETE CASCADE. Does not commit."""
+    db.execute(
+        delete(Project)
+        .where(Project.id == project_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def queue_project_deletion(db: Session, project: Project, user_id: int) -> DeletionJob:
+    """
+    Hide a project from everyone and record a deletion job for it.
+    Members lose access and share links stop working immediately; the rows are
+    deleted later by run_deletion_job.
+    """
+    environment_ids = select(Environment.id).where(Environment.project_id == project.id)
+    db.execute(
+        delete(ProjectMember)
+        .where(ProjectMember.project_id == project.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(EnvShare)
+        .where(EnvShare.environment_id.in_(environment_ids), EnvShare.is_active.is_(True))
+        .values(is_active=False, deactivated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    job = DeletionJob(
+        project_id=project.id,
+        project_name=project.name,
+        requested_by=user_id,
+        environments_total=db.scalar(select(func.count()).select_from(environment_ids.subquery())),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_deletion_job(db: Session, job_id: int, user_id: int) -> DeletionJob:
+    """Get a deletion job requested by the user"""
+    job = db.query(DeletionJob).filter(DeletionJob.id == job_id, DeletionJob.requested_by == user_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deletion job not found",
+        )
+    return job
+
+
+def _record_progress(db: Session, job_id: int, lease: str, **values) -> None:
+    """Update the job's progress and heartbeat, then commit; rolls back if the lease was lost"""
+    renewed = db.execute(
+        update(DeletionJob)
+        .where(DeletionJob.id == job_id, DeletionJob.claimed_by == lease)
+        .values(heartbeat_at=datetime.now(timezone.utc), **values)
+    ).rowcount
+    if not renewed:
+        db.rollback()
+        raise _LeaseLost()
+    db.commit()
+
+
+def retry_deletion_job(db: Session, job_id: int, user_id: int) -> DeletionJob:
+    """Queue a failed deletion job again; the caller runs it. Only the requester can retry."""
+    job = get_deletion_job(db, job_id, user_id)
+    requeued = db.execute(
+        update(DeletionJob)
+        .where(DeletionJob.id == job.id, DeletionJob.status == DeletionStatus.FAILED)
+        .values(status=DeletionStatus.PENDING, error=None, finished_at=None, claimed_by=None, heartbeat_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not requeued:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Deletion job is {job.status.value}, only failed jobs can be retried",
+        )
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _delete_batches(db: Session, job_id: int, lease: str, model, condition, batch_size: int) -> None:
+    while True:
+        batch = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        count = db.execute(
+            delete(model)
+            .where(model.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        _record_progress(db, job_id, lease, rows_deleted=DeletionJob.rows_deleted + count)
+        if count < batch_size:
+            return
+
+
+def _delete_environment(db: Session, job_id: int, lease: str, environment_id: int, batch_size: int) -> None:
+    # Dependent rows first, in short transactions, so the final cascade is small
+    for model, condition in (
+        (EnvShare, EnvShare.environment_id == environment_id),
+        (EnvVariableVersion, EnvVariableVersion.environment_id == environment_id),
+        (
+            EnvMergedVariable,
+            or_(
+                EnvMergedVariable.environment_id == environment_id,
+                EnvMergedVariable.source_environment_id == environment_id,
+            ),
+        ),
+        (EnvVariable, EnvVariable.environment_id == environment_id),
+    ):
+        _delete_batches(db, job_id, lease, model, condition, batch_size)
+    deleted = db.execute(
+        delete(Environment)
+        .where(Environment.id == environment_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    _record_progress(db, job_id, lease, environments_deleted=DeletionJob.environments_deleted + deleted)
+
+
+def _claim_job(db: Session, job_id: int) -> Tuple[Optional[int], str]:
+    """Take the job if it is pending or its lease expired; returns (project id or None, lease token)"""
+    lease = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.PROJECT_DELETE_LEASE_SECONDS)
+    project_id = db.execute(
+        update(DeletionJob)
+        .where(
+            DeletionJob.id == job_id,
+            or_(
+                DeletionJob.status == DeletionStatus.PENDING,
+                and_(
+                    DeletionJob.status == DeletionStatus.RUNNING,
+                    or_(DeletionJob.heartbeat_at.is_(None), DeletionJob.heartbeat_at < stale),
+                ),
+            ),
+        )
+        .values(status=DeletionStatus.RUNNING, claimed_by=lease, heartbeat_at=now)
+        .returning(DeletionJob.project_id)
+    ).scalar()
+    db.commit()
+    return project_id, lease
+
+
+def run_deletion_job(job_id: int) -> None:
+    """Process a deletion job to completion; safe to run again after an interruption"""
+    db = SessionLocal()
+    lease = None
+    try:
+        project_id, lease = _claim_job(db, job_id)
+        if project_id is None:
+            return
+        batch_size = max(settings.PROJECT_DELETE_BATCH_SIZE, 1)
+        environment_ids = db.scalars(
+            select(Environment.id).where(Environment.project_id == project_id).order_by(Environment.id)
+        ).all()
+        for environment_id in environment_ids:
+            _delete_environment(db, job_id, lease, environment_id, batch_size)
+        delete_project_rows(db, project_id)
+        _record_progress(db, job_id, lease, status=DeletionStatus.COMPLETED, finished_at=datetime.now(timezone.utc))
+        logger.info("Deleted project %d (deletion job %d)", project_id, job_id)
+    except _LeaseLost:
+        logger.warning("Deletion job %d was taken over by another worker", job_id)
+    except Exception as exc:
+        db.rollback()
+        logger.exception("Deletion job %d failed", job_id)
+        db.execute(
+            update(DeletionJob)
+            .where(DeletionJob.id == job_id, DeletionJob.claimed_by == lease)
+            .values(status=DeletionStatus.FAILED, error=str(exc), finished_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def resume_deletion_jobs() -> None:
+    """Restart jobs left unfinished by a previous process, on a daemon thread"""
+    with SessionLocal() as db:
+        job_ids = db.scalars(
+            select(DeletionJob.id).where(DeletionJob.status.in_(_UNFINISHED)).order_by(DeletionJob.id)
+        ).all()
+    if not job_ids:
+        return
+
+    def run():
+        for job_id in job_ids:
+            run_deletion_job(job_id)
+
+    threading.Thread(target=run, name="project-deletion", daemon=True).start()
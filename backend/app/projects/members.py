@@ -0,0 +1,145 @@
+"""
+Project membership management.
+
+Batches of users are added, re-roled or removed by email with a fixed number
+of statements whatever the batch size: one lookup of the users, one of their
+current memberships, then at most one INSERT and one UPDATE (or one DELETE).
+Each change publishes a MembershipEvent after commit so cached roles are
+evicted immediately.
+"""
+
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, cast, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models import Project, ProjectMember, Role, User
+from app.projects.role_cache import MembershipEvent, membership_events
+from app.projects.schemas import ProjectMemberItem, ProjectMembersResult
+from app.projects.service import check_project_access, get_project_by_id
+
+PROJECT_MEMBER_FIELDS = ("user_id", "email", "role", "created_at")
+
+
+def _require_manager(db: Session, project_id: int, user_id: int) -> Project:
+    project = get_project_by_id(db, project_id)
+    role = check_project_access(db, project_id, user_id)
+    if role not in (Role.OWNER, Role.ADMIN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only project owner or admin can manage members",
+        )
+    return project
+
+
+def _resolve_users(db: Session, project: Project, emails: List[str]) -> Tuple[Dict[str, int], List[str]]:
+    """Map emails to user ids in one query; returns ({email: user_id}, emails with no user)"""
+    emails = list(dict.fromkeys(emails))
+    users = dict(db.execute(select(User.email, User.id).where(User.email.in_(emails))).all())
+    if project.owner_id in users.values():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The project owner's membership cannot be changed",
+        )
+    return users, [email for email in emails if email not in users]
+
+
+def list_project_members(db: Session, project_id: int, user_id: int) -> List[dict]:
+    """Members of a project with their emails. Any member can list them."""
+    get_project_by_id(db, project_id)
+    check_project_access(db, project_id, user_id)
+    rows = db.execute(
+        select(ProjectMember.user_id, User.email, ProjectMember.role, ProjectMember.created_at)
+        .join(User, User.id == ProjectMember.user_id)
+        .where(ProjectMember.project_id == project_id)
+        .order_by(User.email)
+    )
+    return [dict(zip(PROJECT_MEMBER_FIELDS, row)) for row in rows]
+
+
+def upsert_project_members(
+    db: Session,
+    project_id: int,
+    user_id: int,
+    items: List[ProjectMemberItem],
+) -> ProjectMembersResult:
+    """Add users to a project or change their role. Only OWNER or ADMIN can manage members."""
+    project = _require_manager(db, project_id, user_id)
+    # Last entry wins when an email is listed twice
+    roles = {item.email: item.role for item in items}
+    users, not_found = _resolve_users(db, project, list(roles))
+    current = dict(
+        db.execute(
+            select(ProjectMember.user_id, ProjectMember.role).where(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id.in_(users.values()),
+            )
+        ).all()
+    )
+
+    result = ProjectMembersResult(project_id=project_id, not_found=not_found)
+    new_rows = []
+    changed: Dict[int, Role] = {}
+    for email, member_id in users.items():
+        role = roles[email]
+        if member_id not in current:
+            new_rows.append({"project_id": project_id, "user_id": member_id, "role": role})
+            result.added.append(email)
+        elif current[member_id] != role:
+            changed[member_id] = role
+            result.updated.append(email)
+        else:
+            result.unchanged.append(email)
+
+    try:
+        if new_rows:
+            db.execute(insert(ProjectMember), new_rows)
+        if changed:
+            db.execute(
+                update(ProjectMember)
+                .where(ProjectMember.project_id == project_id, ProjectMember.user_id.in_(changed))
+                .values(role=cast(case({uid: role.name for uid, role in changed.items()}, value=ProjectMember.user_id), ProjectMember.role.type))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Project members were changed concurrently, please retry",
+        )
+
+    if new_rows:
+        membership_events.publish(MembershipEvent(project_id, "added", tuple(row["user_id"] for row in new_rows)))
+    if changed:
+        membership_events.publish(MembershipEvent(project_id, "updated", tuple(changed)))
+    return result
+
+
+def remove_project_members(
+    db: Session,
+    project_id: int,
+    user_id: int,
+    emails: List[str],
+) -> ProjectMembersResult:
+    """Remove users from a project. Only OWNER or ADMIN can manage members."""
+    project = _require_manager(db, project_id, user_id)
+    users, not_found = _resolve_users(db, project, emails)
+    removed = set(
+        db.execute(
+            delete(ProjectMember)
+            .where(ProjectMember.project_id == project_id, ProjectMember.user_id.in_(users.values()))
+            .returning(ProjectMember.user_id)
+            .execution_options(synchronize_session=False)
+        ).scalars()
+    )
+    db.commit()
+
+    result = ProjectMembersResult(project_id=project_id, not_found=not_found)
+    for email, member_id in users.items():
+        (result.removed if member_id in removed else result.unchanged).append(email)
+    if removed:
+        membership_events.publish(MembershipEvent(project_id, "removed", tuple(removed)))
+    return result
@@ -0,0 +1,174 @@
+"""
+Cached project role lookups and membership change events.
+
+check_project_access runs on nearly every request; its (project, user) ->
+role answers are cached per worker for PROJECT_ROLE_CACHE_TTL_SECONDS.
+Membership writes publish a MembershipEvent after commit, which evicts the
+affected entries at once. With MEMBERSHIP_EVENTS_REDIS_URL set, events are
+also broadcast to the other workers over Redis pub/sub (needs the optional
+`redis` package); otherwise other workers catch up when their entries expire.
+
+Each project has a generation counter that every eviction bumps, so a lookup
+that read the database before an eviction cannot put its stale answer back.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.db.models import Role
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "envmanager:membership"
+
+
+class MembershipEvent(NamedTuple):
+    project_id: int
+    action: str  # added, updated, removed, project_deleted
+    user_ids: Optional[Tuple[int, ...]] = None  # None: every member of the project
+
+
+class RoleCache:
+    """LRU of (project_id, user_id) -> role with a TTL; only granted access is cached."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[Role, float]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PROJECT_ROLE_CACHE_TTL_SECONDS > 0
+
+    def generation(self, project_id: int) -> int:
+        with self._lock:
+            return self._generations.get(project_id, 0)
+
+    def get(self, project_id: int, user_id: int) -> Optional[Role]:
+        if not self.enabled:
+            return None
+        key = (project_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            role, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return role
+
+    def set(self, project_id: int, user_id: int, role: Role, generation: int) -> None:
+        """Cache a role read while the project was at `generation`; ignored if it moved on since"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._generations.get(project_id, 0) != generation:
+                return
+            self._entries[(project_id, user_id)] = (role, time.monotonic() + settings.PROJECT_ROLE_CACHE_TTL_SECONDS)
+            self._entries.move_to_end((project_id, user_id))
+            while len(self._entries) > settings.PROJECT_ROLE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, event: MembershipEvent) -> None:
+        with self._lock:
+            self._generations[event.project_id] = self._generations.get(event.project_id, 0) + 1
+            if event.user_ids is None:
+                stale = [key for key in self._entries if key[0] == event.project_id]
+            else:
+                stale = [(event.project_id, user_id) for user_id in event.user_ids]
+            for key in stale:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for project_id in {project_id for project_id, _ in self._entries}:
+                self._generations[project_id] = self._generations.get(project_id, 0) + 1
+            self._entries.clear()
+
+
+class MembershipEvents:
+    """In-process publish/subscribe for membership changes, optionally relayed through Redis."""
+
+    def __init__(self):
+        self._handlers: List[Callable[[MembershipEvent], None]] = []
+        self._origin = uuid.uuid4().hex
+        self._redis = None
+        self._pubsub = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, handler: Callable[[MembershipEvent], None]) -> None:
+        self._handlers.append(handler)
+
+    def _dispatch(self, event: MembershipEvent) -> None:
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Membership event handler failed for %s", event)
+
+    def publish(self, event: MembershipEvent) -> None:
+        """Deliver an event to local subscribers and, if configured, to other workers. Call after commit."""
+        self._dispatch(event)
+        if self._redis is None:
+            return
+        message = {"origin": self._origin, **event._asdict()}
+        try:
+            self._redis.publish(CHANNEL, json.dumps(message))
+        except Exception:
+            # Other workers fall back to the cache TTL
+            logger.exception("Failed to broadcast membership event %s", event)
+
+    def start(self) -> None:
+        if not settings.MEMBERSHIP_EVENTS_REDIS_URL or self._thread is not None:
+            return
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("MEMBERSHIP_EVENTS_REDIS_URL is set but the redis package is not installed")
+        self._redis = redis.Redis.from_url(settings.MEMBERSHIP_EVENTS_REDIS_URL)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(CHANNEL)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="membership-events", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+        self._redis = None
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                data = json.loads(message["data"])
+                if data.pop("origin") == self._origin:
+                    continue
+                user_ids = data.pop("user_ids")
+                self._dispatch(MembershipEvent(user_ids=tuple(user_ids) if user_ids is not None else None, **data))
+            except Exception:
+                # Lost messages are covered by the cache TTL; a dropped connection clears the cache
+                logger.exception("Membership event listener error")
+                role_cache.clear()
+                self._stop.wait(1.0)
+
+
+role_cache = RoleCache()
+membership_events = MembershipEvents()
+membership_events.subscribe(role_cache.invalidate)
@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import User
 from app.users.dependencies import get_current_user
-from app.projects.schemas import ProjectCreate, ProjectUpdate, ProjectResponse
-from app.projects.service import create_project, get_user_projects, update_project, delete_project
+from app.projects.schemas import (
+    ProjectCreate,
+    ProjectUpdate,
+    ProjectResponse,
+    ProjectOverview,
+    DeletionJobResponse,
+    ProjectMemberResponse,
+    ProjectMembersUpsert,
+    ProjectMembersRemove,
+    ProjectMembersResult,
+)
+from app.projects.deletion import get_deletion_job, retry_deletion_job, run_deletion_job
+from app.projects.members import list_project_members, upsert_project_members, remove_project_members
+from app.audit.service import log_audit
+from app.projects.service import (
+    create_project,
+    get_user_projects,
+    get_user_project_rows,
+    get_user_projects_overview,
+    update_project,
+    delete_project,
+)
+from app.core.responses import FastJSONResponse, wants_fast_json
 from typing import List
 
 router = APIRouter(prefix="/projects", tags=["projects"])
@@ -23,14 +46,26 @@ def create_project_endpoint(
 
 @router.get("", response_model=List[ProjectResponse])
 def get_projects(
+    fast_json: bool = Depends(wants_fast_json),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all projects for current user"""
+    if fast_json:
+        return FastJSONResponse(get_user_project_rows(db, current_user.id))
     projects = get_user_projects(db, current_user.id)
     return projects
 
 
+@router.get("/overview", response_model=List[ProjectOverview])
+def get_projects_overview(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Projects for the current user with role and per-environment variable, secret and share counts"""
+    return get_user_projects_overview(db, current_user.id)
+
+
 @router.put("/{project_id}", response_model=ProjectResponse)
 def update_project_endpoint(
     project_id: int,
@@ -42,12 +77,105 @@ def update_project_endpoint(
     return update_project(db, project_id, current_user.id, project_data)
 
 
-@router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.get("/deletions/{job_id}", response_model=DeletionJobResponse)
+def get_deletion_job_endpoint(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Progress of a background project deletion requested by the current user"""
+    return get_deletion_job(db, job_id, current_user.id)
+
+
+@router.post(
+    "/deletions/{job_id}/retry",
+    response_model=DeletionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def retry_deletion_job_endpoint(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Run a failed background project deletion again. Only the user who requested it can retry."""
+    job = retry_deletion_job(db, job_id, current_user.id)
+    background_tasks.add_task(run_deletion_job, job.id)
+    return job
+
+
+@router.delete(
+    "/{project_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={status.HTTP_202_ACCEPTED: {"model": DeletionJobResponse}},
+)
 def delete_project_endpoint(
     project_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a project. Only owner can delete.
+    Large projects are deleted in the background: 202 with the job to poll.
+    """
+    job = delete_project(db, project_id, current_user.id)
+    if job is not None:
+        background_tasks.add_task(run_deletion_job, job.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(DeletionJobResponse.model_validate(job)),
+            headers={"Location": f"/projects/deletions/{job.id}"},
+        )
+
+
+@router.get("/{project_id}/members", response_model=List[ProjectMemberResponse])
+def list_project_members_endpoint(
+    project_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List project members. Any member can list them."""
+    return list_project_members(db, project_id, current_user.id)
+
+
+@router.post("/{project_id}/members", response_model=ProjectMembersResult)
+def upsert_project_members_endpoint(
+    project_id: int,
+    body: ProjectMembersUpsert,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a project. Only owner can delete."""
-    delete_project(db, project_id, current_user.id)
+    """Add users by email or change their role. Only owner or admin can manage members."""
+    result = upsert_project_members(db, project_id, current_user.id, body.members)
+    if result.added or result.updated:
+        log_audit(
+            db,
+            current_user.id,
+            "edit",
+            "project_member",
+            project_id,
+            f"Added {', '.join(result.added) or 'none'}; changed role of {', '.join(result.updated) or 'none'}",
+        )
+    return result
+
 
+@router.post("/{project_id}/members/bulk-delete", response_model=ProjectMembersResult)
+def remove_project_members_endpoint(
+    project_id: int,
+    body: ProjectMembersRemove,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Remove users by email. Only owner or admin can manage members."""
+    result = remove_project_members(db, project_id, current_user.id, body.emails)
+    if result.removed:
+        log_audit(
+            db,
+            current_user.id,
+            "delete",
+            "project_member",
+            project_id,
+            f"Removed {', '.join(result.removed)}",
+        )
+    return result
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+from app.core.config import settings
+from app.db.models import DeletionStatus, Role
 
 
 class ProjectCreate(BaseModel):
@@ -20,3 +22,79 @@ class ProjectResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class EnvironmentOverview(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    variable_count: int = 0
+    secret_count: int = 0
+    active_share_count: int = 0
+    last_modified_at: Optional[datetime] = None
+
+
+class ProjectOverview(BaseModel):
+    id: int
+    name: str
+    owner_id: int
+    role: Role
+    created_at: datetime
+    environment_count: int = 0
+    variable_count: int = 0
+    secret_count: int = 0
+    active_share_count: int = 0
+    last_modified_at: Optional[datetime] = None
+    environments: List[EnvironmentOverview] = []
+
+
+class DeletionJobResponse(BaseModel):
+    id: int
+    project_id: int
+    project_name: str
+    status: DeletionStatus
+    environments_total: int
+    environments_deleted: int
+    rows_deleted: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class ProjectMemberResponse(BaseModel):
+    user_id: int
+    email: str
+    role: Role
+    created_at: datetime
+
+
+class ProjectMemberItem(BaseModel):
+    email: EmailStr
+    role: Role = Role.READ_ONLY
+
+    @field_validator("role")
+    @classmethod
+    def not_owner(cls, role: Role) -> Role:
+        if role == Role.OWNER:
+            raise ValueError("A project has a single owner; grant ADMIN instead")
+        return role
+
+
+class ProjectMembersUpsert(BaseModel):
+    members: List[ProjectMemberItem] = Field(..., min_length=1, max_length=settings.PROJECT_MEMBERS_BATCH_LIMIT)
+
+
+class ProjectMembersRemove(BaseModel):
+    emails: List[EmailStr] = Field(..., min_length=1, max_length=settings.PROJECT_MEMBERS_BATCH_LIMIT)
+
+
+class ProjectMembersResult(BaseModel):
+    project_id: int
+    added: List[str] = []
+    updated: List[str] = []
+    removed: List[str] = []
+    unchanged: List[str] = []
+    not_found: List[str] = []  # No registered user with this email
@@ -1,8 +1,13 @@
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.models import Project, ProjectMember, Role, Environment
-from app.models.env_share import EnvShare
-from app.projects.schemas import ProjectCreate, ProjectUpdate
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.core.responses import rows_to_dicts
+from app.core.tracing import traced
+from app.db.models import DeletionJob, Project, ProjectMember, Role, Environment, EnvironmentStats
+from app.projects.deletion import delete_project_rows, project_variable_count, queue_project_deletion
+from app.projects.role_cache import MembershipEvent, membership_events, role_cache
+from app.projects.schemas import ProjectCreate, ProjectUpdate, ProjectOverview, EnvironmentOverview
 from fastapi import HTTPException, status
 
 
@@ -40,6 +45,7 @@ def create_project(db: Session, name: str, owner_id: int) -> Project:
     return project
 
 
+@traced()
 def get_user_projects(db: Session, user_id: int) -> list[Project]:
     """Get all projects where user is owner or member"""
     projects = db.query(Project).join(ProjectMember).filter(
@@ -48,9 +54,87 @@ def get_user_projects(db: Session, user_id: int) -> list[Project]:
     return projects
 
 
+PROJECT_ROW_FIELDS = ("id", "name", "owner_id", "created_at")
+
+
+@traced()
+def get_user_project_rows(db: Session, user_id: int) -> list[dict]:
+    """Same listing as get_user_projects, built from Core rows for the fast JSON path"""
+    rows = db.execute(
+        select(Project.id, Project.name, Project.owner_id, Project.created_at)
+        .join(ProjectMember, ProjectMember.project_id == Project.id)
+        .where(ProjectMember.user_id == user_id)
+        .order_by(Project.id)
+    )
+    return rows_to_dicts(rows, PROJECT_ROW_FIELDS)
+
+
+@traced()
+def get_user_projects_overview(db: Session, user_id: int) -> list[ProjectOverview]:
+    """
+    Projects of the user with their role and per-environment counters, in one query.
+    Counters come from environment_stats, which write paths keep up to date.
+    """
+    rows = db.execute(
+        select(
+            Project.id,
+            Project.name,
+            Project.owner_id,
+            Project.created_at,
+            ProjectMember.role,
+            Environment.id.label("environment_id"),
+            Environment.name.label("environment_name"),
+            Environment.parent_id,
+            func.coalesce(EnvironmentStats.variable_count, 0).label("variable_count"),
+            func.coalesce(EnvironmentStats.secret_count, 0).label("secret_count"),
+            func.coalesce(EnvironmentStats.active_share_count, 0).label("active_share_count"),
+            EnvironmentStats.last_modified_at,
+        )
+        .join(ProjectMember, ProjectMember.project_id == Project.id)
+        .outerjoin(Environment, Environment.project_id == Project.id)
+        .outerjoin(EnvironmentStats, EnvironmentStats.environment_id == Environment.id)
+        .where(ProjectMember.user_id == user_id)
+        .order_by(Project.id, Environment.id)
+    )
+    projects: dict[int, ProjectOverview] = {}
+    for row in rows:
+        project = projects.get(row.id)
+        if project is None:
+            project = projects[row.id] = ProjectOverview(
+                id=row.id,
+                name=row.name,
+                owner_id=row.owner_id,
+                role=row.role,
+                created_at=row.created_at,
+                environments=[],
+            )
+        if row.environment_id is None:
+            continue
+        project.environments.append(
+            EnvironmentOverview(
+                id=row.environment_id,
+                name=row.environment_name,
+                parent_id=row.parent_id,
+                variable_count=row.variable_count,
+                secret_count=row.secret_count,
+                active_share_count=row.active_share_count,
+                last_modified_at=row.last_modified_at,
+            )
+        )
+        project.environment_count += 1
+        project.variable_count += row.variable_count
+        project.secret_count += row.secret_count
+        project.active_share_count += row.active_share_count
+        if row.last_modified_at is not None and (
+            project.last_modified_at is None or row.last_modified_at > project.last_modified_at
+        ):
+            project.last_modified_at = row.last_modified_at
+    return list(projects.values())
+
+
 def get_project_by_id(db: Session, project_id: int) -> Project:
-    """Get project by ID"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    """Get project by ID (from the session's identity map when already loaded)"""
+    project = db.get(Project, project_id)
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -59,27 +143,35 @@ def get_project_by_id(db: Session, project_id: int) -> Project:
     return project
 
 
-def check_project_access(db: Session, project_id: int, user_id: int) -> ProjectMember:
-    """Check if user has access to project and return membership"""
-    membership = db.query(ProjectMember).filter(
-        ProjectMember.project_id == project_id,
-        ProjectMember.user_id == user_id
-    ).first()
+@traced()
+def check_project_access(db: Session, project_id: int, user_id: int) -> Role:
+    """Check if user has access to project and return their role (cached, see role_cache)"""
+    role = role_cache.get(project_id, user_id)
+    if role is not None:
+        return role
+    generation = role_cache.generation(project_id)
+    role = db.scalar(
+        select(ProjectMember.role).where(
+            ProjectMember.project_id == project_id,
+            ProjectMember.user_id == user_id,
+        )
+    )
     
-    if not membership:
+    if role is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied to this project"
         )
     
-    return membership
+    role_cache.set(project_id, user_id, role, generation)
+    return role
 
 
 def update_project(db: Session, project_id: int, user_id: int, data: ProjectUpdate) -> Project:
     """Update a project. Only OWNER or ADMIN can update."""
     project = get_project_by_id(db, project_id)
-    membership = check_project_access(db, project_id, user_id)
-    if membership.role not in (Role.OWNER, Role.ADMIN):
+    role = check_project_access(db, project_id, user_id)
+    if role not in (Role.OWNER, Role.ADMIN):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only project owner or admin can update the project",
@@ -111,19 +203,25 @@ def update_project(db: Session, project_id: int, user_id: int, data: ProjectUpda
     return project
 
 
-def delete_project(db: Session, project_id: int, user_id: int) -> None:
-    """Delete a project. Only OWNER can delete."""
+def delete_project(db: Session, project_id: int, user_id: int) -> Optional[DeletionJob]:
+    """
+    Delete a project. Only OWNER can delete.
+    Projects with more than PROJECT_DELETE_ASYNC_THRESHOLD variables are hidden
+    and queued for background deletion; the queued job is returned.
+    """
     project = get_project_by_id(db, project_id)
-    membership = check_project_access(db, project_id, user_id)
-    if membership.role != Role.OWNER:
+    role = check_project_access(db, project_id, user_id)
+    if role != Role.OWNER:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only project owner can delete the project",
         )
-    # Remove share links for all environments in this project (FK constraint)
-    env_ids = [r[0] for r in db.query(Environment.id).filter(Environment.project_id == project_id).all()]
-    if env_ids:
-        db.query(EnvShare).filter(EnvShare.environment_id.in_(env_ids)).delete(synchronize_session=False)
-    db.delete(project)
-    db.commit()
-
+    job = None
+    if project_variable_count(db, project_id) > settings.PROJECT_DELETE_ASYNC_THRESHOLD:
+        job = queue_project_deletion(db, project, user_id)
+    else:
+        # Environments, variables, history, share links and members go with it (ON DELETE CASCADE)
+        delete_project_rows(db, project_id)
+        db.commit()
+    membership_events.publish(MembershipEvent(project_id, "project_deleted"))
+    return job
@@ -2,15 +2,23 @@
 Router for secure environment share links.
 """
 
-from fastapi import APIRouter, Depends, Request, Response, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.orm import Session
 
+from app.core.instrumentation import count_outcome
+from app.core.metrics import Counter
+from app.core.responses import FastJSONResponse, wants_fast_json
 from app.db.session import get_db
 from app.db.models import User
 from app.users.dependencies import get_current_user
+from app.utils.rate_limit import share_throttle, throttle_share_access
 from app.schemas.env_share import (
     EnvShareAccessRequest,
     EnvShareCreate,
+    EnvSharePage,
+    EnvShareStatus,
     EnvShareRecord,
     EnvShareResponse,
     EnvShareViewResponse,
@@ -20,11 +28,19 @@ from app.services.env_share_service import (
     access_share_view,
     create_env_share,
     list_env_shares,
+    list_env_share_rows,
+    list_env_shares_page,
     revoke_env_share,
 )
 
 router = APIRouter(tags=["env_share"])
 
+SHARE_ACCESS = Counter(
+    "share_access_total",
+    "Public share link accesses by kind and outcome (success, denied, not_found, ...)",
+    ("kind", "outcome"),
+)
+
 
 @router.post(
     "/env/{environment_id}/share",
@@ -55,6 +71,7 @@ def create_share_link(
         max_downloads=share.max_downloads,
         one_time=share.one_time,
         whitelisted_ips=share.whitelisted_ips,
+        snapshot=share.snapshot,
     )
 
 
@@ -64,16 +81,46 @@ def create_share_link(
 )
 def list_share_links(
     environment_id: int,
+    fast_json: bool = Depends(wants_fast_json),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     List all share links for an environment.
     """
+    if fast_json:
+        return FastJSONResponse(list_env_share_rows(db=db, environment_id=environment_id, user_id=current_user.id))
     shares = list_env_shares(db=db, environment_id=environment_id, user_id=current_user.id)
     return shares
 
 
+@router.get(
+    "/env/{environment_id}/shares/page",
+    response_model=EnvSharePage,
+)
+def list_share_links_page(
+    environment_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    share_status: Optional[EnvShareStatus] = Query(None, alias="status"),
+    created_by: Optional[int] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    List share links for an environment page by page, with view/download totals.
+    """
+    return list_env_shares_page(
+        db=db,
+        environment_id=environment_id,
+        user_id=current_user.id,
+        limit=limit,
+        cursor=cursor,
+        share_status=share_status,
+        created_by=created_by,
+    )
+
+
 @router.delete(
     "/share/{share_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -96,22 +143,22 @@ def revoke_share_link(
 def view_shared_env(
     token: str,
     body: EnvShareAccessRequest,
-    request: Request,
+    client_ip: Optional[str] = Depends(throttle_share_access),
     db: Session = Depends(get_db),
 ):
     """
     View shared environment variables via a public share token.
     """
-    client_ip = request.client.host if request.client else None
-    share, variables = access_share_view(
-        db=db,
-        token=token,
-        password=body.password,
-        client_ip=client_ip,
-    )
+    with count_outcome(SHARE_ACCESS, "view"), share_throttle.track(token, client_ip):
+        environment_id, variables = access_share_view(
+            db=db,
+            token=token,
+            password=body.password,
+            client_ip=client_ip,
+        )
 
     return EnvShareViewResponse(
-        environment_id=share.environment_id,
+        environment_id=environment_id,
         variables=variables,
     )
 
@@ -122,21 +169,21 @@ def view_shared_env(
 def download_shared_env(
     token: str,
     body: EnvShareAccessRequest,
-    request: Request,
+    client_ip: Optional[str] = Depends(throttle_share_access),
     db: Session = Depends(get_db),
 ):
     """
     Download shared environment as a .env file via a public share token.
     """
-    client_ip = request.client.host if request.client else None
-    share, content = access_share_download(
-        db=db,
-        token=token,
-        password=body.password,
-        client_ip=client_ip,
-    )
-
-    filename = f"env_environment_{share.environment_id}.env"
+    with count_outcome(SHARE_ACCESS, "download"), share_throttle.track(token, client_ip):
+        environment_id, content = access_share_download(
+            db=db,
+            token=token,
+            password=body.password,
+            client_ip=client_ip,
+        )
+
+    filename = f"env_environment_{environment_id}.env"
 
     return Response(
         content=content,
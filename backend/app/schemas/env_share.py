@@ -2,10 +2,13 @@
 Pydantic schemas for EnvShare (secure environment sharing).
 """
 
+import enum
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from app.utils.ip_allowlist import normalize_allowlist
 
 
 class EnvShareCreate(BaseModel):
@@ -18,7 +21,17 @@ class EnvShareCreate(BaseModel):
     max_views: int = Field(5, ge=0)
     max_downloads: int = Field(1, ge=0)
     one_time: bool = False
+    # Addresses or CIDR ranges, IPv4 or IPv6 (e.g. "203.0.113.7", "10.0.0.0/8", "2001:db8::/32")
     whitelisted_ips: Optional[List[str]] = None
+    # Freeze the variables now instead of reading the live environment on every access
+    snapshot: bool = False
+
+    @field_validator("whitelisted_ips")
+    @classmethod
+    def validate_whitelisted_ips(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        if value is None:
+            return None
+        return normalize_allowlist(value)
 
 
 class EnvShareResponse(BaseModel):
@@ -32,6 +45,7 @@ class EnvShareResponse(BaseModel):
     max_downloads: int
     one_time: bool
     whitelisted_ips: Optional[List[str]]
+    snapshot: bool
 
 
 class EnvShareAccessRequest(BaseModel):
@@ -77,9 +91,38 @@ class EnvShareRecord(BaseModel):
     one_time: bool
     is_active: bool
     whitelisted_ips: Optional[List[str]]
+    snapshot: bool
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+
+
+class EnvShareStatus(str, enum.Enum):
+    ACTIVE = "active"  # Usable: active, not expired, limits not reached
+    EXPIRED = "expired"  # Past expires_at
+    EXHAUSTED = "exhausted"  # View or download limit reached
+    REVOKED = "revoked"  # Deactivated before expiring or reaching a limit
+
+
+class EnvShareSummary(BaseModel):
+    """
+    Counters over every share matching the filters (not just the current page).
+    """
+
+    total: int
+    active: int
+    total_views: int
+    total_downloads: int
+
+
+class EnvSharePage(BaseModel):
+    """
+    One page of share links, newest first. Pass next_cursor back as cursor for the next page.
+    """
+
+    items: List[EnvShareRecord]
+    next_cursor: Optional[str]
+    summary: EnvShareSummary
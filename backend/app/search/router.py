@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.db.models import User
+from app.users.dependencies import get_current_user
+from app.search.schemas import VariableSearchResponse
+from app.search.service import search_variables
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/variables", response_model=VariableSearchResponse)
+def search_variables_endpoint(
+    q: str = Query(..., min_length=1, description="Text to find in variable keys"),
+    include_values: bool = Query(False, description="Also search non-secret values"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Find variables by key across every project the current user belongs to"""
+    return search_variables(db, current_user.id, q, include_values, limit, offset)
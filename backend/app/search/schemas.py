@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class VariableSearchHit(BaseModel):
+    variable_id: int
+    key: str
+    value: Optional[str]  # Only for non-secret values when values are searched
+    is_secret: bool
+    matched_on: str  # "key" or "value"
+    environment_id: int
+    environment_name: str
+    project_id: int
+    project_name: str
+
+
+class VariableSearchResponse(BaseModel):
+    total: int
+    items: List[VariableSearchHit]
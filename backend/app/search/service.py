@@ -0,0 +1,94 @@
+from fastapi import HTTPException, status
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+from app.db.models import Environment, EnvVariable, Project, ProjectMember
+
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_variables(
+    db: Session,
+    user_id: int,
+    q: str,
+    include_values: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+) -> dict:
+    """
+    Search variable keys (and optionally non-secret values) across the caller's projects.
+
+    Ranked exact > prefix > substring key match > value match, then by key length.
+    One query; ILIKE filters are served by the pg_trgm indexes on env_variables.
+    The total comes with the page rows, so a page past the last hit costs a
+    second query to count them.
+    """
+    q = q.strip()
+    if not q:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search term is required",
+        )
+    term = _like_escape(q)
+    contains = f"%{term}%"
+    key_match = EnvVariable.key.ilike(contains, escape="\\")
+    value_match = and_(
+        # Renders as "NOT is_secret", the predicate of the partial value trigram index
+        ~EnvVariable.is_secret,
+        EnvVariable.value.ilike(contains, escape="\\"),
+    )
+    rank = case(
+        (func.lower(EnvVariable.key) == q.lower(), 0),
+        (EnvVariable.key.ilike(f"{term}%", escape="\\"), 1),
+        (key_match, 2),
+        else_=3,
+    )
+
+    query = (
+        db.query(
+            EnvVariable.id,
+            EnvVariable.key,
+            EnvVariable.value,
+            EnvVariable.is_secret,
+            Environment.id,
+            Environment.name,
+            Project.id,
+            Project.name,
+            rank.label("rank"),
+            func.count().over().label("total"),
+        )
+        .join(Environment, Environment.id == EnvVariable.environment_id)
+        .join(Project, Project.id == Environment.project_id)
+        .join(
+            ProjectMember,
+            and_(ProjectMember.project_id == Project.id, ProjectMember.user_id == user_id),
+        )
+        .filter(or_(key_match, value_match) if include_values else key_match)
+    )
+    page = (
+        query.order_by(rank, func.length(EnvVariable.key), EnvVariable.key, EnvVariable.id)
+        .limit(limit)
+        .offset(offset)
+    )
+
+    items = []
+    total = 0
+    for var_id, key, value, is_secret, env_id, env_name, project_id, project_name, row_rank, total in page:
+        matched_on_value = row_rank == 3
+        items.append(
+            {
+                "variable_id": var_id,
+                "key": key,
+                "value": value if include_values and not is_secret else None,
+                "is_secret": is_secret,
+                "matched_on": "value" if matched_on_value else "key",
+                "environment_id": env_id,
+                "environment_name": env_name,
+                "project_id": project_id,
+                "project_name": project_name,
+            }
+        )
+    if not items and offset:
+        total = query.with_entities(func.count(EnvVariable.id)).scalar()
+    return {"total": total, "items": items}
@@ -2,22 +2,30 @@
 Service layer for secure environment share links.
 """
 
+import base64
 from datetime import datetime, timezone
 import secrets
 from typing import List, Optional, Tuple
 
 from cryptography.fernet import InvalidToken
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, false, func, or_, select, true, update
+from sqlalchemy.orm import Session, undefer
 
+from app.core.responses import rows_to_dicts
 from app.core.security import get_password_hash, verify_password
-from app.core.encryption import encryption_service
+from app.core.tracing import traced
 from app.db.models import EnvVariable, Environment
 from app.models.env_share import EnvShare
-from app.schemas.env_share import EnvShareCreate, EnvVarForShare
+from app.schemas.env_share import EnvShareCreate, EnvShareStatus, EnvVarForShare
 from app.audit.service import log_audit
+from app.env_vars.interpolation import resolve_environment
+from app.environments.inheritance import effective_variables_query
 from app.environments.service import get_environment_by_id
+from app.environments.stats import adjust_active_shares, count_share_deactivations
 from app.projects.service import check_project_access
+from app.services.env_share_snapshot import open_snapshot, render_snapshot
+from app.utils.ip_allowlist import is_ip_allowed
 
 
 def _generate_unique_token(db: Session) -> str:
@@ -31,6 +39,7 @@ def _generate_unique_token(db: Session) -> str:
             return token
 
 
+@traced()
 def create_env_share(
     db: Session,
     environment_id: int,
@@ -63,8 +72,13 @@ def create_env_share(
         whitelisted_ips=data.whitelisted_ips,
         created_by=creator_user_id,
     )
+    if data.snapshot:
+        share.snapshot_kdf, share.snapshot_payload = render_snapshot(
+            get_env_variables_for_share(db, share), data.password
+        )
 
     db.add(share)
+    adjust_active_shares(db, {environment_id: 1})
     db.commit()
     db.refresh(share)
 
@@ -77,7 +91,7 @@ def create_env_share(
         action="create",
         resource="env_share",
         resource_id=share.id,
-        details=f"Created share link for environment {environment_id}",
+        details=f"Created {'snapshot ' if data.snapshot else ''}share link for environment {environment_id}",
     )
 
     return share, share_url
@@ -92,6 +106,177 @@ def list_env_shares(db: Session, environment_id: int, user_id: int) -> List[EnvS
     return db.query(EnvShare).filter(EnvShare.environment_id == environment_id).order_by(EnvShare.created_at.desc()).all()
 
 
+SHARE_RECORD_FIELDS = (
+    "id",
+    "environment_id",
+    "token",
+    "expires_at",
+    "max_views",
+    "max_downloads",
+    "view_count",
+    "download_count",
+    "one_time",
+    "is_active",
+    "whitelisted_ips",
+    "snapshot",
+    "created_at",
+)
+
+
+def _share_record_column(field: str):
+    if field == "snapshot":
+        return EnvShare.snapshot_kdf.is_not(None)
+    return getattr(EnvShare, field)
+
+
+def list_env_share_rows(db: Session, environment_id: int, user_id: int) -> List[dict]:
+    """
+    Same listing as list_env_shares, built from Core rows for the fast JSON path.
+    """
+    environment = get_environment_by_id(db, environment_id)
+    check_project_access(db, environment.project_id, user_id)
+    rows = db.execute(
+        select(*[_share_record_column(field) for field in SHARE_RECORD_FIELDS])
+        .where(EnvShare.environment_id == environment_id)
+        .order_by(EnvShare.created_at.desc())
+    )
+    return rows_to_dicts(rows, SHARE_RECORD_FIELDS)
+
+
+def _encode_cursor(share_id: int) -> str:
+    return base64.urlsafe_b64encode(f"share:{share_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        prefix, share_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if prefix != "share":
+            raise ValueError(prefix)
+        return int(share_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def _share_status_conditions(now: datetime) -> dict:
+    expired = and_(EnvShare.expires_at.is_not(None), EnvShare.expires_at <= now)
+    exhausted = and_(
+        ~expired,
+        or_(
+            # Same rule as _claim_access: negative means unlimited, 0 allows none
+            and_(EnvShare.max_views >= 0, EnvShare.view_count >= EnvShare.max_views),
+            and_(EnvShare.max_downloads >= 0, EnvShare.download_count >= EnvShare.max_downloads),
+        ),
+    )
+    return {
+        EnvShareStatus.ACTIVE: and_(EnvShare.is_active.is_(True), ~expired, ~exhausted),
+        EnvShareStatus.EXPIRED: expired,
+        EnvShareStatus.EXHAUSTED: exhausted,
+        EnvShareStatus.REVOKED: and_(EnvShare.is_active.is_(False), ~expired, ~exhausted),
+    }
+
+
+def list_env_shares_page(
+    db: Session,
+    environment_id: int,
+    user_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    share_status: Optional[EnvShareStatus] = None,
+    created_by: Optional[int] = None,
+) -> dict:
+    """
+    One page of an environment's share links, newest first, with usage counters.
+
+    Keyset pagination on (created_at, id) served by the (environment_id,
+    created_at) index; the cursor names the last share of the previous page,
+    and a cursor naming no share of this environment (e.g. purged since) is
+    rejected with 400. The counters cover every share matching the filters
+    and come from the same statement: the page is outer-joined to one
+    aggregate row, so an empty page still carries them.
+    """
+    environment = get_environment_by_id(db, environment_id)
+    check_project_access(db, environment.project_id, user_id)
+
+    conditions = _share_status_conditions(datetime.now(timezone.utc))
+    filters = [EnvShare.environment_id == environment_id]
+    if share_status is not None:
+        filters.append(conditions[share_status])
+    if created_by is not None:
+        filters.append(EnvShare.created_by == created_by)
+
+    page_filters = list(filters)
+    cursor_known = true()
+    if cursor is not None:
+        cursor_id = _decode_cursor(cursor)
+        cursor_share = select(EnvShare.created_at).where(
+            EnvShare.id == cursor_id, EnvShare.environment_id == environment_id
+        )
+        cursor_known = cursor_share.exists()
+        # Compared against the stored value so the key never round-trips through Python
+        cursor_created_at = cursor_share.scalar_subquery()
+        page_filters.append(
+            or_(
+                EnvShare.created_at < cursor_created_at,
+                and_(EnvShare.created_at == cursor_created_at, EnvShare.id < cursor_id),
+            )
+        )
+
+    summary = (
+        select(
+            func.count().label("total"),
+            func.coalesce(func.sum(case((conditions[EnvShareStatus.ACTIVE], 1), else_=0)), 0).label("active"),
+            func.coalesce(func.sum(EnvShare.view_count), 0).label("total_views"),
+            func.coalesce(func.sum(EnvShare.download_count), 0).label("total_downloads"),
+            cursor_known.label("cursor_known"),
+        )
+        .where(*filters)
+        .subquery("summary")
+    )
+    page = (
+        select(*[_share_record_column(field).label(field) for field in SHARE_RECORD_FIELDS])
+        .where(*page_filters)
+        .order_by(EnvShare.created_at.desc(), EnvShare.id.desc())
+        .limit(limit + 1)
+        .subquery("page")
+    )
+
+    rows = db.execute(
+        select(summary, page)
+        .select_from(summary.outerjoin(page, true()))
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    ).all()
+
+    first = rows[0]
+    if not first.cursor_known:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    items = [
+        {field: getattr(row, field) for field in SHARE_RECORD_FIELDS}
+        for row in rows
+        if row.id is not None
+    ]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor(items[-1]["id"])
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "summary": {
+            "total": first.total,
+            "active": first.active,
+            "total_views": first.total_views,
+            "total_downloads": first.total_downloads,
+        },
+    }
+
+
 def revoke_env_share(db: Session, share_id: int, user_id: int) -> None:
     """
     Revoke a share link (set is_active=False). User must have access to the share's environment.
@@ -104,7 +289,7 @@ def revoke_env_share(db: Session, share_id: int, user_id: int) -> None:
         )
     environment = get_environment_by_id(db, share.environment_id)
     check_project_access(db, environment.project_id, user_id)
-    share.is_active = False
+    _deactivate(db, share_id)
     db.commit()
     log_audit(
         db=db,
@@ -125,16 +310,17 @@ def _is_expired(share: EnvShare) -> bool:
 
 
 def _check_ip_allowed(share: EnvShare, client_ip: Optional[str]) -> bool:
-    if not share.whitelisted_ips or len(share.whitelisted_ips) == 0:
-        # No whitelist configured -> allow all
-        return True
-    if client_ip is None:
-        return False
-    return client_ip in share.whitelisted_ips
+    # No whitelist configured -> allow all; otherwise match addresses and CIDR ranges
+    return is_ip_allowed(share.id, share.whitelisted_ips, client_ip)
 
 
 def _get_share_or_403(db: Session, token: str) -> EnvShare:
-    share = db.query(EnvShare).filter(EnvShare.token == token).first()
+    share = (
+        db.query(EnvShare)
+        .options(undefer(EnvShare.snapshot_payload))
+        .filter(EnvShare.token == token)
+        .first()
+    )
     if not share or not share.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -143,20 +329,32 @@ def _get_share_or_403(db: Session, token: str) -> EnvShare:
     return share
 
 
+def _deactivate(db: Session, share_id: int, *conditions) -> None:
+    """Deactivate a share if it is still active, keeping the environment's active share count"""
+    deactivated = db.execute(
+        update(EnvShare)
+        .where(EnvShare.id == share_id, EnvShare.is_active.is_(True), *conditions)
+        .values(is_active=False, deactivated_at=func.now())
+        .returning(EnvShare.environment_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    adjust_active_shares(db, count_share_deactivations(deactivated))
+
+
+@traced()
 def _validate_share_common(
     db: Session,
     share: EnvShare,
     password: str,
     client_ip: Optional[str],
-    for_download: bool,
 ) -> None:
     """
     Common validation for share access (view/download).
-    Raises HTTPException on failure.
+    Raises HTTPException on failure. Limits are enforced by _claim_access.
     """
     # Expiry
     if _is_expired(share):
-        share.is_active = False
+        _deactivate(db, share.id)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -177,54 +375,66 @@ def _validate_share_common(
             detail="Invalid password for share link",
         )
 
-    # Limits
-    if for_download:
-        if share.max_downloads is not None and share.max_downloads >= 0:
-            if share.download_count >= share.max_downloads:
-                share.is_active = False
-                db.commit()
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Download limit exceeded for this share link",
-                )
-    else:
-        if share.max_views is not None and share.max_views >= 0:
-            if share.view_count >= share.max_views:
-                share.is_active = False
-                db.commit()
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="View limit exceeded for this share link",
-                )
-
 
-def _increment_counters_and_maybe_revoke(
-    db: Session,
-    share: EnvShare,
-    for_download: bool,
-) -> None:
+def _claim_access(db: Session, share_id: int, for_download: bool) -> None:
     """
-    Increment view/download counters atomically and revoke if needed.
+    Count one view/download with a single conditional UPDATE ... RETURNING.
+
+    The limit check and the increment happen in the same statement, so
+    concurrent requests can never push a counter past its limit. The share is
+    revoked in the same statement when it is used up: after any download,
+    after a one-time view, or when the view limit is reached. Negative or
+    NULL limits mean unlimited. Does not commit.
     """
     if for_download:
-        share.download_count += 1
-        # Auto revoke after download regardless of one_time
-        share.is_active = False
+        count, limit = EnvShare.download_count, EnvShare.max_downloads
+        revoke = true()
     else:
-        share.view_count += 1
-        # Revoke on one-time after first successful view
-        if share.one_time:
-            share.is_active = False
+        count, limit = EnvShare.view_count, EnvShare.max_views
+        revoke = or_(EnvShare.one_time, and_(limit >= 0, count + 1 >= limit))
+    within_limit = or_(limit.is_(None), limit < 0, count < limit)
+
+    claimed = db.execute(
+        update(EnvShare)
+        .where(EnvShare.id == share_id, EnvShare.is_active.is_(True), within_limit)
+        .values(
+            {
+                count: count + 1,
+                EnvShare.is_active: case((revoke, false()), else_=true()),
+                EnvShare.deactivated_at: case((revoke, func.now()), else_=None),
+            }
+        )
+        .returning(EnvShare.environment_id, EnvShare.is_active)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if claimed is None:
+        # Lost the race for the last use (or the share was used up before it was revoked)
+        db.rollback()
+        _deactivate(db, share_id, ~within_limit)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Download limit exceeded for this share link" if for_download else "View limit exceeded for this share link",
+        )
+    if not claimed.is_active:
+        adjust_active_shares(db, {claimed.environment_id: -1})
 
-        # Also revoke if view limit reached
-        if share.max_views is not None and share.max_views >= 0:
-            if share.view_count >= share.max_views:
-                share.is_active = False
 
-    db.commit()
-    db.refresh(share)
+def _resolve_for_share(db: Session, environment: Environment, env_vars: List[EnvVariable]):
+    """
+    Decrypt secrets and substitute ${...} references for a share's environment.
+    The share was authorized by its creator, so referenced environments are not re-checked.
+    """
+    try:
+        return resolve_environment(db, environment, rows=env_vars)
+    except InvalidToken:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Unable to decrypt environment variables. The environment may have been created or modified with a different encryption key. Please contact the link owner.",
+        )
 
 
+@traced()
 def get_env_variables_for_share(
     db: Session,
     share: EnvShare,
@@ -232,24 +442,13 @@ def get_env_variables_for_share(
     """
     Retrieve decrypted environment variables for a given share's environment.
     """
-    env_vars = (
-        db.query(EnvVariable)
-        .filter(EnvVariable.environment_id == share.environment_id)
-        .all()
-    )
+    environment = get_environment_by_id(db, share.environment_id)
+    env_vars = effective_variables_query(db, environment).all()
+    resolved = _resolve_for_share(db, environment, env_vars)
 
     result: List[EnvVarForShare] = []
     for ev in env_vars:
-        if ev.is_secret:
-            try:
-                value = encryption_service.decrypt(ev.value)
-            except InvalidToken:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Unable to decrypt environment variables. The environment may have been created or modified with a different encryption key. Please contact the link owner.",
-                )
-        else:
-            value = ev.value  # non-secret values are stored in plain text
+        value = resolved[ev.id].value
         result.append(
             EnvVarForShare(
                 key=ev.key,
@@ -267,97 +466,91 @@ def get_env_file_content_for_share(
     """
     Build .env file content for a given share's environment.
     """
-    env_vars = (
-        db.query(EnvVariable)
-        .filter(EnvVariable.environment_id == share.environment_id)
-        .all()
-    )
+    return render_env_file(get_env_variables_for_share(db, share))
 
-    lines: List[str] = []
-    for ev in env_vars:
-        if ev.is_secret:
-            try:
-                value = encryption_service.decrypt(ev.value)
-            except InvalidToken:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Unable to decrypt environment variables. The environment may have been created or modified with a different encryption key. Please contact the link owner.",
-                )
-        else:
-            value = ev.value  # non-secret values are stored in plain text
-        lines.append(f"{ev.key}={value}")
-    return "\n".join(lines)
 
+def render_env_file(variables: List[EnvVarForShare]) -> str:
+    return "\n".join(f"{v.key}={v.value}" for v in variables)
 
-def access_share_view(
+
+def _read_share_variables(db: Session, share: EnvShare, password: str) -> List[EnvVarForShare]:
+    # Snapshots are opened with the share password; live shares read the environment
+    if share.snapshot:
+        return open_snapshot(share.snapshot_kdf, share.snapshot_payload, password)
+    return get_env_variables_for_share(db, share)
+
+
+def _access_share(
     db: Session,
     token: str,
     password: str,
     client_ip: Optional[str],
-) -> Tuple[EnvShare, List[EnvVarForShare]]:
+    for_download: bool,
+):
     """
-    Perform a secure view access on a share link.
+    Validate, read, count and audit one share access in a single transaction.
+
+    The variables are read before the counter is claimed so the share row is
+    only locked for the UPDATE, the audit INSERT and the commit. Snapshot
+    shares never touch the environment.
     """
     share = _get_share_or_403(db, token)
+    share_id, environment_id, created_by = share.id, share.environment_id, share.created_by
 
     _validate_share_common(
         db=db,
         share=share,
         password=password,
         client_ip=client_ip,
-        for_download=False,
     )
 
-    variables = get_env_variables_for_share(db, share)
+    variables = _read_share_variables(db, share, password)
+    payload = render_env_file(variables) if for_download else variables
 
-    _increment_counters_and_maybe_revoke(db=db, share=share, for_download=False)
+    _claim_access(db, share_id, for_download)
 
     # Audit as created_by user
     log_audit(
         db=db,
-        user_id=share.created_by,
-        action="view",
+        user_id=created_by,
+        action="copy" if for_download else "view",
         resource="env_share",
-        resource_id=share.id,
-        details=f"Shared environment {share.environment_id} viewed via token",
+        resource_id=share_id,
+        details=(
+            f"Shared environment {environment_id} downloaded as .env via token"
+            if for_download
+            else f"Shared environment {environment_id} viewed via token"
+        ),
+        commit=False,
     )
+    db.commit()
 
-    return share, variables
+    return environment_id, payload
 
 
-def access_share_download(
+@traced()
+def access_share_view(
     db: Session,
     token: str,
     password: str,
     client_ip: Optional[str],
-) -> Tuple[EnvShare, str]:
+) -> Tuple[int, List[EnvVarForShare]]:
     """
-    Perform a secure download access on a share link, returning .env content.
+    Perform a secure view access on a share link.
+    Returns the shared environment id and its variables.
     """
-    share = _get_share_or_403(db, token)
-
-    _validate_share_common(
-        db=db,
-        share=share,
-        password=password,
-        client_ip=client_ip,
-        for_download=True,
-    )
-
-    content = get_env_file_content_for_share(db, share)
-
-    _increment_counters_and_maybe_revoke(db=db, share=share, for_download=True)
-
-    # Audit as created_by user
-    log_audit(
-        db=db,
-        user_id=share.created_by,
-        action="copy",
-        resource="env_share",
-        resource_id=share.id,
-        details=f"Shared environment {share.environment_id} downloaded as .env via token",
-    )
-
-    return share, content
+    return _access_share(db, token, password, client_ip, for_download=False)
 
 
+@traced()
+def access_share_download(
+    db: Session,
+    token: str,
+    password: str,
+    client_ip: Optional[str],
+) -> Tuple[int, str]:
+    """
+    Perform a secure download access on a share link, returning .env content.
+    Returns the shared environment id and the file content.
+    """
+    return _access_share(db, token, password, client_ip, for_download=True)
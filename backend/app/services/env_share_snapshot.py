@@ -0,0 +1,57 @@
+"""
+Snapshot payloads for share links.
+
+A snapshot share renders its variables once, at creation: the resolved
+variables are serialized, zlib-compressed and encrypted with Fernet under a
+key derived from the share password (PBKDF2-HMAC-SHA256, random salt). The
+master key is not involved, so opening a snapshot is one key derivation and
+one decrypt, independent of the environment's size and later edits.
+"""
+
+import base64
+import hashlib
+import json
+import secrets
+import zlib
+from typing import List, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException, status
+
+from app.schemas.env_share import EnvVarForShare
+
+_ALGORITHM = "pbkdf2_sha256"
+_ITERATIONS = 200_000
+
+
+def _derive_fernet(password: str, salt: bytes, iterations: int) -> Fernet:
+    key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def render_snapshot(variables: List[EnvVarForShare], password: str) -> Tuple[str, str]:
+    """
+    Freeze variables into an encrypted payload.
+    Returns (kdf parameters "pbkdf2_sha256$<iterations>$<salt>", payload).
+    """
+    salt = secrets.token_bytes(16)
+    data = json.dumps([[v.key, v.value, v.is_secret] for v in variables], separators=(",", ":"))
+    payload = _derive_fernet(password, salt, _ITERATIONS).encrypt(zlib.compress(data.encode()))
+    kdf = f"{_ALGORITHM}${_ITERATIONS}${base64.urlsafe_b64encode(salt).decode()}"
+    return kdf, payload.decode()
+
+
+def open_snapshot(kdf: str, payload: str, password: str) -> List[EnvVarForShare]:
+    """Decrypt a snapshot with the share password (already verified against the hash)"""
+    try:
+        algorithm, iterations, salt = kdf.split("$")
+        if algorithm != _ALGORITHM:
+            raise ValueError(algorithm)
+        fernet = _derive_fernet(password, base64.urlsafe_b64decode(salt), int(iterations))
+        data = json.loads(zlib.decompress(fernet.decrypt(payload.encode())))
+    except (InvalidToken, ValueError, zlib.error):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Unable to open the shared snapshot. Please contact the link owner.",
+        )
+    return [EnvVarForShare(key=key, value=value, is_secret=is_secret) for key, value, is_secret in data]
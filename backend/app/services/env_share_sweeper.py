@@ -0,0 +1,169 @@
+"""
+Periodic cleanup of share links.
+
+Deactivates links that expired or can no longer be used, in batched UPDATEs
+served by the partial index on active links, and optionally purges inactive
+links once they are past the retention window. Every worker runs the sweeper;
+the statements are idempotent, so overlapping runs are harmless.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.db.session import SessionLocal
+from app.environments.stats import adjust_active_shares, count_share_deactivations
+from app.models.env_share import EnvShare
+
+logger = logging.getLogger(__name__)
+
+SHARE_SWEEP_LINKS = Counter("share_sweep_links_total", "Share links handled by the sweeper", ("result",))
+
+
+def _exhausted():
+    # Nothing can succeed any more: views and downloads are both used up
+    return and_(
+        EnvShare.max_views >= 0,
+        EnvShare.view_count >= EnvShare.max_views,
+        EnvShare.max_downloads >= 0,
+        EnvShare.download_count >= EnvShare.max_downloads,
+    )
+
+
+def _deactivate_batches(db: Session, condition, batch_size: int) -> int:
+    total = 0
+    while True:
+        batch = (
+            select(EnvShare.id)
+            .where(EnvShare.is_active.is_(True), condition)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        deactivated = db.execute(
+            update(EnvShare)
+            .where(EnvShare.id.in_(batch))
+            .values(is_active=False, deactivated_at=func.now())
+            .returning(EnvShare.environment_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        adjust_active_shares(db, count_share_deactivations(deactivated))
+        db.commit()
+        count = len(deactivated)
+        total += count
+        if count < batch_size:
+            return total
+
+
+def deactivate_expired_shares(db: Session, now: datetime, batch_size: int) -> int:
+    """Deactivate active links whose expiry has passed; returns the number of links"""
+    return _deactivate_batches(
+        db,
+        and_(EnvShare.expires_at.is_not(None), EnvShare.expires_at <= now),
+        batch_size,
+    )
+
+
+def deactivate_exhausted_shares(db: Session, batch_size: int) -> int:
+    """Deactivate active links with no views or downloads left; returns the number of links"""
+    return _deactivate_batches(db, _exhausted(), batch_size)
+
+
+def purge_inactive_shares(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Delete inactive links deactivated before the cutoff"""
+    total = 0
+    while True:
+        batch = (
+            select(EnvShare.id)
+            .where(
+                EnvShare.is_active.is_(False),
+                or_(
+                    EnvShare.deactivated_at < cutoff,
+                    # Links deactivated before the time was recorded: created (and expired) before the cutoff
+                    and_(
+                        EnvShare.deactivated_at.is_(None),
+                        EnvShare.created_at < cutoff,
+                        or_(EnvShare.expires_at.is_(None), EnvShare.expires_at < cutoff),
+                    ),
+                ),
+            )
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        count = db.execute(
+            delete(EnvShare)
+            .where(EnvShare.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+
+def sweep_shares(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Run one sweep and return the number of links expired, exhausted and purged"""
+    now = now or datetime.now(timezone.utc)
+    batch_size = max(settings.SHARE_SWEEP_BATCH_SIZE, 1)
+    counts = {
+        "expired": deactivate_expired_shares(db, now, batch_size),
+        "exhausted": deactivate_exhausted_shares(db, batch_size),
+        "purged": 0,
+    }
+    if settings.SHARE_PURGE_AFTER_DAYS > 0:
+        cutoff = now - timedelta(days=settings.SHARE_PURGE_AFTER_DAYS)
+        counts["purged"] = purge_inactive_shares(db, cutoff, batch_size)
+    for result, count in counts.items():
+        SHARE_SWEEP_LINKS.inc(result, amount=count)
+    logger.info(
+        "Share sweep: %(expired)d expired, %(exhausted)d exhausted, %(purged)d purged",
+        counts,
+    )
+    return counts
+
+
+class ShareSweeper:
+    """Runs sweep_shares every SHARE_SWEEP_INTERVAL_SECONDS on a daemon thread."""
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="share-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                sweep_shares(db)
+            except Exception:
+                db.rollback()
+                logger.exception("Share sweep failed")
+            finally:
+                db.close()
+
+
+share_sweeper = ShareSweeper(settings.SHARE_SWEEP_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    # One-off sweep, e.g. from cron when the in-process sweeper is disabled
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        print(sweep_shares(session))
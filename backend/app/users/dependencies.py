@@ -4,10 +4,12 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import User
 from app.core.security import decode_access_token
+from app.core.tracing import traced
 
 security = HTTPBearer()
 
 
+@traced()
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -39,5 +41,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Detached, so commits in the endpoint do not expire it and reload it on the next access
+    db.expunge(user)
     return user
 
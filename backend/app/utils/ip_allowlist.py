@@ -0,0 +1,111 @@
+"""
+IP allowlists with CIDR ranges (IPv4 and IPv6).
+
+An allowlist is compiled once into a set of masked network integers per
+prefix length, so a lookup costs one mask and one set probe per distinct
+prefix length no matter how many ranges are listed. Compiled allowlists are
+cached per share id.
+"""
+
+import ipaddress
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+_CACHE_SIZE = 4096
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_entry(entry: str) -> IPNetwork:
+    """Parse an address or CIDR range; host bits are ignored ("10.0.0.7/8" -> 10.0.0.0/8)"""
+    return ipaddress.ip_network(entry.strip(), strict=False)
+
+
+def normalize_allowlist(entries: Iterable[str]) -> List[str]:
+    """
+    Validate entries and return them in canonical form, without duplicates.
+    Single addresses stay plain addresses. Raises ValueError on an invalid entry.
+    """
+    normalized: List[str] = []
+    for entry in entries:
+        try:
+            network = parse_entry(entry)
+        except ValueError:
+            raise ValueError(f"Invalid IP address or CIDR range: {entry!r}")
+        value = str(network.network_address) if network.num_addresses == 1 else network.with_prefixlen
+        if value not in normalized:
+            normalized.append(value)
+    return normalized
+
+
+class IPAllowlist:
+    """Compiled allowlist: {ip version: [(prefix length, {masked network ints})]}"""
+
+    def __init__(self, entries: Iterable[str]):
+        networks: Dict[int, List[IPNetwork]] = {4: [], 6: []}
+        for entry in entries:
+            try:
+                network = parse_entry(entry)
+            except ValueError:
+                # Legacy free-text entries can never match
+                continue
+            networks[network.version].append(network)
+
+        self._tables: Dict[int, List[Tuple[int, int, set]]] = {}
+        for version, items in networks.items():
+            bits = 32 if version == 4 else 128
+            by_prefix: Dict[int, set] = {}
+            for network in ipaddress.collapse_addresses(items):
+                by_prefix.setdefault(network.prefixlen, set()).add(int(network.network_address))
+            # Shortest prefixes first: broad ranges tend to cover most clients
+            self._tables[version] = [
+                (prefixlen, ((1 << bits) - 1) ^ ((1 << (bits - prefixlen)) - 1), addresses)
+                for prefixlen, addresses in sorted(by_prefix.items())
+            ]
+
+    def __contains__(self, client_ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(client_ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        value = int(address)
+        return any(value & mask in addresses for _, mask, addresses in self._tables.get(address.version, ()))
+
+
+class _CacheEntry(NamedTuple):
+    entries: Tuple[str, ...]
+    allowlist: IPAllowlist
+
+
+_cache: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_allowlist(share_id: int, entries: Iterable[str]) -> IPAllowlist:
+    """Return the compiled allowlist for a share, recompiling if its entries changed"""
+    entries = tuple(entries)
+    with _lock:
+        cached = _cache.get(share_id)
+        if cached is not None and cached.entries == entries:
+            _cache.move_to_end(share_id)
+            return cached.allowlist
+
+    allowlist = IPAllowlist(entries)
+    with _lock:
+        _cache[share_id] = _CacheEntry(entries, allowlist)
+        _cache.move_to_end(share_id)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return allowlist
+
+
+def is_ip_allowed(share_id: int, entries: Optional[List[str]], client_ip: Optional[str]) -> bool:
+    """An empty allowlist allows everyone; otherwise the client must fall in a listed range"""
+    if not entries:
+        return True
+    if client_ip is None:
+        return False
+    return client_ip in get_allowlist(share_id, entries)
@@ -0,0 +1,248 @@
+"""
+Brute-force throttling for the public share endpoints.
+
+Every attempt takes a token from a bucket per share token and per client IP.
+Failed attempts (any 403) count towards a lockout that doubles with each
+further failure. Checks run before any database or bcrypt work, so a rejected
+request costs a dict lookup (or one Redis round-trip with the shared backend).
+
+The default backend is in-process, so limits apply per worker. Set
+SHARE_RATE_LIMIT_REDIS_URL to share them between workers; that needs the
+optional `redis` package.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.core import metrics
+
+_MAX_KEYS = 100_000
+
+RATE_LIMITED = "rate_limited"
+LOCKED_OUT = "locked_out"
+
+SHARE_THROTTLE_REJECTIONS = metrics.Counter(
+    "share_throttle_rejections_total",
+    "Share access attempts rejected before any work, by reason",
+    ("reason",),
+)
+
+
+def lockout_seconds(failures: int) -> float:
+    """Lockout after the given number of consecutive failures (0 below the threshold)"""
+    excess = failures - settings.SHARE_LOCKOUT_AFTER_FAILURES
+    if settings.SHARE_LOCKOUT_AFTER_FAILURES <= 0 or excess < 0:
+        return 0.0
+    return float(min(settings.SHARE_LOCKOUT_BASE_SECONDS * 2 ** min(excess, 32), settings.SHARE_LOCKOUT_MAX_SECONDS))
+
+
+class _KeyState:
+    __slots__ = ("tokens", "updated", "failures", "last_failure", "locked_until")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.failures = 0
+        self.last_failure = 0.0
+        self.locked_until = 0.0
+
+
+class MemoryBackend:
+    """Per-process token buckets and lockouts, bounded to the most recent keys."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.burst = burst
+        self._states: "OrderedDict[str, _KeyState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key: str, now: float) -> _KeyState:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState(self.burst, now)
+            if len(self._states) > _MAX_KEYS:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def take(self, key: str, now: float) -> Tuple[float, Optional[str]]:
+        """Consume one token; returns (retry_after seconds, rejection reason) or (0, None)"""
+        with self._lock:
+            state = self._state(key, now)
+            if state.locked_until > now:
+                return state.locked_until - now, LOCKED_OUT
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+            if state.tokens < 1:
+                return (1 - state.tokens) / self.rate, RATE_LIMITED
+            state.tokens -= 1
+            return 0.0, None
+
+    def failure(self, key: str, now: float) -> None:
+        with self._lock:
+            state = self._state(key, now)
+            # Failures spread further apart than the longest lockout start over
+            if now - state.last_failure > settings.SHARE_LOCKOUT_MAX_SECONDS:
+                state.failures = 0
+            state.failures += 1
+            state.last_failure = now
+            state.locked_until = max(state.locked_until, now + lockout_seconds(state.failures))
+
+    def success(self, key: str) -> None:
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                state.failures = 0
+                state.locked_until = 0.0
+
+
+# Refill, then take one token; returns the seconds to wait (0 when allowed)
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+  wait = (1 - tokens) / rate
+else
+  tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Token buckets and lockouts shared by every worker through Redis."""
+
+    def __init__(self, url: str, rate_per_second: float, burst: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARE_RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self.rate = rate_per_second
+        self.burst = burst
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, now: float) -> Tuple[float, Optional[str]]:
+        locked_ms = self._redis.pttl(f"share-lock:{key}")
+        if locked_ms > 0:
+            return locked_ms / 1000, LOCKED_OUT
+        wait = float(self._take(keys=[f"share-rl:{key}"], args=[now, self.rate, self.burst]))
+        return (wait, RATE_LIMITED) if wait > 0 else (0.0, None)
+
+    def failure(self, key: str, now: float) -> None:
+        failures_key = f"share-fail:{key}"
+        pipe = self._redis.pipeline()
+        pipe.incr(failures_key)
+        pipe.expire(failures_key, settings.SHARE_LOCKOUT_MAX_SECONDS)
+        failures = pipe.execute()[0]
+        lockout = lockout_seconds(failures)
+        if lockout > 0:
+            self._redis.set(f"share-lock:{key}", 1, px=int(lockout * 1000))
+
+    def success(self, key: str) -> None:
+        self._redis.delete(f"share-fail:{key}", f"share-lock:{key}")
+
+
+class ShareThrottle:
+    """Rate limits and lockouts for share access, keyed by share token and client IP."""
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._rejections: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SHARE_RATE_LIMIT_PER_MINUTE > 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    rate = settings.SHARE_RATE_LIMIT_PER_MINUTE / 60
+                    burst = max(settings.SHARE_RATE_LIMIT_BURST, 1)
+                    if settings.SHARE_RATE_LIMIT_REDIS_URL:
+                        self._backend = RedisBackend(settings.SHARE_RATE_LIMIT_REDIS_URL, rate, burst)
+                    else:
+                        self._backend = MemoryBackend(rate, burst)
+        return self._backend
+
+    @staticmethod
+    def keys(token: str, client_ip: Optional[str]) -> Iterable[str]:
+        yield f"token:{token}"
+        if client_ip:
+            yield f"ip:{client_ip}"
+
+    def check(self, token: str, client_ip: Optional[str]) -> None:
+        """Raise 429 with Retry-After if the token or the client IP is throttled"""
+        if not self.enabled:
+            return
+        now = time.time()
+        for key in self.keys(token, client_ip):
+            retry_after, reason = self.backend.take(key, now)
+            if reason is not None:
+                with self._stats_lock:
+                    self._rejections[reason] += 1
+                SHARE_THROTTLE_REJECTIONS.inc(reason)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many attempts for this share link, try again later",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+    def record_failure(self, token: str, client_ip: Optional[str]) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        for key in self.keys(token, client_ip):
+            self.backend.failure(key, now)
+
+    def record_success(self, token: str, client_ip: Optional[str]) -> None:
+        if not self.enabled:
+            return
+        for key in self.keys(token, client_ip):
+            self.backend.success(key)
+
+    @contextmanager
+    def track(self, token: str, client_ip: Optional[str]):
+        """Record the outcome of an access: any 403 counts as a failed attempt"""
+        try:
+            yield
+        except HTTPException as exc:
+            if exc.status_code == status.HTTP_403_FORBIDDEN:
+                self.record_failure(token, client_ip)
+            raise
+        self.record_success(token, client_ip)
+
+    def stats(self) -> Dict[str, int]:
+        """Rejections since start, by reason"""
+        with self._stats_lock:
+            return {RATE_LIMITED: self._rejections[RATE_LIMITED], LOCKED_OUT: self._rejections[LOCKED_OUT]}
+
+
+share_throttle = ShareThrottle()
+
+
+def throttle_share_access(token: str, request: Request) -> Optional[str]:
+    """Dependency for public share endpoints: rejects throttled callers, returns the client IP"""
+    client_ip = request.client.host if request.client else None
+    share_throttle.check(token, client_ip)
+    return client_ip
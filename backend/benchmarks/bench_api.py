@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API hot paths and compare runs.
+
+Boots the app in-process, seeds one project with a root environment of
+--variables variables (a quarter of them secret), a child environment that
+inherits them, --projects extra projects and --shares share links, then
+measures latency percentiles and throughput for:
+
+  login, project listing, variable listing (masked, revealed, inherited),
+  single variable, .env download, batch download, bulk update, bulk delete,
+  share view and share download
+
+Listings run as a project ADMIN, so secrets are masked unless revealed.
+Cases that verify a bcrypt hash (login, share access) run --slow-requests
+times instead of --requests.
+
+Results are written as JSON with --output. --compare loads an earlier result
+and exits with 1 if a case's p50 or p95 got slower by more than --threshold
+(and by at least --min-delta-ms), so releases can be checked against a
+baseline taken on the same machine and data sizes.
+
+Run from backend dir:
+  python benchmarks/bench_api.py --output before.json
+  python benchmarks/bench_api.py --compare before.json
+Uses a throwaway SQLite database unless DATABASE_URL is set (for Postgres,
+point it at an empty database).
+"""
+import argparse
+import json
+import os
+import platform
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_DB_DIR = tempfile.mkdtemp(prefix="env-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/bench.db")
+os.environ.setdefault("ENV_MASTER_KEY", "benchmark-master-key")
+# Every request comes from the same client: throttling would measure 429s
+os.environ.setdefault("SHARE_RATE_LIMIT_PER_MINUTE", "0")
+
+PASSWORD = "benchmark-password"
+
+
+class Case:
+    """One endpoint to measure; `prepare(n)` builds the payloads of n calls outside the timing"""
+
+    def __init__(self, name, method, path, slow=False, prepare=None, **request):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.slow = slow
+        self.prepare = prepare
+        self.request = request
+
+    def payloads(self, count: int):
+        if self.prepare is None:
+            return [self.request] * count
+        return [{**self.request, **payload} for payload in self.prepare(count)]
+
+
+def _insert_variables(db, environment_id: int, rows) -> None:
+    """Bulk insert variables, keeping the merged view and counters in step like the write paths do"""
+    from app.core.encryption import encryption_service
+    from app.db.models import EnvVariable
+    from app.environments.inheritance import refresh_merged_view
+    from app.environments.stats import adjust_environment_stats
+
+    encrypted = iter(encryption_service.encrypt_many(row["value"] for row in rows if row["is_secret"]))
+    db.execute(
+        insert(EnvVariable),
+        [
+            {
+                "key": row["key"],
+                "value": next(encrypted) if row["is_secret"] else row["value"],
+                "value_digest": encryption_service.digest(row["value"]),
+                "is_secret": row["is_secret"],
+                "environment_id": environment_id,
+            }
+            for row in rows
+        ],
+    )
+    refresh_merged_view(db, environment_id, [row["key"] for row in rows])
+    adjust_environment_stats(
+        db, environment_id, variables=len(rows), secrets=sum(1 for row in rows if row["is_secret"])
+    )
+    db.commit()
+
+
+def _clone_shares(token: str, count: int) -> list:
+    """Copies of a share link under new tokens (creating each through the API would hash its password)"""
+    from app.db.session import SessionLocal
+    from app.environments.stats import adjust_active_shares
+    from app.models.env_share import EnvShare
+
+    if count <= 0:
+        return []
+    with SessionLocal() as db:
+        template = db.execute(select(EnvShare.__table__).where(EnvShare.token == token)).mappings().one()
+        row = {key: value for key, value in template.items() if key not in ("id", "created_at")}
+        tokens = [secrets.token_urlsafe(32) for _ in range(count)]
+        db.execute(insert(EnvShare), [{**row, "token": new_token} for new_token in tokens])
+        adjust_active_shares(db, {row["environment_id"]: count})
+        db.commit()
+    return tokens
+
+
+def _seed(client, args):
+    """Seed through the API where it is cheap and in bulk where it is not; returns ids and headers"""
+    from app.db.session import SessionLocal
+    from app.models.env_share import EnvShare
+
+    def register(email):
+        response = client.post("/auth/register", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    stamp = time.time_ns()
+    owner_email, admin_email = f"bench-owner-{stamp}@example.com", f"bench-admin-{stamp}@example.com"
+    owner = register(owner_email)
+    admin = register(admin_email)
+
+    project_id = client.post("/projects", json={"name": "bench"}, headers=owner).json()["id"]
+    for i in range(args.projects):
+        client.post("/projects", json={"name": f"bench-{i}"}, headers=owner).raise_for_status()
+    client.post(
+        f"/projects/{project_id}/members",
+        json={"members": [{"email": admin_email, "role": "ADMIN"}]},
+        headers=owner,
+    ).raise_for_status()
+    root_id = client.post("/environments", json={"name": "PROD", "project_id": project_id}, headers=owner).json()["id"]
+    child_id = client.post(
+        "/environments", json={"name": "STAGING", "project_id": project_id, "parent_id": root_id}, headers=owner
+    ).json()["id"]
+
+    with SessionLocal() as db:
+        _insert_variables(
+            db,
+            root_id,
+            [{"key": f"KEY_{i}", "value": f"value-{i}", "is_secret": i % 4 == 0} for i in range(args.variables)],
+        )
+    # Overrides so the child's view really is a merge
+    client.post(
+        "/env", json={"key": "KEY_1", "value": "override", "environment_id": child_id}, headers=owner
+    ).raise_for_status()
+
+    response = client.post(f"/env/{root_id}/share", json={"password": PASSWORD}, headers=owner)
+    response.raise_for_status()
+    token = response.json()["share_url"].rsplit("/", 1)[-1]
+    # Negative limits are unlimited but the API only accepts counts, so the
+    # viewed link is widened directly; the other links exist to fill the table
+    _clone_shares(token, args.shares - 1)
+    with SessionLocal() as db:
+        db.execute(update(EnvShare).where(EnvShare.token == token).values(max_views=-1))
+        db.commit()
+    item_id = client.get(f"/env/{root_id}", headers=admin).json()[0]["id"]
+    return {
+        "project_id": project_id,
+        "root_id": root_id,
+        "child_id": child_id,
+        "item_id": item_id,
+        "token": token,
+        "owner": owner,
+        "admin": admin,
+        "owner_email": owner_email,
+    }
+
+
+def _cases(args, seed):
+    from app.db.session import SessionLocal
+
+    root_id, admin = seed["root_id"], seed["admin"]
+    bulk_keys = [f"KEY_{i}" for i in range(min(args.bulk_size, args.variables))]
+    counter = iter(range(1_000_000_000))
+
+    def bulk_updates(count):
+        return [
+            {"json": {"environment_id": root_id, "items": [{"key": key, "value": f"v{n}"} for key in bulk_keys]}}
+            for n in (next(counter) for _ in range(count))
+        ]
+
+    def bulk_deletes(count):
+        batches = [[f"BULK_{next(counter)}_{i}" for i in range(args.bulk_size)] for _ in range(count)]
+        with SessionLocal() as db:
+            _insert_variables(
+                db, root_id, [{"key": key, "value": "v", "is_secret": False} for keys in batches for key in keys]
+            )
+        return [{"json": {"environment_id": root_id, "keys": keys}} for keys in batches]
+
+    def share_downloads(count):
+        # A download always revokes its link, so each request gets its own copy
+        return [{"url": f"/share/{token}/download"} for token in _clone_shares(seed["token"], count)]
+
+    share = {"password": PASSWORD}
+    return [
+        Case("login", "POST", "/auth/login", slow=True, json={"email": seed["owner_email"], "password": PASSWORD}),
+        Case("list projects", "GET", "/projects", headers=admin),
+        Case("list variables masked", "GET", f"/env/{root_id}", headers=admin),
+        Case("list variables revealed", "GET", f"/env/{root_id}", headers=admin, params={"reveal_secrets": "true"}),
+        Case("list variables inherited", "GET", f"/env/{seed['child_id']}", headers=admin),
+        Case("get variable", "GET", f"/env/item/{seed['item_id']}", headers=admin),
+        Case("download .env", "GET", f"/env/download/{root_id}", headers=admin),
+        Case(
+            "batch download merged",
+            "POST",
+            "/env/batch",
+            headers=admin,
+            json={"environment_ids": [root_id, seed["child_id"]], "merge": True},
+        ),
+        Case("bulk update", "PATCH", "/env/bulk", headers=admin, prepare=bulk_updates),
+        Case("bulk delete", "POST", "/env/bulk-delete", headers=admin, prepare=bulk_deletes),
+        Case("share view", "POST", f"/share/{seed['token']}/view", slow=True, json=share),
+        Case("share download", "POST", "/share/{token}/download", slow=True, prepare=share_downloads, json=share),
+    ]
+
+
+def _percentile(sorted_samples, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    index = max(0, min(len(sorted_samples) - 1, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def _measure(client, case: Case, requests: int, warmup: int, concurrency: int) -> dict:
+    for payload in case.payloads(warmup):
+        client.request(case.method, **{"url": case.path, **payload})
+    payloads = [{"url": case.path, **payload} for payload in case.payloads(requests)]
+
+    def timed(payload):
+        start = time.perf_counter()
+        response = client.request(case.method, **payload)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, payloads))
+    else:
+        results = [timed(payload) for payload in payloads]
+    wall = time.perf_counter() - start
+
+    samples = sorted(elapsed * 1000 for elapsed, _ in results)
+    errors = sum(1 for _, status_code in results if status_code >= 400)
+    return {
+        "method": case.method,
+        "path": case.path,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(_percentile(samples, 0.50), 3),
+        "p90_ms": round(_percentile(samples, 0.90), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "p99_ms": round(_percentile(samples, 0.99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(samples[-1], 3),
+        "throughput_rps": round(requests / wall, 2),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> list:
+    """Regression messages for cases slower than the baseline beyond the threshold"""
+    for setting in ("database", "concurrency", "sizes"):
+        if baseline["meta"].get(setting) != current["meta"][setting]:
+            print(f"warning: {setting} differs from the baseline: {baseline['meta'].get(setting)}")
+    regressions = []
+    for name, result in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            delta = result[metric] - before[metric]
+            if delta >= min_delta_ms and delta > before[metric] * threshold:
+                regressions.append(
+                    f"{name}: {metric} {before[metric]:.2f} -> {result[metric]:.2f} "
+                    f"(+{delta / before[metric]:.0%})"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variables", type=int, default=1000, help="Variables in the benchmarked environment")
+    parser.add_argument("--projects", type=int, default=50, help="Extra projects owned by the benchmark user")
+    parser.add_argument("--shares", type=int, default=100, help="Share links on the benchmarked environment")
+    parser.add_argument("--bulk-size", type=int, default=100, help="Variables per bulk update or delete")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per case")
+    parser.add_argument("--slow-requests", type=int, default=20, help="Measured requests per bcrypt-bound case")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per case")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+    parser.add_argument("--only", nargs="+", metavar="CASE", help="Run only these cases")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against an earlier JSON result")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown ratio (default 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    from app.db.base import Base
+    from app.db.session import engine
+    from app.main import app
+
+    engine.echo = False
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy import text
+
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+
+    seed = _seed(client, args)
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "concurrency": args.concurrency,
+            "sizes": {
+                "variables": args.variables,
+                "projects": args.projects,
+                "shares": args.shares,
+                "bulk_size": args.bulk_size,
+            },
+        },
+        "cases": {},
+    }
+
+    print(f"{'case':<28}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for case in _cases(args, seed):
+        if args.only and case.name not in args.only:
+            continue
+        requests = args.slow_requests if case.slow else args.requests
+        result = _measure(client, case, requests, min(args.warmup, requests), args.concurrency)
+        results["cases"][case.name] = result
+        print(
+            f"{case.name:<28}{requests:>6}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+            f"{result['p99_ms']:>10.2f}{result['throughput_rps']:>10.1f}{result['errors']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failed = any(result["errors"] for result in results["cases"].values())
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = _compare(baseline, results, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if not regressions:
+            print(f"No regressions against {args.compare} ({baseline['meta'].get('revision')})")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
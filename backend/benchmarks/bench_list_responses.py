@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark the default and fast JSON paths of the list endpoints.
+
+Seeds, for a fresh user, N projects and one environment with N variables (a
+quarter of them secret) and N share links, then reports the median latency
+per 1k rows for:
+
+  serialize  ORM objects -> response_model validation -> stdlib json (before)
+             vs Core rows -> orjson (after), without HTTP or auth
+  endpoint   GET /env/{id}, /env/{id}/shares, /projects through the app,
+             without and with `Accept: application/vnd.envmanager.fast+json`
+
+Run from backend dir: python benchmarks/bench_list_responses.py [--rows 1000 5000]
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_DB_DIR = tempfile.mkdtemp(prefix="env-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/bench.db")
+os.environ.setdefault("ENV_MASTER_KEY", "benchmark-master-key")
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def _seed(db, email: str, rows: int):
+    from app.core.encryption import encryption_service
+    from app.db.models import Environment, EnvVariable, Project, ProjectMember, Role, User
+    from app.models.env_share import EnvShare
+
+    user = db.query(User).filter(User.email == email).one()
+    projects = [Project(name=f"bench-{i}", owner_id=user.id) for i in range(rows)]
+    db.add_all(projects)
+    db.flush()
+    db.bulk_insert_mappings(
+        ProjectMember,
+        [{"project_id": p.id, "user_id": user.id, "role": Role.OWNER} for p in projects],
+    )
+    project = projects[0]
+    environment = Environment(name="bench", project_id=project.id)
+    db.add(environment)
+    db.flush()
+
+    secret = encryption_service.encrypt("s3cr3t-value")
+    db.bulk_insert_mappings(
+        EnvVariable,
+        [
+            {
+                "key": f"KEY_{i}",
+                "value": secret if i % 4 == 0 else f"value-{i}",
+                "is_secret": i % 4 == 0,
+                "environment_id": environment.id,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.bulk_insert_mappings(
+        EnvShare,
+        [
+            {
+                "environment_id": environment.id,
+                "token": f"bench-{rows}-{i}",
+                "password_hash": "x",
+                "whitelisted_ips": ["10.0.0.1"],
+                "created_by": user.id,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.commit()
+    return environment.id
+
+
+def _serialize_before(db, environment_id: int) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    from app.db.models import EnvVariable
+    from app.env_vars.schemas import EnvVariableResponse
+    from app.env_vars.service import env_var_to_response
+
+    env_vars = db.query(EnvVariable).filter(EnvVariable.environment_id == environment_id).all()
+    data = [env_var_to_response(env_var, env_var.value) for env_var in env_vars]
+    validated = TypeAdapter(list[EnvVariableResponse]).validate_python(data)
+    body = json.dumps(jsonable_encoder(validated)).encode()
+    db.expunge_all()
+    return body
+
+
+def _serialize_after(db, environment_id: int) -> bytes:
+    from app.core.responses import FastJSONResponse
+    from app.env_vars.service import ENV_VARIABLE_COLUMNS, env_var_to_response
+    from app.db.models import EnvVariable
+
+    rows = (
+        db.query(EnvVariable)
+        .filter(EnvVariable.environment_id == environment_id)
+        .with_entities(*ENV_VARIABLE_COLUMNS)
+        .all()
+    )
+    return FastJSONResponse([env_var_to_response(row, row.value) for row in rows]).body
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    from app.core.responses import FAST_JSON_MEDIA_TYPE
+    from app.db.base import Base
+    from app.db.session import SessionLocal, engine
+    from app.main import app
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+
+    print(f"{'case':<28}{'rows':>8}{'before ms/1k':>15}{'after ms/1k':>15}{'speedup':>10}")
+    for rows in args.rows:
+        email = f"bench-{time.time_ns()}@example.com"
+        response = client.post("/auth/register", json={"email": email, "password": "benchmark"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        fast_headers = {**headers, "Accept": FAST_JSON_MEDIA_TYPE}
+
+        db = SessionLocal()
+        environment_id = _seed(db, email, rows)
+        per_1k = 1000 / rows
+
+        cases = [
+            (
+                "serialize env vars",
+                lambda: _serialize_before(db, environment_id),
+                lambda: _serialize_after(db, environment_id),
+            ),
+        ]
+        for name, path in [
+            ("GET /env/{id}", f"/env/{environment_id}"),
+            ("GET /env/{id}/shares", f"/env/{environment_id}/shares"),
+            ("GET /projects", "/projects"),
+        ]:
+            cases.append(
+                (
+                    name,
+                    lambda path=path: client.get(path, headers=headers).raise_for_status(),
+                    lambda path=path: client.get(path, headers=fast_headers).raise_for_status(),
+                )
+            )
+
+        for name, before, after in cases:
+            before_ms = _median_ms(before, args.repeat) * per_1k
+            after_ms = _median_ms(after, args.repeat) * per_1k
+            print(f"{name:<28}{rows:>8}{before_ms:>15.2f}{after_ms:>15.2f}{before_ms / after_ms:>9.1f}x")
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
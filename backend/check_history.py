@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Check snapshots and rollbacks against pruned variable history.
+Keeps 3 versions per key, updates a variable past that, then checks that a
+snapshot at an early revision reports the key as truncated and that rolling
+back to it leaves the variable in place, while keys that did not exist yet
+are still removed.
+Run from backend dir: python check_history.py
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import tempfile
+
+# Ensure backend is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_DB_DIR = tempfile.mkdtemp(prefix="env-history-check-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/check.db")
+os.environ.setdefault("ENV_MASTER_KEY", "history-check-key")
+os.environ["ENV_HISTORY_MAX_VERSIONS_PER_KEY"] = "3"
+
+PASSWORD = "history-password"
+
+
+def main():
+    from fastapi.testclient import TestClient
+
+    from app.db.base import Base
+    from app.db.session import engine
+    from app.main import app
+
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    response = client.post("/auth/register", json={"email": "history@example.com", "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    project_id = client.post("/projects", json={"name": "history"}, headers=headers).json()["id"]
+    env_id = client.post("/environments", json={"name": "DEV", "project_id": project_id}, headers=headers).json()["id"]
+    # Revision 1: A created; revisions 2-5: A updated, so its version at revision 1 is pruned
+    var_id = client.post(
+        "/env", json={"key": "A", "value": "v0", "environment_id": env_id}, headers=headers
+    ).json()["id"]
+    for i in range(1, 5):
+        client.put(f"/env/{var_id}", json={"value": f"v{i}"}, headers=headers)
+    # Revision 6: B created after the rollback target
+    client.post("/env", json={"key": "B", "value": "b", "environment_id": env_id}, headers=headers)
+
+    failed = False
+
+    snapshot = client.get(f"/env/{env_id}/snapshot", params={"revision": 1}, headers=headers).json()
+    entries = {entry["key"]: entry for entry in snapshot}
+    if set(entries) == {"A"} and entries["A"]["is_truncated"]:
+        print("OK: snapshot at revision 1 reports A as truncated")
+    else:
+        print(f"FAIL: snapshot at revision 1 returned {snapshot}")
+        failed = True
+
+    result = client.post(f"/env/{env_id}/rollback", json={"revision": 1}, headers=headers).json()
+    variables = {v["key"]: v["value"] for v in client.get(f"/env/{env_id}", headers=headers).json()}
+    if variables == {"A": "v4"} and result["removed"] == 1 and result["truncated_keys"] == ["A"]:
+        print("OK: rollback to revision 1 kept A unchanged and removed B")
+    else:
+        print(f"FAIL: rollback returned {result}, variables now {variables}")
+        failed = True
+
+    result = client.post(f"/env/{env_id}/rollback", json={"revision": 4}, headers=headers).json()
+    variables = {v["key"]: v["value"] for v in client.get(f"/env/{env_id}", headers=headers).json()}
+    if variables == {"A": "v3"} and result["updated"] == 1 and not result["truncated_keys"]:
+        print("OK: rollback to a retained revision restored A")
+    else:
+        print(f"FAIL: rollback to revision 4 returned {result}, variables now {variables}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
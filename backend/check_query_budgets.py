@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Enforce SQL statement budgets per endpoint.
+Calls the main endpoints through the ASGI app and fails if one executes more
+statements than its budget, listing the statements it ran. Each endpoint is
+called once to warm per-worker caches, then measured on a second call, so the
+numbers are those of a steady-state worker. Lower a budget when an endpoint
+gets cheaper; raise one only with a reason.
+Run from backend dir: python check_query_budgets.py [--verbose]
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# Ensure backend is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_DB_DIR = tempfile.mkdtemp(prefix="env-query-budget-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/check.db")
+os.environ.setdefault("ENV_MASTER_KEY", "query-budget-check-key")
+
+PASSWORD = "budget-password"
+
+# Endpoint -> maximum statements, including the user lookup and audit writes
+BUDGETS = {
+    "POST /projects": 6,
+    "GET /projects": 2,
+    "GET /projects/overview": 2,
+    "POST /environments": 5,
+    "GET /environments/{project_id}": 2,
+    "POST /env": 15,
+    "PUT /env/{id}": 16,
+    "DELETE /env/{id}": 14,
+    "GET /env/{environment_id}": 5,
+    "GET /env/{environment_id} (inherited)": 5,
+    "GET /env/item/{id}": 4,
+    "GET /env/download/{environment_id}": 5,
+    "POST /env/bulk-delete": 13,
+    "GET /env/{environment_id}/history": 4,
+    "GET /environments/{environment_id}/diff/{other_id}": 4,
+    "POST /env/{environment_id}/share": 8,
+    "GET /env/{environment_id}/shares/page": 3,
+    "POST /share/{token}/view": 5,
+    "GET /projects/{project_id}/members": 3,
+}
+
+
+def _check(client, headers):
+    """Yield (label, call) pairs; call(i) performs the request for the i-th run"""
+    project_id = client.post("/projects", json={"name": "budget"}, headers=headers).json()["id"]
+    env_id = client.post("/environments", json={"name": "DEV", "project_id": project_id}, headers=headers).json()["id"]
+    child_id = client.post(
+        "/environments", json={"name": "QA", "project_id": project_id, "parent_id": env_id}, headers=headers
+    ).json()["id"]
+    ids = [
+        client.post(
+            "/env",
+            json={"key": f"KEY_{i}", "value": f"value-{i}", "is_secret": i % 2 == 0, "environment_id": env_id},
+            headers=headers,
+        ).json()["id"]
+        for i in range(20)
+    ]
+    token = client.post(
+        f"/env/{env_id}/share", json={"password": PASSWORD, "max_views": 10}, headers=headers
+    ).json()["share_url"].rsplit("/", 1)[-1]
+
+    yield "POST /projects", lambda i: client.post("/projects", json={"name": f"budget-{i}"}, headers=headers)
+    yield "GET /projects", lambda i: client.get("/projects", headers=headers)
+    yield "GET /projects/overview", lambda i: client.get("/projects/overview", headers=headers)
+    yield "POST /environments", lambda i: client.post(
+        "/environments", json={"name": f"ENV_{i}", "project_id": project_id}, headers=headers
+    )
+    yield "GET /environments/{project_id}", lambda i: client.get(f"/environments/{project_id}", headers=headers)
+    yield "POST /env", lambda i: client.post(
+        "/env", json={"key": f"NEW_{i}", "value": "v", "environment_id": env_id}, headers=headers
+    )
+    yield "PUT /env/{id}", lambda i: client.put(f"/env/{ids[1]}", json={"value": f"updated-{i}"}, headers=headers)
+    yield "DELETE /env/{id}", lambda i: client.delete(f"/env/{ids[5 + i]}", headers=headers)
+    yield "GET /env/{environment_id}", lambda i: client.get(f"/env/{env_id}", headers=headers)
+    yield "GET /env/{environment_id} (inherited)", lambda i: client.get(f"/env/{child_id}", headers=headers)
+    yield "GET /env/item/{id}", lambda i: client.get(f"/env/item/{ids[4]}", headers=headers)
+    yield "GET /env/download/{environment_id}", lambda i: client.get(f"/env/download/{env_id}", headers=headers)
+    yield "POST /env/bulk-delete", lambda i: client.post(
+        "/env/bulk-delete", json={"environment_id": env_id, "ids": ids[10 + 3 * i:13 + 3 * i]}, headers=headers
+    )
+    yield "GET /env/{environment_id}/history", lambda i: client.get(f"/env/{env_id}/history", headers=headers)
+    yield "GET /environments/{environment_id}/diff/{other_id}", lambda i: client.get(
+        f"/environments/{env_id}/diff/{child_id}", headers=headers
+    )
+    yield "POST /env/{environment_id}/share", lambda i: client.post(
+        f"/env/{env_id}/share", json={"password": PASSWORD}, headers=headers
+    )
+    yield "GET /env/{environment_id}/shares/page", lambda i: client.get(f"/env/{env_id}/shares/page", headers=headers)
+    yield "POST /share/{token}/view", lambda i: client.post(f"/share/{token}/view", json={"password": PASSWORD})
+    yield "GET /projects/{project_id}/members", lambda i: client.get(f"/projects/{project_id}/members", headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enforce SQL statement budgets per endpoint")
+    parser.add_argument("--verbose", action="store_true", help="List the statements of every endpoint")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    from app.core.instrumentation import assert_max_queries
+    from app.db.base import Base
+    from app.db.session import engine
+    from app.main import app
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    response = client.post("/auth/register", json={"email": "budget@example.com", "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    failed = False
+    for label, call in _check(client, headers):
+        budget = BUDGETS[label]
+        call(0)
+        try:
+            with assert_max_queries(budget, label) as stats:
+                response = call(1)
+        except AssertionError as exc:
+            print(f"FAIL: {exc}")
+            failed = True
+            continue
+        if response.status_code >= 400:
+            print(f"FAIL: {label} returned {response.status_code}: {response.text[:200]}")
+            failed = True
+            continue
+        print(f"OK: {label}: {stats.queries} statements (budget {budget})")
+        if args.verbose:
+            for statement, count in stats.statements.most_common():
+                print(f"    {count} x {' '.join(statement.split())[:160]}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Stress share link limits under parallel access.
+Fires concurrent view and download requests at share links and checks that
+no more than max_views / max_downloads of them succeed, that the stored
+counters match, and that one access stays within its SQL statement budget. Also checks
+that a link with a limit of 0 is listed as exhausted and cannot be opened.
+Run from backend dir: python check_share_limits.py [--workers 16 --requests 40 --max-views 10]
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure backend is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_DB_DIR = tempfile.mkdtemp(prefix="env-share-check-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/check.db")
+os.environ.setdefault("ENV_MASTER_KEY", "share-limits-check-key")
+
+PASSWORD = "share-password"
+
+# SQL statements per successful access: share, environment and variables reads, the
+# counter claim and the audit insert, plus the active share count update when the
+# access uses up the link
+ACCESS_STATEMENT_BUDGET = 5
+LAST_ACCESS_STATEMENT_BUDGET = 6
+
+_local = threading.local()
+
+
+def _count_statement(*args):
+    _local.statements = getattr(_local, "statements", 0) + 1
+
+
+def _seed(db, max_views: int, max_downloads: int):
+    from app.core.security import get_password_hash
+    from app.db.models import Environment, EnvVariable, Project, ProjectMember, Role, User
+    from app.models.env_share import EnvShare
+
+    user = User(email=f"share-check-{time.time_ns()}@example.com", password="x")
+    db.add(user)
+    db.flush()
+    project = Project(name="share-check", owner_id=user.id)
+    db.add(project)
+    db.flush()
+    db.add(ProjectMember(project_id=project.id, user_id=user.id, role=Role.OWNER))
+    environment = Environment(name="share-check", project_id=project.id)
+    db.add(environment)
+    db.flush()
+    db.add(EnvVariable(key="API_URL", value="https://example.com", is_secret=False, environment_id=environment.id))
+
+    password_hash = get_password_hash(PASSWORD)
+    shares = {}
+    for name in ("view", "download"):
+        share = EnvShare(
+            environment_id=environment.id,
+            token=f"share-check-{name}-{time.time_ns()}",
+            password_hash=password_hash,
+            max_views=max_views,
+            max_downloads=max_downloads,
+            created_by=user.id,
+        )
+        db.add(share)
+        shares[name] = share
+    db.commit()
+    return {name: (share.id, share.token) for name, share in shares.items()}
+
+
+def _hammer(access, token: str, workers: int, requests: int):
+    from fastapi import HTTPException
+
+    from app.db.session import SessionLocal
+
+    def attempt(_):
+        db = SessionLocal()
+        _local.statements = 0
+        try:
+            access(db, token, PASSWORD, None)
+            return True, _local.statements
+        except HTTPException:
+            return False, _local.statements
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(attempt, range(requests)))
+    successes = [statements for ok, statements in results if ok]
+    return len(successes), (min(successes) if successes else 0), (max(successes) if successes else 0)
+
+
+def _check_zero_limit(db) -> bool:
+    """A limit of 0 allows no access, so the link must be listed as exhausted, not active"""
+    from fastapi import HTTPException
+
+    from app.models.env_share import EnvShare
+    from app.schemas.env_share import EnvShareStatus
+    from app.services.env_share_service import access_share_view, list_env_shares_page
+
+    shares = _seed(db, max_views=0, max_downloads=0)
+    share = db.get(EnvShare, shares["view"][0])
+    environment_id, user_id = share.environment_id, share.created_by
+    try:
+        access_share_view(db, shares["view"][1], PASSWORD, None)
+        opened = True
+    except HTTPException:
+        db.rollback()
+        opened = False
+    page = list_env_shares_page(db, environment_id, user_id)
+    exhausted = list_env_shares_page(db, environment_id, user_id, share_status=EnvShareStatus.EXHAUSTED)
+
+    if not opened and page["summary"]["active"] == 0 and exhausted["summary"]["total"] == 2:
+        print("OK: links with a limit of 0 cannot be opened and are listed as exhausted")
+        return True
+    print(
+        f"FAIL: limit 0 link opened={opened}, active={page['summary']['active']}, "
+        f"exhausted={exhausted['summary']['total']} (expected False, 0, 2)"
+    )
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress share link limits under parallel access")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--max-views", type=int, default=10)
+    parser.add_argument("--max-downloads", type=int, default=1)
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+
+    from app.db.base import Base
+    from app.db.session import SessionLocal, engine
+    from app.models.env_share import EnvShare
+    from app.services.env_share_service import access_share_download, access_share_view
+
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    event.listen(engine, "before_cursor_execute", _count_statement)
+
+    db = SessionLocal()
+    shares = _seed(db, args.max_views, args.max_downloads)
+    db.close()
+
+    failed = False
+    for name, access, limit, counter in [
+        ("view", access_share_view, args.max_views, "view_count"),
+        ("download", access_share_download, args.max_downloads, "download_count"),
+    ]:
+        share_id, token = shares[name]
+        print(f"Checking {name}: {args.requests} requests on {args.workers} threads, limit {limit}...")
+        succeeded, fewest, most = _hammer(access, token, args.workers, args.requests)
+
+        db = SessionLocal()
+        share = db.get(EnvShare, share_id)
+        stored, active = getattr(share, counter), share.is_active
+        db.close()
+
+        if succeeded == min(limit, args.requests) and stored == succeeded and not active:
+            print(f"OK: {succeeded} succeeded, {counter}={stored}, share revoked")
+        else:
+            print(f"FAIL: {succeeded} succeeded, {counter}={stored}, is_active={active} (limit {limit})")
+            failed = True
+        # Downloads always use up the link; views only on the last one
+        budget = LAST_ACCESS_STATEMENT_BUDGET if name == "download" else ACCESS_STATEMENT_BUDGET
+        within = fewest <= budget and most <= LAST_ACCESS_STATEMENT_BUDGET
+        print(
+            f"{'OK' if within else 'FAIL'}: SQL statements per successful {name}: {fewest}-{most} "
+            f"(budget {budget}, {LAST_ACCESS_STATEMENT_BUDGET} for the last use)"
+        )
+        failed = failed or not within
+
+    db = SessionLocal()
+    if not _check_zero_limit(db):
+        failed = True
+    db.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,25 @@ Run this once to create all tables
 from app.db.base import Base
 from app.db.session import engine
 
+# Columns added to tables that already existed; create_all only creates missing tables
+ADDED_COLUMNS = {
+    "environments": [
+        ("parent_id", "INTEGER REFERENCES environments(id) ON DELETE SET NULL"),
+        ("revision", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+    "env_variables": [("value_digest", "VARCHAR(64)")],
+    "env_variable_versions": [("value_digest", "VARCHAR(64)")],
+    "env_shares": [
+        ("snapshot_kdf", "VARCHAR"),
+        ("snapshot_payload", "TEXT"),
+        ("deactivated_at", "TIMESTAMP WITH TIME ZONE"),
+    ],
+    "deletion_jobs": [("claimed_by", "VARCHAR(32)"), ("heartbeat_at", "TIMESTAMP WITH TIME ZONE")],
+}
+
+# Rows read, digested and updated per transaction by the value digest backfill
+BACKFILL_BATCH_SIZE = 1000
+
 if __name__ == "__main__":
     # IMPORTANT: ensure all models are imported so they're registered on Base.metadata
     # Without these imports, create_all() will create zero tables.
@@ -12,6 +31,97 @@ if __name__ == "__main__":
     from app.models import env_share as env_share_models  # noqa: F401
 
     print("Creating database tables...")
+    if engine.dialect.name == "postgresql":
+        # Trigram indexes used by variable search
+        from sqlalchemy import text
+
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully!")
 
+    # Bring tables created by earlier versions up to date before anything reads them
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, columns in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {ddl}"))
+                    print(f"Added column {table_name}.{name}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+    if engine.dialect.name == "postgresql":
+        # create_all does not touch existing tables: recreate foreign keys whose
+        # ON DELETE action changed (deletes cascade in the database)
+        from sqlalchemy.schema import AddConstraint
+
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for fk in table.foreign_key_constraints:
+                    if not fk.ondelete:
+                        continue
+                    for existing in inspector.get_foreign_keys(table.name):
+                        if existing["constrained_columns"] != list(fk.column_keys):
+                            continue
+                        if (existing.get("options") or {}).get("ondelete", "").upper() != fk.ondelete.upper():
+                            conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{existing["name"]}"'))
+                            conn.execute(AddConstraint(fk))
+                            print(f"Set ON DELETE {fk.ondelete} on {table.name}.{', '.join(fk.column_keys)}")
+
+    # Variables written before value digests existed cannot be diffed until backfilled.
+    # Keyset batches by id, one bulk UPDATE and commit each, so memory and lock time stay bounded
+    from sqlalchemy import select, update
+    from sqlalchemy.orm import Session
+    from app.core.encryption import encryption_service
+
+    EnvVariable = models.EnvVariable
+    backfilled = 0
+    last_id = 0
+    with Session(engine) as db:
+        while True:
+            batch = db.execute(
+                select(EnvVariable.id, EnvVariable.value, EnvVariable.is_secret)
+                .where(EnvVariable.value_digest.is_(None), EnvVariable.id > last_id)
+                .order_by(EnvVariable.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not batch:
+                break
+            db.execute(
+                update(EnvVariable),
+                [
+                    {
+                        "id": row.id,
+                        "value_digest": encryption_service.digest(
+                            encryption_service.decrypt(row.value) if row.is_secret else row.value
+                        ),
+                    }
+                    for row in batch
+                ],
+            )
+            db.commit()
+            backfilled += len(batch)
+            last_id = batch[-1].id
+    if backfilled:
+        print(f"Backfilled value digests for {backfilled} variables")
+
+    # Environments created before environment_stats existed have no counters yet
+    from app.environments.stats import rebuild_environment_stats
+
+    with Session(engine) as db:
+        unseeded = [
+            env_id
+            for (env_id,) in db.query(models.Environment.id)
+            .outerjoin(models.EnvironmentStats)
+            .filter(models.EnvironmentStats.environment_id.is_(None))
+        ]
+        rebuilt = rebuild_environment_stats(db, unseeded) if unseeded else 0
+        db.commit()
+    if rebuilt:
+        print(f"Backfilled stats for {rebuilt} environments")
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic dataset for load and scale testing.
+Writes users, projects with owners and members, environments, variables,
+share links and audit history into the configured database (DATABASE_URL),
+next to whatever it already holds. Rows are generated in chunks and written
+with COPY on PostgreSQL or executemany elsewhere; secret values are
+encrypted a chunk at a time. The same --seed gives the same data (secret
+ciphertexts aside, Fernet tokens carry a random IV).
+Every seeded user logs in with --password. Environments are roots (no
+inheritance) and variable history starts empty.
+Run from backend dir after init_db.py:
+  python seed_data.py --users 10000 --projects 2000 --variables-per-environment 200
+"""
+import argparse
+import base64
+import csv
+import enum
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List
+
+# Ensure backend is on path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, insert, select, text
+
+from app.core.encryption import encryption_service
+from app.core.security import get_password_hash
+from app.db.models import AuditLog, Environment, EnvironmentStats, EnvVariable, Project, ProjectMember, Role, User
+from app.db.session import engine
+from app.models.env_share import EnvShare
+
+# Timestamps are spread over the year after this date, so reruns match
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SPAN_SECONDS = 365 * 24 * 3600
+
+ENVIRONMENT_NAMES = ["DEV", "QA", "STAGING", "PROD", "PREVIEW", "SANDBOX", "DEMO", "PERF"]
+KEY_PREFIXES = [
+    "DATABASE", "REDIS", "API", "AWS", "STRIPE", "SMTP", "SENTRY", "APP",
+    "AUTH", "CACHE", "QUEUE", "S3", "OAUTH", "GITHUB", "SLACK", "FEATURE",
+]
+KEY_SUFFIXES = ["URL", "HOST", "PORT", "USER", "PASSWORD", "KEY", "SECRET", "TOKEN", "TIMEOUT", "ENABLED"]
+KEY_NAMES = [f"{prefix}_{suffix}" for prefix in KEY_PREFIXES for suffix in KEY_SUFFIXES]
+PROJECT_WORDS = ["billing", "search", "checkout", "identity", "reports", "gateway", "mobile", "catalog", "ledger", "notify"]
+MEMBER_ROLES = [Role.ADMIN, Role.DEVELOPER, Role.READ_ONLY]
+MEMBER_ROLE_WEIGHTS = [1, 5, 4]
+AUDIT_ACTIONS = [
+    ("view", "env_var"), ("copy", "env_var"), ("edit", "env_var"), ("create", "env_var"),
+    ("delete", "env_var"), ("create", "environment"), ("edit", "project"), ("create", "env_share"),
+]
+AUDIT_WEIGHTS = [40, 15, 20, 10, 5, 3, 2, 5]
+
+
+def _rng(seed: int, name: str) -> random.Random:
+    """Independent stream per table, so changing one count does not reshuffle the others"""
+    return random.Random(f"{seed}:{name}")
+
+
+def _timestamp(rng: random.Random, after: datetime = EPOCH) -> datetime:
+    remaining = SPAN_SECONDS - (after - EPOCH).total_seconds()
+    return after + timedelta(seconds=rng.uniform(0, max(remaining, 0)))
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _write(conn, table, chunk: List[dict]) -> None:
+    """COPY a chunk into PostgreSQL (psycopg2), executemany INSERT elsewhere"""
+    if conn.dialect.driver != "psycopg2":
+        conn.execute(insert(table), chunk)
+        return
+    columns = list(chunk[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chunk:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _load(model, rows: Iterable[dict], batch_size: int, transform=None) -> int:
+    """Write rows in chunks in one transaction per table; returns the row count"""
+    start = time.perf_counter()
+    count = 0
+    with engine.begin() as conn:
+        for chunk in _chunks(rows, batch_size):
+            if transform is not None:
+                transform(chunk)
+            _write(conn, model.__table__, chunk)
+            count += len(chunk)
+    print(f"{model.__tablename__:<20}{count:>12} rows{time.perf_counter() - start:>10.1f}s")
+    return count
+
+
+def _next_id(model) -> int:
+    """Ids are assigned here so child rows can reference them without reading them back"""
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(models) -> None:
+    """Move PostgreSQL id sequences past the explicitly assigned ids"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for model in models:
+            table = model.__tablename__
+            conn.execute(
+                text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))")
+            )
+
+
+def _encrypt_secrets(chunk: List[dict]) -> None:
+    """Digest every plaintext and encrypt the secret ones in one batch"""
+    for row in chunk:
+        row["value_digest"] = encryption_service.digest(row["value"])
+    secrets = [row for row in chunk if row["is_secret"]]
+    for row, ciphertext in zip(secrets, encryption_service.encrypt_many(row["value"] for row in secrets)):
+        row["value"] = ciphertext
+
+
+class ValueSizes:
+    """Log-normal value lengths around a median, sliced from a fixed random pool"""
+
+    def __init__(self, rng: random.Random, median: int, sigma: float, maximum: int):
+        self.rng = rng
+        self.mu = math.log(max(median, 1))
+        self.sigma = sigma
+        self.maximum = maximum
+        alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_./:"
+        self.pool = "".join(rng.choices(alphabet, k=max(maximum, 1) * 4))
+
+    def value(self) -> str:
+        size = min(self.maximum, max(1, int(self.rng.lognormvariate(self.mu, self.sigma))))
+        offset = self.rng.randrange(len(self.pool) - size + 1)
+        return self.pool[offset:offset + size]
+
+
+def _key_name(index: int) -> str:
+    name = KEY_NAMES[index % len(KEY_NAMES)]
+    return name if index < len(KEY_NAMES) else f"{name}_{index // len(KEY_NAMES)}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for load and scale testing")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--members-per-project", type=int, default=5, help="Average members, owner included")
+    parser.add_argument("--environments-per-project", type=int, default=3)
+    parser.add_argument("--variables-per-environment", type=int, default=100)
+    parser.add_argument("--secret-ratio", type=float, default=0.25, help="Share of variables that are secret")
+    parser.add_argument("--value-size-median", type=int, default=24, help="Median value length in characters")
+    parser.add_argument("--value-size-sigma", type=float, default=1.0, help="Spread of the log-normal value length")
+    parser.add_argument("--value-size-max", type=int, default=4096, help="Longest value in characters")
+    parser.add_argument("--shares-per-environment", type=int, default=2)
+    parser.add_argument("--audit-per-project", type=int, default=50)
+    parser.add_argument("--password", default="password", help="Password of every seeded user")
+    parser.add_argument("--email-domain", default="example.com")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per COPY or executemany")
+    args = parser.parse_args()
+
+    if args.users < 1 or args.projects < 0:
+        parser.error("--users must be at least 1 and --projects not negative")
+
+    engine.echo = False
+    start = time.perf_counter()
+    batch = args.batch_size
+
+    # Users: one bcrypt hash shared by all, hashing millions would take hours
+    password_hash = get_password_hash(args.password)
+    first_user = _next_id(User)
+    user_ids = range(first_user, first_user + args.users)
+    user_created = {}
+
+    def users():
+        rng = _rng(args.seed, "users")
+        for user_id in user_ids:
+            user_created[user_id] = _timestamp(rng)
+            yield {
+                "id": user_id,
+                "email": f"user{user_id}@{args.email_domain}",
+                "password": password_hash,
+                "is_active": rng.random() > 0.02,
+                "created_at": user_created[user_id],
+            }
+
+    _load(User, users(), batch)
+
+    # Projects, their members (owner first) and environments
+    first_project = _next_id(Project)
+    projects: Dict[int, dict] = {}
+
+    def project_rows():
+        rng = _rng(args.seed, "projects")
+        for project_id in range(first_project, first_project + args.projects):
+            owner_id = rng.choice(user_ids)
+            created_at = _timestamp(rng, user_created[owner_id])
+            projects[project_id] = {"owner_id": owner_id, "created_at": created_at, "members": [owner_id]}
+            yield {
+                "id": project_id,
+                "name": f"{rng.choice(PROJECT_WORDS)}-{rng.choice(PROJECT_WORDS)}-{project_id}",
+                "owner_id": owner_id,
+                "created_at": created_at,
+            }
+
+    _load(Project, project_rows(), batch)
+
+    def member_rows():
+        rng = _rng(args.seed, "members")
+        extra = max(args.members_per_project - 1, 0)
+        for project_id, project in projects.items():
+            yield {"project_id": project_id, "user_id": project["owner_id"], "role": Role.OWNER, "created_at": project["created_at"]}
+            count = min(rng.randint(0, 2 * extra), args.users - 1)
+            members = set()
+            while len(members) < count:
+                user_id = rng.choice(user_ids)
+                if user_id != project["owner_id"]:
+                    members.add(user_id)
+            for user_id in sorted(members):
+                project["members"].append(user_id)
+                yield {
+                    "project_id": project_id,
+                    "user_id": user_id,
+                    "role": rng.choices(MEMBER_ROLES, MEMBER_ROLE_WEIGHTS)[0],
+                    "created_at": _timestamp(rng, project["created_at"]),
+                }
+
+    _load(ProjectMember, member_rows(), batch)
+
+    first_environment = _next_id(Environment)
+    environments: Dict[int, dict] = {}
+
+    def environment_rows():
+        rng = _rng(args.seed, "environments")
+        environment_id = first_environment
+        for project_id, project in projects.items():
+            for index in range(args.environments_per_project):
+                name = ENVIRONMENT_NAMES[index % len(ENVIRONMENT_NAMES)]
+                if index >= len(ENVIRONMENT_NAMES):
+                    name = f"{name}_{index // len(ENVIRONMENT_NAMES)}"
+                created_at = _timestamp(rng, project["created_at"])
+                environments[environment_id] = {
+                    "project_id": project_id,
+                    "created_at": created_at,
+                    "variables": 0,
+                    "secrets": 0,
+                    "shares": 0,
+                    "modified": None,
+                }
+                yield {"id": environment_id, "name": name, "project_id": project_id, "revision": 0, "created_at": created_at}
+                environment_id += 1
+
+    _load(Environment, environment_rows(), batch)
+
+    # Variables, with stats counted as they are generated
+    def variable_rows():
+        rng = _rng(args.seed, "variables")
+        sizes = ValueSizes(_rng(args.seed, "values"), args.value_size_median, args.value_size_sigma, args.value_size_max)
+        for environment_id, environment in environments.items():
+            for index in range(args.variables_per_environment):
+                is_secret = rng.random() < args.secret_ratio
+                created_at = _timestamp(rng, environment["created_at"])
+                updated_at = _timestamp(rng, created_at) if rng.random() < 0.3 else None
+                environment["variables"] += 1
+                environment["secrets"] += is_secret
+                modified = updated_at or created_at
+                if environment["modified"] is None or modified > environment["modified"]:
+                    environment["modified"] = modified
+                yield {
+                    "key": _key_name(index),
+                    "value": sizes.value(),
+                    "is_secret": is_secret,
+                    "environment_id": environment_id,
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                }
+
+    _load(EnvVariable, variable_rows(), batch, transform=_encrypt_secrets)
+
+    # Share links: a mix of active, revoked, expired and used-up ones
+    share_hash = get_password_hash(args.password)
+
+    def share_rows():
+        rng = _rng(args.seed, "shares")
+        for environment_id, environment in environments.items():
+            project = projects[environment["project_id"]]
+            for _ in range(args.shares_per_environment):
+                created_at = _timestamp(rng, environment["created_at"])
+                kind = rng.random()
+                # Negative means unlimited; 0 would allow no views at all
+                max_views = rng.choice([-1, 1, 5, 10, 50])
+                view_count = rng.randint(0, max_views) if max_views >= 0 else rng.randint(0, 20)
+                used_up = max_views >= 0 and view_count >= max_views
+                expires_at = deactivated_at = None
+                if kind < 0.7:
+                    # Meant to be usable: no expiry, or one far past the seeded year so the
+                    # links stay active for share access load tests
+                    if rng.random() < 0.5:
+                        expires_at = created_at + timedelta(days=3650)
+                elif kind < 0.9:
+                    # Short-lived links, expired long ago and deactivated by the sweeper
+                    expires_at = created_at + timedelta(days=rng.choice([1, 7, 30]))
+                    deactivated_at = expires_at
+                is_active = kind < 0.7 and not used_up
+                if not is_active and deactivated_at is None:
+                    deactivated_at = _timestamp(rng, created_at)
+                environment["shares"] += is_active
+                yield {
+                    "environment_id": environment_id,
+                    "token": base64.urlsafe_b64encode(rng.getrandbits(256).to_bytes(32, "big")).rstrip(b"=").decode(),
+                    "password_hash": share_hash,
+                    "expires_at": expires_at,
+                    "max_views": max_views,
+                    "max_downloads": 1,
+                    "view_count": view_count,
+                    "download_count": 0,
+                    "one_time": rng.random() < 0.1,
+                    "is_active": is_active,
+                    "whitelisted_ips": None,
+                    "created_by": project["owner_id"],
+                    "created_at": created_at,
+                    "deactivated_at": deactivated_at,
+                }
+
+    _load(EnvShare, share_rows(), batch)
+
+    def stats_rows():
+        for environment_id, environment in environments.items():
+            yield {
+                "environment_id": environment_id,
+                "variable_count": environment["variables"],
+                "secret_count": environment["secrets"],
+                "active_share_count": environment["shares"],
+                "last_modified_at": environment["modified"],
+            }
+
+    _load(EnvironmentStats, stats_rows(), batch)
+
+    # Audit history by the members of each project
+    environments_by_project: Dict[int, List[int]] = {}
+    for environment_id, environment in environments.items():
+        environments_by_project.setdefault(environment["project_id"], []).append(environment_id)
+
+    def audit_rows():
+        rng = _rng(args.seed, "audit")
+        for project_id, project in projects.items():
+            project_environments = environments_by_project.get(project_id) or [None]
+            for _ in range(args.audit_per_project):
+                action, resource = rng.choices(AUDIT_ACTIONS, AUDIT_WEIGHTS)[0]
+                environment_id = rng.choice(project_environments)
+                if resource == "project":
+                    resource_id, details = project_id, "Updated project settings"
+                elif resource == "env_var":
+                    key = _key_name(rng.randrange(max(args.variables_per_environment, 1)))
+                    resource_id, details = environment_id, f"{action.capitalize()} {key}"
+                else:
+                    resource_id, details = environment_id, f"{action.capitalize()} {resource} {environment_id}"
+                yield {
+                    "user_id": rng.choice(project["members"]),
+                    "action": action,
+                    "resource": resource,
+                    "resource_id": resource_id,
+                    "details": details,
+                    "timestamp": _timestamp(rng, project["created_at"]),
+                }
+
+    _load(AuditLog, audit_rows(), batch)
+
+    _reset_sequences([User, Project, Environment])
+    print(f"Seeded in {time.perf_counter() - start:.1f}s; users log in as user<id>@{args.email_domain} / {args.password}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())